@@ -20,6 +20,7 @@
 #include <dai/factorgraph.h>
 #include <dai/properties.h>
 #include <dai/enum.h>
+#include <dai/indexedheap.h>
 
 
 namespace dai {
@@ -38,8 +39,10 @@ namespace dai {
  *    \f[ m_{I\to i}(x_i) \propto \sum_{x_{N_I\setminus\{i\}}} f_I(x_I) \prod_{j\in N_I\setminus\{i\}} \prod_{J\in N_j\setminus\{I\}} m_{J\to j}\f]
  *  and in case of the max-product algorithm:
  *    \f[ m_{I\to i}(x_i) \propto \max_{x_{N_I\setminus\{i\}}} f_I(x_I) \prod_{j\in N_I\setminus\{i\}} \prod_{J\in N_j\setminus\{I\}} m_{J\to j}\f]
- *  In order to improve convergence, the updates can be damped. For improved numerical stability,
- *  the updates can be done in the log-domain alternatively.
+ *  In order to improve convergence, the updates can be damped; the damping can also be increased
+ *  automatically when the maximum belief difference increases, which indicates oscillations
+ *  (see Properties::adaptivedamping). For improved numerical stability, the updates can be done
+ *  in the log-domain alternatively.
  *
  *  After convergence, the variable beliefs are calculated by:
  *    \f[ b_i(x_i) \propto \prod_{I\in N_i} m_{I\to i}(x_i)\f]
@@ -52,11 +55,47 @@ namespace dai {
  *  joint configuration of all variables which has maximum probability) is provided
  *  by the findMaximum() method, which can be called after convergence.
  *
+ *  The progress of run() can be monitored by recording a trace of statistics of each iteration
+ *  (see recordTrace and getTrace()), or by setting a function that is called after each iteration
+ *  and which can stop run() early (see setIterationCallback()).
+ *
  *  \note There are two implementations, an optimized one (the default) which caches IndexFor objects,
  *  and a slower, less complicated one which is easier to maintain/understand. The slower one can be 
  *  enabled by defining DAI_BP_FAST as false in the source file.
  */
 class BP : public DAIAlgFG {
+    public:
+        /// Number of bins of the residual histogram in IterationStats
+        static const size_t nrResidualBins = 16;
+
+        /// Statistics of a single iteration of run()
+        struct IterationStats {
+            /// Number of the iteration (starting at 1)
+            size_t iter;
+            /// Maximum difference between the beliefs after this iteration and those after the previous one
+            Real maxDiff;
+            /// Number of messages that have been updated in this iteration
+            size_t nrUpdates;
+            /// Wall-clock time since the start of run() (in seconds)
+            double time;
+            /// Damping constant used in this iteration
+            Real damping;
+            /// Histogram of the residuals of the messages that have been updated in this iteration
+            /** The residual of a message update is the distance (in the maximum norm) between the new
+             *  and the old message. Bin 0 counts the residuals \f$r \ge 10^{-1}\f$, bin \f$k\f$ counts
+             *  the residuals \f$10^{-k-1} \le r < 10^{-k}\f$ and the last bin also counts all smaller residuals.
+             */
+            std::vector<size_t> residuals;
+        };
+
+        /// Type of the function that is called by run() after each iteration
+        /** \param bp The object on which run() has been called
+         *  \param stats Statistics of the iteration
+         *  \param data The pointer that has been passed to setIterationCallback()
+         *  \returns \c false if run() should stop
+         */
+        typedef bool (*IterationCallback)( const BP &bp, const IterationStats &stats, void *data );
+
     protected:
         /// Type used for index cache
         typedef std::vector<size_t> ind_t;
@@ -71,14 +110,32 @@ class BP : public DAIAlgFG {
             /// Residual for this edge
             Real   residual;
         };
+        /// Type used for storing preallocated scratch space for calculating the messages sent by a factor
+        struct FactorScratch {
+            /// Product of the factor and the incoming messages
+            Prob   prod;
+            /// Product of the messages coming into one of the neighboring variables
+            Prob   prod_j;
+            /// Marginal of the product on one of the neighboring variables
+            Prob   marg;
+            /// Logarithm of the factor (only used if props.logdomain == \c true)
+            Prob   logFactor;
+        };
         /// Stores all edge properties
         std::vector<std::vector<EdgeProp> > _edges;
         /// Type of lookup table (only used for maximum-residual BP)
-        typedef std::multimap<Real, std::pair<std::size_t, std::size_t> > LutType;
-        /// Lookup table (only used for maximum-residual BP)
-        std::vector<std::vector<LutType::iterator> > _edge2lut;
+        /** The key of an edge consists of its residual and the value of _lutCounter when the residual was last set;
+         *  the latter breaks ties in favor of the most recently updated edge.
+         */
+        typedef IndexedHeap<std::pair<Real, std::size_t> > LutType;
+        /// Lookup table (only used for maximum-residual BP): item in _lut corresponding to each edge
+        std::vector<std::vector<std::size_t> > _edge2lut;
+        /// Lookup table (only used for maximum-residual BP): edge corresponding to each item in _lut
+        std::vector<std::pair<std::size_t, std::size_t> > _lut2edge;
         /// Lookup table (only used for maximum-residual BP)
         LutType _lut;
+        /// Number of residual updates so far (only used for maximum-residual BP)
+        std::size_t _lutCounter;
         /// Maximum difference between variable beliefs encountered so far
         Real _maxdiff;
         /// Number of iterations needed
@@ -91,6 +148,20 @@ class BP : public DAIAlgFG {
         std::vector<Factor> _oldBeliefsF;
         /// Stores the update schedule
         std::vector<Edge> _updateSeq;
+        /// Scratch space for each factor, used by calcNewMessage() (together with the index cache of each edge, this forms the message plan)
+        std::vector<FactorScratch> _scratch;
+        /// Damping constant used in the current iteration (only differs from props.damping if props.adaptivedamping == \c true)
+        Real _damping;
+        /// Whether statistics of the current iteration are being collected
+        bool _tracing;
+        /// Statistics of the current iteration (only collected if \a _tracing == \c true)
+        IterationStats _stats;
+        /// The statistics of each iteration (only recorded if \a recordTrace is \c true)
+        std::vector<IterationStats> _trace;
+        /// Function called after each iteration (not copied by the copy constructor and the assignment operator)
+        IterationCallback _callback;
+        /// Pointer passed to \a _callback
+        void *_callbackData;
 
     public:
         /// Parameters for BP
@@ -129,53 +200,70 @@ class BP : public DAIAlgFG {
             /// Damping constant (0.0 means no damping, 1.0 is maximum damping)
             Real damping;
 
+            /// Whether the damping constant should be increased (towards \a maxdamping) whenever the maximum belief difference increases
+            bool adaptivedamping;
+
+            /// Maximum damping constant (only used if \a adaptivedamping == \c true)
+            Real maxdamping;
+
             /// Message update schedule
             UpdateType updates;
 
             /// Inference variant
             InfType inference;
+
+            /// Number of threads used for parallel updates and for the convergence check (0 means one thread per available processor)
+            /** \note Only has an effect if libDAI has been built with OpenMP support (see WITH_OPENMP in Makefile.ALL).
+             *  The results do not depend on the number of threads.
+             */
+            size_t nthreads;
         } props;
 
         /// Specifies whether the history of message updates should be recorded
         bool recordSentMessages;
 
+        /// Specifies whether the statistics of each iteration should be recorded
+        bool recordTrace;
+
     public:
     /// \name Constructors/destructors
     //@{
         /// Default constructor
-        BP() : DAIAlgFG(), _edges(), _edge2lut(), _lut(), _maxdiff(0.0), _iters(0U), _sentMessages(), _oldBeliefsV(), _oldBeliefsF(), _updateSeq(), props(), recordSentMessages(false) {}
+        BP() : DAIAlgFG(), _edges(), _edge2lut(), _lut2edge(), _lut(), _lutCounter(0), _maxdiff(0.0), _iters(0U), _sentMessages(), _oldBeliefsV(), _oldBeliefsF(), _updateSeq(), _scratch(), _damping(0.0), _tracing(false), _stats(), _trace(), _callback(NULL), _callbackData(NULL), props(), recordSentMessages(false), recordTrace(false) {}
 
         /// Construct from FactorGraph \a fg and PropertySet \a opts
         /** \param fg Factor graph.
          *  \param opts Parameters @see Properties
          */
-        BP( const FactorGraph & fg, const PropertySet &opts ) : DAIAlgFG(fg), _edges(), _maxdiff(0.0), _iters(0U), _sentMessages(), _oldBeliefsV(), _oldBeliefsF(), _updateSeq(), props(), recordSentMessages(false) {
+        BP( const FactorGraph & fg, const PropertySet &opts ) : DAIAlgFG(fg), _edges(), _edge2lut(), _lut2edge(), _lut(), _lutCounter(0), _maxdiff(0.0), _iters(0U), _sentMessages(), _oldBeliefsV(), _oldBeliefsF(), _updateSeq(), _scratch(), _damping(0.0), _tracing(false), _stats(), _trace(), _callback(NULL), _callbackData(NULL), props(), recordSentMessages(false), recordTrace(false) {
             setProperties( opts );
             construct();
         }
 
         /// Copy constructor
-        BP( const BP &x ) : DAIAlgFG(x), _edges(x._edges), _edge2lut(x._edge2lut), _lut(x._lut), _maxdiff(x._maxdiff), _iters(x._iters), _sentMessages(x._sentMessages), _oldBeliefsV(x._oldBeliefsV), _oldBeliefsF(x._oldBeliefsF), _updateSeq(x._updateSeq), props(x.props), recordSentMessages(x.recordSentMessages) {
-            for( LutType::iterator l = _lut.begin(); l != _lut.end(); ++l )
-                _edge2lut[l->second.first][l->second.second] = l;
-        }
+        BP( const BP &x ) : DAIAlgFG(x), _edges(x._edges), _edge2lut(x._edge2lut), _lut2edge(x._lut2edge), _lut(x._lut), _lutCounter(x._lutCounter), _maxdiff(x._maxdiff), _iters(x._iters), _sentMessages(x._sentMessages), _oldBeliefsV(x._oldBeliefsV), _oldBeliefsF(x._oldBeliefsF), _updateSeq(x._updateSeq), _scratch(x._scratch), _damping(x._damping), _tracing(false), _stats(), _trace(x._trace), _callback(NULL), _callbackData(NULL), props(x.props), recordSentMessages(x.recordSentMessages), recordTrace(x.recordTrace) {}
 
         /// Assignment operator
         BP& operator=( const BP &x ) {
             if( this != &x ) {
                 DAIAlgFG::operator=( x );
                 _edges = x._edges;
+                _edge2lut = x._edge2lut;
+                _lut2edge = x._lut2edge;
                 _lut = x._lut;
-                for( LutType::iterator l = _lut.begin(); l != _lut.end(); ++l )
-                    _edge2lut[l->second.first][l->second.second] = l;
+                _lutCounter = x._lutCounter;
                 _maxdiff = x._maxdiff;
                 _iters = x._iters;
                 _sentMessages = x._sentMessages;
                 _oldBeliefsV = x._oldBeliefsV;
                 _oldBeliefsF = x._oldBeliefsF;
                 _updateSeq = x._updateSeq;
+                _scratch = x._scratch;
+                _damping = x._damping;
+                _trace = x._trace;
                 props = x.props;
                 recordSentMessages = x.recordSentMessages;
+                recordTrace = x.recordTrace;
             }
             return *this;
         }
@@ -206,6 +294,18 @@ class BP : public DAIAlgFG {
         virtual std::string printProperties() const;
     //@}
 
+    /// \name Changing the factors
+    //@{
+        /// Sets factor \a I to \a newFactor (and updates the cached logarithm of the factor, if necessary)
+        virtual void setFactor( size_t I, const Factor &newFactor, bool backup = false ) {
+            DAIAlgFG::setFactor( I, newFactor, backup );
+            if( I < _scratch.size() && _scratch[I].logFactor.size() ) {
+                _scratch[I].logFactor = newFactor.p();
+                _scratch[I].logFactor.takeLog();
+            }
+        }
+    //@}
+
     /// \name Additional interface specific for BP
     //@{
         /// Returns history of which messages have been updated
@@ -215,6 +315,21 @@ class BP : public DAIAlgFG {
 
         /// Clears history of which messages have been updated
         void clearSentMessages() { _sentMessages.clear(); }
+
+        /// Returns the statistics of the iterations done so far (only recorded if \a recordTrace is \c true)
+        const std::vector<IterationStats>& getTrace() const { return _trace; }
+
+        /// Clears the statistics of the iterations
+        void clearTrace() { _trace.clear(); }
+
+        /// Sets the function that is called by run() after each iteration (\c NULL disables it)
+        /** \param callback Function which is passed the statistics of the iteration and \a data; if it returns \c false, run() stops
+         *  \param data Pointer that is passed to \a callback
+         */
+        void setIterationCallback( IterationCallback callback, void *data = NULL ) {
+            _callback = callback;
+            _callbackData = data;
+        }
     //@}
 
     protected:
@@ -235,11 +350,12 @@ class BP : public DAIAlgFG {
         /// Returns reference to residual for the edge between variable \a i and its \a _I 'th neighbor
         Real & residual(size_t i, size_t _I) { return _edges[i][_I].residual; }
 
-        /// Calculate the product of factor \a I and the incoming messages
-        /** If \a without_i == \c true, the message coming from variable \a i is omitted from the product
+        /// Calculate the product of factor \a I and the incoming messages and store it in \a prod
+        /** If \a without_i == \c true, the message coming from variable \a i is omitted from the product.
+         *  \a prod_j is used as scratch space; if \a prod and \a prod_j have enough capacity, no memory is allocated.
          *  \note This function is used by calcNewMessage() and calcBeliefF()
          */
-        virtual Prob calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) const;
+        virtual void calcIncomingMessageProduct( size_t I, bool without_i, size_t i, Prob &prod, Prob &prod_j ) const;
         /// Calculate the updated message from the \a _I 'th neighbor of variable \a i to variable \a i
         virtual void calcNewMessage( size_t i, size_t _I );
         /// Replace the "old" message from the \a _I 'th neighbor of variable \a i to variable \a i by the "new" (updated) message
@@ -248,11 +364,16 @@ class BP : public DAIAlgFG {
         void updateResidual( size_t i, size_t _I, Real r );
         /// Finds the edge which has the maximum residual (difference between new and old message)
         void findMaxResidual( size_t &i, size_t &_I );
+        /// Calculates all new messages and then updates all messages, dividing the factors and variables over \a nthreads threads (used for PARALL updates)
+        void updateParallel( size_t nthreads );
+        /// Calculates all beliefs, replaces the beliefs of the previous iteration and returns the maximum difference, dividing the work over \a nthreads threads
+        Real updateBeliefs( size_t nthreads );
         /// Calculates unnormalized belief of variable \a i
         virtual void calcBeliefV( size_t i, Prob &p ) const;
         /// Calculates unnormalized belief of factor \a I
         virtual void calcBeliefF( size_t I, Prob &p ) const {
-            p = calcIncomingMessageProduct( I, false, 0 );
+            Prob prod_j;
+            calcIncomingMessageProduct( I, false, 0, p, prod_j );
         }
 
         /// Helper function for constructors
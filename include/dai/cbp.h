@@ -56,10 +56,13 @@ class CBP : public DAIAlgFG {
         /// Output stream where information about the clampings is written
         boost::shared_ptr<std::ofstream> _clamp_ofstream;
 
+        /// Maximum level of recursion up to which the branches are explored in parallel (set by run())
+        size_t _par_levels;
+
 
     public:
         /// Default constructor
-        CBP() : DAIAlgFG(), _beliefsV(), _beliefsF(), _logZ(0.0), _iters(0), _maxdiff(0.0), _sum_level(0.0), _num_leaves(0), _clamp_ofstream() {}
+        CBP() : DAIAlgFG(), _beliefsV(), _beliefsF(), _logZ(0.0), _iters(0), _maxdiff(0.0), _sum_level(0.0), _num_leaves(0), _clamp_ofstream(), _par_levels(0) {}
 
         /// Construct CBP object from FactorGraph \a fg and PropertySet \a opts
         /** \param fg Factor graph.
@@ -136,6 +139,11 @@ class CBP : public DAIAlgFG {
 
             /// If non-empty, write clamping choices to this file
             std::string clamp_outfile = "";
+
+            /// Number of threads used for exploring branches of the recursion in parallel (0 means one thread per available processor)
+            size_t nthreads = 1;
+            /// Maximum level of recursion up to which the branches are explored in parallel (if nthreads != 1)
+            size_t par_levels = 4;
         }
         */
 /* {{{ GENERATED CODE: DO NOT EDIT. Created by
@@ -178,6 +186,10 @@ class CBP : public DAIAlgFG {
             size_t rand_seed;
             /// If non-empty, write clamping choices to this file
             std::string clamp_outfile;
+            /// Number of threads used for exploring branches of the recursion in parallel (0 means one thread per available processor)
+            size_t nthreads;
+            /// Maximum level of recursion up to which the branches are explored in parallel (if nthreads != 1)
+            size_t par_levels;
 
             /// Set members from PropertySet
             /** \throw UNKNOWN_PROPERTY if a Property key is not recognized
@@ -199,6 +211,10 @@ class CBP : public DAIAlgFG {
         /** Chooses a variable to clamp, recurses, combines the partition sum 
          *  and belief estimates of the children, and returns the improved
          *  estimates in \a lz_out and \a beliefs_out to its parent.
+         *
+         *  Up to recursion level \c _par_levels, the two branches are run and
+         *  recursed into as OpenMP tasks, which are distributed over the threads
+         *  of the enclosing parallel region.
          */
         void runRecurse( InfAlg *bp, Real orig_logZ, std::vector<size_t> clamped_vars_list, size_t &num_leaves,
                          size_t &choose_count, Real &sum_level, Real &lz_out, std::vector<Factor> &beliefs_out );
@@ -213,6 +229,9 @@ class CBP : public DAIAlgFG {
          */
         virtual bool chooseNextClampVar( InfAlg* bp, std::vector<size_t> &clamped_vars_list, size_t &i, std::vector<size_t> &xis, Real *maxVarOut );
 
+        /// Returns a clone of \a bp in which variable or factor \a i is clamped to the states \a xis, after running it
+        InfAlg* runClamped( const InfAlg *bp, size_t i, const std::vector<size_t> &xis );
+
         /// Return the InfAlg to use at each step of the recursion.
         /** \todo At present, CBP::getInfAlg() only returns a BP instance; 
          *  it should be possible to select other inference algorithms via a property
@@ -26,6 +26,9 @@
 namespace dai {
 
 
+    class greedyVariableElimination;
+
+
     /// A ClusterGraph is a hypergraph with variables as nodes, and "clusters" (sets of variables) as hyperedges.
     /** It is implemented as a bipartite graph with variable (Var) nodes and cluster (VarSet) nodes.
      *  One may think of a ClusterGraph as a FactorGraph without the actual factor values.
@@ -168,16 +171,11 @@ namespace dai {
             }
 
             /// Erases all clusters that are not maximal
-            ClusterGraph& eraseNonMaximal() {
-                for( size_t I = 0; I < _G.nrNodes2(); ) {
-                    if( !isMaximal(I) ) {
-                        _clusters.erase( _clusters.begin() + I );
-                        _G.eraseNode2(I);
-                    } else
-                        I++;
-                }
-                return *this;
-            }
+            /** Of several identical clusters, only the last one is kept.
+             *  All clusters are erased in a single pass, which takes time linear in the number of clusters
+             *  (for clusters of bounded size).
+             */
+            ClusterGraph& eraseNonMaximal();
 
             /// Erases all clusters that contain the \a i 'th variable
             ClusterGraph& eraseSubsuming( size_t i ) {
@@ -249,6 +247,23 @@ namespace dai {
 
                 return result;
             }
+
+            /// Performs greedy Variable Elimination, keeping track of the interactions that are created along the way.
+            /** This overload yields the same result as the generic VarElim() called with \a f, but is much faster for
+             *  large cluster graphs if the cost function of \a f is eliminationCost_MinNeighbors(), eliminationCost_MinWeight(),
+             *  eliminationCost_MinFill() or eliminationCost_WeightedMinFill(). Instead of eliminating variables from a copy
+             *  of the cluster graph and recalculating the cost of each remaining variable in each step, it maintains the
+             *  adjacency graph of the remaining variables and keeps the costs in a priority queue; after eliminating a
+             *  variable, only the costs of the variables whose cost may have changed are recalculated (its neighbors and,
+             *  for the fill-in heuristics, their neighbors that share a new edge). Ties are broken in favor of the variable
+             *  with the lowest index, as in greedyVariableElimination::operator()(). For other cost functions, the generic
+             *  VarElim() is used.
+             *  \param f function object that specifies the cost function.
+             *  \param maxStates maximum total number of states of all clusters in the output cluster graph (0 means no limit).
+             *  \throws OUT_OF_MEMORY if total number of states becomes larger than maxStates
+             *  \return A set of elimination "cliques".
+             */
+            ClusterGraph VarElim( const greedyVariableElimination &f, size_t maxStates=0 ) const;
         //@}
     };
 
@@ -291,6 +306,9 @@ namespace dai {
              */
             greedyVariableElimination( eliminationCostFunction h ) : heuristic(h) {}
 
+            /// Returns the cost function
+            eliminationCostFunction costFunction() const { return heuristic; }
+
             /// Returns the best variable from \a remainingVars to eliminate in the cluster graph \a cl by greedily minimizing the cost function.
             /** This function calculates the cost for eliminating each variable in \a remaingVars and returns the variable which has lowest cost.
              */
@@ -148,6 +148,14 @@ class InfAlg {
          */
         virtual void clamp( size_t i, size_t x, bool backup = false ) = 0;
 
+        /// Undo the previous reclamping and clamp the variables with indices \a i to values \a x[i] instead
+        /** Only the factors changed by the previous call to reclamp() are restored; clampings made before
+         *  (e.g., with clamp()) are kept. Together with init(), this allows one to reuse the same object for
+         *  many clampings instead of cloning it.
+         *  \see FactorGraph::reclamp()
+         */
+        virtual void reclamp( const std::map<size_t, size_t> &x ) = 0;
+
         /// Sets all factors interacting with variable with index \a i to one.
         /** If \a backup == \c true, make a backup of all factors that are changed.
          */
@@ -169,6 +177,8 @@ class InfAlg {
         virtual void restoreFactor( size_t I ) = 0;
         /// Restore the factors involving the variables in \a vs from their backup copies
         virtual void restoreFactors( const VarSet &vs ) = 0;
+        /// Restore all factors from their backup copies
+        virtual void restoreFactors() = 0;
     //@}
 
     /// \name Managing parameters
@@ -225,6 +235,9 @@ class DAIAlg : public InfAlg, public GRM {
          */
         void clamp( size_t i, size_t x, bool backup = false ) { GRM::clamp( i, x, backup ); }
 
+        /// Restore all backed up factors and clamp the variables with indices \a i to values \a x[i] instead, backing up the changed factors
+        void reclamp( const std::map<size_t, size_t> &x ) { GRM::reclamp( x ); }
+
         /// Sets all factors interacting with variable with index \a i to one.
         /** If \a backup == \c true, make a backup of all factors that are changed.
          */
@@ -242,6 +255,8 @@ class DAIAlg : public InfAlg, public GRM {
         void restoreFactor( size_t I ) { GRM::restoreFactor( I ); }
         /// Restore the factors involving the variables in \a vs from their backup copies
         void restoreFactors( const VarSet &vs ) { GRM::restoreFactors( vs ); }
+        /// Restore all factors from their backup copies
+        void restoreFactors() { GRM::restoreFactors(); }
     //@}
 };
 
@@ -259,8 +274,12 @@ typedef DAIAlg<RegionGraph> DAIAlgRG;
  *  \param obj instance of inference algorithm to be used 
  *  \param vs variables for which the marginal should be calculated
  *  \param reInit should be set to \c true if at least one of the possible clamped states would be invalid (leading to a factor graph with zero partition sum).
+ *  \param nthreads number of threads to use (0 means one per processor); each thread runs a separate clone of \a obj
+ *         on a contiguous block of clamped states (see dai::nrThreads())
+ *  \note If \a reInit == \c false, the result may depend slightly on \a nthreads, because each clamped run starts from the
+ *  messages of the previous run by the same thread.
  */
-Factor calcMarginal( const InfAlg& obj, const VarSet& vs, bool reInit );
+Factor calcMarginal( const InfAlg& obj, const VarSet& vs, bool reInit, size_t nthreads=1 );
 
 
 /// Calculates beliefs for all pairs of variables in \a vs using inference algorithm \a obj.
@@ -274,8 +293,9 @@ Factor calcMarginal( const InfAlg& obj, const VarSet& vs, bool reInit );
  *  \param vs variables for which the pair beliefs should be calculated
  *  \param reInit should be set to \c true if at least one of the possible clamped states would be invalid (leading to a factor graph with zero partition sum).
  *  \param accurate if \c true, uses a slower but more accurate approximation algorithm
+ *  \param nthreads number of threads to use (0 means one per processor), as in calcMarginal()
  */
-std::vector<Factor> calcPairBeliefs( const InfAlg& obj, const VarSet& vs, bool reInit, bool accurate=false );
+std::vector<Factor> calcPairBeliefs( const InfAlg& obj, const VarSet& vs, bool reInit, bool accurate=false, size_t nthreads=1 );
 
 
 /// Calculates the joint state of all variables that has maximum probability, according to the inference algorithm \a obj
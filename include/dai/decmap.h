@@ -15,6 +15,7 @@
 
 
 #include <dai/daialg.h>
+#include <dai/indexedheap.h>
 
 
 namespace dai {
@@ -24,6 +25,11 @@ namespace dai {
 /** Decimation involves repeating the following two steps until no free variables remain:
  *  - run an approximate inference algorithm,
  *  - clamp the factor with the lowest entropy to its most probable state
+ *
+ *  Variables whose beliefs have zero entropy are clamped as well. The factors are kept in a
+ *  priority queue ordered by the entropy of their beliefs, whose entries are only updated if
+ *  the entropy has changed. Optionally, several factors with low entropy can be clamped in
+ *  each round (see Properties::batchsize), which reduces the number of inference runs.
  */
 class DecMAP : public DAIAlgFG {
     private:
@@ -45,6 +51,12 @@ class DecMAP : public DAIAlgFG {
             /// Complete or partial reinitialization of clamped subgraphs?
             bool reinit;
 
+            /// Maximum number of factors that are clamped in each round
+            /** The free factors with the lowest entropies are clamped, skipping factors that share
+             *  a variable with a factor that has already been clamped in the same round.
+             */
+            size_t batchsize;
+
             /// Name of the algorithm used to calculate the beliefs on clamped subgraphs
             std::string ianame;
 
@@ -670,6 +670,34 @@
  *  \f]
  *
  *
+ *  \section fileformats-binaryfactorgraph Binary factor graph file format
+ *
+ *  Since parsing large .fg files can take a long time, factor graphs can also be
+ *  stored in a binary file format (see FactorGraph::WriteToBinaryFile() and
+ *  FactorGraph::ReadFromBinaryFile()). All integers are stored in the byte order
+ *  of the machine that wrote the file; all integer arrays consist of 8-byte words,
+ *  so that they and the factor values are properly aligned when the file is
+ *  memory-mapped. A binary factor graph file consists of:
+ *    - a header of 56 bytes, consisting of:
+ *      - the 8 characters <tt>libDAIfg</tt>;
+ *      - four 32-bit unsigned integers: the version of the file format (currently 1),
+ *        the number 0x01020304 (used to detect a different byte order), the size of
+ *        a factor value in bytes (8 for double precision, 4 for single precision, see
+ *        WITH_SINGLE_PRECISION in Makefile.ALL) and 0;
+ *      - four 64-bit unsigned integers: the number of variables \f$N\f$, the number of factors
+ *        \f$M\f$, the total number of variables in all factor scopes \f$S\f$ and the total
+ *        number of factor values \f$V\f$;
+ *    - \f$N\f$ 64-bit unsigned integers: the labels of the variables, in increasing order;
+ *    - \f$N\f$ 64-bit unsigned integers: the numbers of possible values of the variables;
+ *    - \f$M+1\f$ 64-bit unsigned integers: the offsets of the factor scopes, where the scope of
+ *      the \f$I\f$'th factor consists of the entries with offsets \f$o_I, \dots, o_{I+1}-1\f$ of the
+ *      following array;
+ *    - \f$S\f$ 64-bit unsigned integers: the indices of the variables in the factor scopes
+ *      (for each factor in increasing order);
+ *    - \f$V\f$ factor values: the values of all factors, one after another, using the convention
+ *      that the variable with the smallest label cycles through its values the fastest.
+ *
+ *
  *  \section fileformats-evidence Evidence (.tab) file format
  *
  *  This section describes the .tab fileformat used in libDAI to store "evidence",
@@ -79,6 +79,14 @@ class ParameterEstimation {
         /// Accumulate the sufficient statistics for \a p.
         virtual void addSufficientStatistics( const Prob &p ) = 0;
 
+        /// Accumulate the sufficient statistics for \a p, as if addSufficientStatistics() were called \a count times.
+        /** The default implementation simply calls addSufficientStatistics() \a count times.
+         */
+        virtual void addRepeatedSufficientStatistics( const Prob &p, size_t count ) {
+            for( size_t i = 0; i < count; i++ )
+                addSufficientStatistics( p );
+        }
+
         /// Returns the size of the Prob that should be passed to addSufficientStatistics.
         virtual size_t probSize() const = 0;
 
@@ -137,6 +145,9 @@ class CondProbEstimation : private ParameterEstimation {
         /// Accumulate sufficient statistics from the expectations in \a p
         virtual void addSufficientStatistics( const Prob &p );
 
+        /// Accumulate sufficient statistics from the expectations in \a p, multiplied by \a count
+        virtual void addRepeatedSufficientStatistics( const Prob &p, size_t count );
+
         /// Returns the required size for arguments to addSufficientStatistics().
         virtual size_t probSize() const { return _stats.size(); }
 };
@@ -219,6 +230,17 @@ class SharedParameters {
          */
         void collectSufficientStatistics( InfAlg &alg );
 
+        /// Calculate the sufficient statistics that collectSufficientStatistics() would collect from \a alg, without adding them
+        /** The result contains the permuted expected values for each of the relevant factors, in the order in which
+         *  collectSufficientStatistics() adds them.
+         */
+        std::vector<Prob> calcSufficientStatistics( const InfAlg &alg ) const;
+
+        /// Add sufficient statistics \a stats that have been calculated by calcSufficientStatistics(), \a count times
+        /** \see ParameterEstimation::addRepeatedSufficientStatistics()
+         */
+        void addSufficientStatistics( const std::vector<Prob> &stats, size_t count = 1 );
+
         /// Estimate and set the shared parameters
         /** Based on the sufficient statistics collected so far, the shared parameters are estimated
          *  using the parameter estimation subclass method estimate(). Then, each of the relevant
@@ -252,6 +274,16 @@ class MaximizationStep {
         /// Collect the beliefs from this InfAlg as expectations for the next Maximization step
         void addExpectations( InfAlg &alg );
 
+        /// Calculate the expectations that addExpectations() would collect from \a alg, without adding them
+        /** The result contains the output of SharedParameters::calcSufficientStatistics() for each parameter estimation task.
+         */
+        std::vector<std::vector<Prob> > calcExpectations( const InfAlg &alg ) const;
+
+        /// Add expectations \a expectations that have been calculated by calcExpectations(), \a count times
+        /** \see SharedParameters::addSufficientStatistics()
+         */
+        void addExpectations( const std::vector<std::vector<Prob> > &expectations, size_t count = 1 );
+
         /// Using all of the currently added expectations, make new factors with maximized parameters and set them in the FactorGraph.
         void maximize( FactorGraph &fg );
 
@@ -315,6 +347,12 @@ class EMAlg {
         /// Convergence tolerance
         Real _log_z_tol;
 
+        /// Number of threads used for the expectation step
+        size_t _nthreads;
+
+        /// Whether the expectation step is done only once for each distinct sample
+        bool _dedup_samples;
+
     public:
         /// Key for setting maximum iterations
         static const std::string MAX_ITERS_KEY;
@@ -324,6 +362,14 @@ class EMAlg {
         static const std::string LOG_Z_TOL_KEY;
         /// Default likelihood tolerance
         static const Real LOG_Z_TOL_DEFAULT;
+        /// Key for setting the number of threads used for the expectation step
+        static const std::string NTHREADS_KEY;
+        /// Default number of threads used for the expectation step
+        static const size_t NTHREADS_DEFAULT;
+        /// Key for setting whether the expectation step is done only once for each distinct sample
+        static const std::string DEDUP_SAMPLES_KEY;
+        /// Default for doing the expectation step only once for each distinct sample
+        static const bool DEDUP_SAMPLES_DEFAULT;
 
         /// Construct an EMAlg from several objects
         /** \param evidence Specifies the observed evidence
@@ -332,7 +378,7 @@ class EMAlg {
          *  \param termconditions Termination conditions @see setTermConditions()
          */
         EMAlg( const Evidence &evidence, InfAlg &estep, std::vector<MaximizationStep> &msteps, const PropertySet &termconditions )
-          : _evidence(evidence), _estep(estep), _msteps(msteps), _iters(0), _lastLogZ(), _max_iters(MAX_ITERS_DEFAULT), _log_z_tol(LOG_Z_TOL_DEFAULT)
+          : _evidence(evidence), _estep(estep), _msteps(msteps), _iters(0), _lastLogZ(), _max_iters(MAX_ITERS_DEFAULT), _log_z_tol(LOG_Z_TOL_DEFAULT), _nthreads(NTHREADS_DEFAULT), _dedup_samples(DEDUP_SAMPLES_DEFAULT)
         {
               setTermConditions( termconditions );
         }
@@ -347,6 +393,11 @@ class EMAlg {
          *    - \a max_iters maximum number of iterations
          *    - \a log_z_tol critical proportion of increase in logZ
          *
+         *  In addition, \a p may specify
+         *    - \a nthreads number of threads used for the expectation step (0 means one per processor, see dai::nrThreads())
+         *    - \a dedup_samples if nonzero, the inference of the expectation step is done only once for each distinct
+         *      sample in the evidence (see iterate( MaximizationStep& ))
+         *
          *  \see hasSatisifiedTermConditions()
          */
         void setTermConditions( const PropertySet &p );
@@ -375,6 +426,16 @@ class EMAlg {
         Real iterate();
 
         /// Iterate over a single MaximizationStep
+        /** If \a dedup_samples has been set (see setTermConditions()), inference is done only once for each
+         *  distinct sample; its contribution to the likelihood is multiplied by the number of times \a n it
+         *  occurs in the evidence, and its expectations are added \a n times (see
+         *  ParameterEstimation::addRepeatedSufficientStatistics()). This gives the same results only if the
+         *  E-step algorithm is deterministic (e.g., not GIBBS).
+         *
+         *  The expectation step can be distributed over several threads (see setTermConditions()). Each thread
+         *  reuses a single clone of the E-step algorithm, which is reclamped for each sample (see InfAlg::reclamp()). The
+         *  expectations are added in the order of the samples, so the result does not depend on the number of threads.
+         */
         Real iterate( MaximizationStep &mstep );
 
         /// Iterate until termination conditions are satisfied
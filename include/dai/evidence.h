@@ -15,6 +15,9 @@
 
 
 #include <istream>
+#include <iterator>
+#include <cstddef>
+#include <boost/cstdint.hpp>
 #include <dai/daialg.h>
 
 
@@ -25,6 +28,12 @@ namespace dai {
 /** \note Each sample can describe the joint state of a different set of variables,
  *  in order to be able to deal with missing data.
  *
+ *  The data set is stored column-wise: for each variable that occurs in the data set,
+ *  there is an array containing its state in each sample, and a bit mask indicating
+ *  whether its state has been observed in that sample. Samples can be accessed through
+ *  nrSamples(), observed() and state(), without constructing an Observation for each
+ *  sample, or as Observations through sample() and const_iterator.
+ *
  *  \author Charles Vaske
  */
 class Evidence {
@@ -32,48 +41,225 @@ class Evidence {
         /// Stores joint state of a set of variables
         typedef std::map<Var, size_t> Observation;
 
+        class TabFileReader;
+        friend class TabFileReader;
+
     private:
-        /// Each sample is an observed joint state of some variables
-        std::vector<Observation> _samples;
+        /// Type used to store the observed states
+        typedef boost::uint32_t State;
+
+        /// Variables occurring in the data set (one for each column)
+        std::vector<Var> _vars;
+        /// Maps each variable to its column
+        std::map<Var, size_t> _columns;
+        /// For each column, the state of the variable in each sample
+        std::vector<std::vector<State> > _states;
+        /// For each column, whether the variable has been observed in each sample
+        std::vector<std::vector<bool> > _observed;
+        /// Number of samples
+        size_t _nrSamples;
 
     public:
+    /// \name Constructors
+    //@{
         /// Default constructor
-        Evidence() : _samples() {}
+        Evidence() : _vars(), _columns(), _states(), _observed(), _nrSamples(0) {}
 
         /// Construct from \a samples
-        Evidence( std::vector<Observation> &samples ) : _samples(samples) {}
+        Evidence( const std::vector<Observation> &samples );
+    //@}
+
+    /// \name Iterator interface
+    //@{
+        /// Constant iterator over the samples, which yields each sample as an Observation
+        /** \note Since the samples are stored column-wise, dereferencing the iterator constructs
+         *  the Observation (see sample()) and returns it by value.
+         */
+        class const_iterator {
+            public:
+                /// Iterator category
+                typedef std::input_iterator_tag iterator_category;
+                /// Type of the samples
+                typedef Observation value_type;
+                /// Type of the difference between two iterators
+                typedef std::ptrdiff_t difference_type;
+                /// Pointer type
+                typedef const Observation* pointer;
+                /// Type returned by dereferencing (a copy, as the samples are not stored as Observations)
+                typedef Observation reference;
+
+            private:
+                /// The data set
+                const Evidence *_evidence;
+                /// Index of the current sample
+                size_t _s;
+
+            public:
+                /// Default constructor
+                const_iterator() : _evidence(NULL), _s(0) {}
+                /// Constructs an iterator that points to sample \a s of \a evidence
+                const_iterator( const Evidence &evidence, size_t s ) : _evidence(&evidence), _s(s) {}
+
+                /// Returns the current sample
+                Observation operator*() const { return _evidence->sample( _s ); }
+                /// Returns the index of the current sample
+                size_t index() const { return _s; }
+
+                /// Prefix increment operator
+                const_iterator& operator++() { _s++; return *this; }
+                /// Postfix increment operator
+                const_iterator operator++( int ) { const_iterator x( *this ); _s++; return x; }
+                /// Returns an iterator that points \a n samples further
+                const_iterator operator+( difference_type n ) const { return const_iterator( *_evidence, _s + n ); }
+                /// Returns the number of samples between \a x and \c *this
+                difference_type operator-( const const_iterator &x ) const { return (difference_type)_s - (difference_type)x._s; }
+
+                /// Returns \c true if both iterators point to the same sample
+                bool operator==( const const_iterator &x ) const { return _evidence == x._evidence && _s == x._s; }
+                /// Returns \c true if the iterators point to different samples
+                bool operator!=( const const_iterator &x ) const { return !(*this == x); }
+        };
 
+        /// Returns constant iterator that points to the first sample
+        const_iterator begin() const { return const_iterator( *this, 0 ); }
+        /// Returns constant iterator that points beyond the last sample
+        const_iterator end() const { return const_iterator( *this, _nrSamples ); }
+    //@}
+
+    /// \name Adding samples
+    //@{
         /// Read in tabular data from a stream and add the read samples to \c *this.
         /** \param is Input stream in .tab file format, describing joint observations of variables in \a fg
          *  \param fg Factor graph describing the corresponding variables
-         *  \see \ref fileformats-evidence
+         *  \see \ref fileformats-evidence, TabFileReader
          *  \throw INVALID_EVIDENCE_FILE if the input stream is not valid
          */
-        void addEvidenceTabFile( std::istream& is, FactorGraph& fg );
+        void addEvidenceTabFile( std::istream& is, const FactorGraph& fg );
 
-        /// Returns number of stored samples
-        size_t nrSamples() const { return _samples.size(); }
+        /// Adds the sample \a sample
+        /** \throw INVALID_EVIDENCE_FILE if an observed state is too large
+         */
+        void addSample( const Observation &sample );
 
-    /// \name Iterator interface
+        /// Adds samples from a two-dimensional array
+        /** \param vars Variables corresponding to the columns of the array
+         *  \param states The array of observed states (in row-major order, i.e., the state of \a vars[j] in sample \a s is \a states[s * vars.size() + j])
+         *  \param observed Indicates which entries of \a states have been observed (if empty, all entries are observed)
+         *  \throw INVALID_EVIDENCE_FILE if the array sizes do not match or if an observed state is too large
+         */
+        void addSamples( const std::vector<Var> &vars, const std::vector<size_t> &states, const std::vector<bool> &observed = std::vector<bool>() );
+
+        /// Removes all samples and variables
+        void clear();
+    //@}
+
+    /// \name Queries
     //@{
-        /// Iterator over the samples
-        typedef std::vector<Observation>::iterator iterator;
-        /// Constant iterator over the samples
-        typedef std::vector<Observation>::const_iterator const_iterator;
+        /// Returns number of stored samples
+        size_t nrSamples() const { return _nrSamples; }
 
-        /// Returns iterator that points to the first sample
-        iterator begin() { return _samples.begin(); }
-        /// Returns constant iterator that points to the first sample
-        const_iterator begin() const { return _samples.begin(); }
-        /// Returns iterator that points beyond the last sample
-        iterator end() { return _samples.end(); }
-        /// Returns constant iterator that points beyond the last sample
-        const_iterator end() const { return _samples.end(); }
+        /// Returns the number of variables occurring in the data set
+        size_t nrVars() const { return _vars.size(); }
+
+        /// Returns the variables occurring in the data set (in the order of the columns)
+        const std::vector<Var> &vars() const { return _vars; }
+
+        /// Returns the column corresponding to the variable \a v
+        /** \throw OBJECT_NOT_FOUND if \a v does not occur in the data set
+         */
+        size_t findVar( const Var &v ) const {
+            std::map<Var, size_t>::const_iterator it = _columns.find( v );
+            if( it == _columns.end() )
+                DAI_THROW(OBJECT_NOT_FOUND);
+            return it->second;
+        }
+
+        /// Returns whether the state of the variable in column \a j has been observed in sample \a s
+        bool observed( size_t s, size_t j ) const {
+            DAI_DEBASSERT( j < nrVars() && s < nrSamples() );
+            return _observed[j][s];
+        }
+
+        /// Returns the observed state of the variable in column \a j in sample \a s
+        /** \pre observed( \a s, \a j ) == \c true
+         */
+        size_t state( size_t s, size_t j ) const {
+            DAI_DEBASSERT( observed( s, j ) );
+            return _states[j][s];
+        }
+
+        /// Returns the number of variables whose state has been observed in sample \a s
+        size_t nrObserved( size_t s ) const;
+
+        /// Returns sample \a s as an Observation
+        Observation sample( size_t s ) const;
+
+        /// Finds the distinct samples
+        /** Two samples are identical if they observe the same variables in the same states.
+         *  \param counts Is set to the number of occurrences of each distinct sample
+         *  \returns The index of the first occurrence of each distinct sample, in increasing order
+         */
+        std::vector<size_t> uniqueSamples( std::vector<size_t> &counts ) const;
     //@}
 
     private:
-        /// Read in tabular data from a stream and add the read samples to \c *this.
-        void addEvidenceTabFile( std::istream& is, std::map<std::string, Var> &varMap );
+        /// Returns the column corresponding to the variable \a v, adding a column if \a v does not occur yet
+        size_t addVar( const Var &v );
+
+        /// Appends a sample in which no variable has been observed
+        void addEmptySample();
+
+        /// Sets the state of the variable in column \a j in the last sample to \a state
+        void setLastState( size_t j, size_t state ) {
+            DAI_DEBASSERT( state < _vars[j].states() );
+            _states[j].back() = (State)state;
+            _observed[j].back() = true;
+        }
+};
+
+
+/// Reads samples from a stream in .tab file format, in chunks of a given number of samples
+/** This can be used to process data sets that are too large to be kept in memory:
+ *  \code
+ *  Evidence::TabFileReader reader( is, fg );
+ *  Evidence chunk;
+ *  while( reader.read( chunk, 10000 ) ) {
+ *      // process chunk
+ *      chunk.clear();
+ *  }
+ *  \endcode
+ *  The fields are parsed directly from each line, without splitting lines into strings.
+ *  \see \ref fileformats-evidence
+ */
+class Evidence::TabFileReader {
+    private:
+        /// Input stream
+        std::istream &_is;
+        /// Variables corresponding to the columns of the file
+        std::vector<Var> _vars;
+        /// Number of the last line that has been read
+        size_t _lineNumber;
+        /// Buffer for the current line
+        std::string _line;
+        /// Buffer for the states in the current line (missing observations are stored as (size_t)-1)
+        std::vector<size_t> _row;
+
+    public:
+        /// Constructs a reader for the input stream \a is and reads the header
+        /** \param is Input stream in .tab file format, describing joint observations of variables in \a fg
+         *  \param fg Factor graph describing the corresponding variables
+         *  \throw INVALID_EVIDENCE_FILE if the header is not valid
+         */
+        TabFileReader( std::istream &is, const FactorGraph &fg );
+
+        /// Returns the variables corresponding to the columns of the file
+        const std::vector<Var> &vars() const { return _vars; }
+
+        /// Reads at most \a maxSamples samples and adds them to \a evidence
+        /** \returns The number of samples that have been read (zero if the end of the stream has been reached)
+         *  \throw INVALID_EVIDENCE_FILE if a line is not valid
+         */
+        size_t read( Evidence &evidence, size_t maxSamples = (size_t)-1 );
 };
 
 
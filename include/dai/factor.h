@@ -59,6 +59,35 @@ class TFactor {
         /// Stores the factor values
         TProb<T> _p;
 
+        /// Stores the result of applying binary operation \a op on \a f and \a g (which should have been resized to <tt>vars.nrStates()</tt>) in \a out
+        /** \pre \a vars should be the union of the variables of \a f and \a g
+         */
+        template<typename binOp> static void binaryOpBlocks( const TFactor<T> &f, const TFactor<T> &g, const VarSet &vars, std::vector<T> &out, binOp op ) {
+            const T *pf = &(f._p.p()[0]);
+            const T *pg = &(g._p.p()[0]);
+            T *pout = &(out[0]);
+            for( BlockIndexFor i( f._vs, g._vs, vars ); i.valid(); ++i ) {
+                const T *a = pf + i.index1();
+                const T *b = pg + i.index2();
+                size_t n = i.blockSize();
+                long sa = i.stride1();
+                long sb = i.stride2();
+                if( sa == 1 && sb == 1 )
+                    for( size_t j = 0; j < n; j++ )
+                        pout[j] = op( a[j], b[j] );
+                else if( sa == 1 && sb == 0 )
+                    for( size_t j = 0; j < n; j++ )
+                        pout[j] = op( a[j], *b );
+                else if( sa == 0 && sb == 1 )
+                    for( size_t j = 0; j < n; j++ )
+                        pout[j] = op( *a, b[j] );
+                else
+                    for( size_t j = 0; j < n; j++ )
+                        pout[j] = op( a[j * sa], b[j * sb] );
+                pout += n;
+            }
+        }
+
     public:
     /// \name Constructors and destructors
     //@{
@@ -345,15 +374,8 @@ class TFactor {
             else {
                 TFactor<T> f(*this); // make a copy
                 _vs |= g._vs;
-                size_t N = BigInt_size_t( _vs.nrStates() );
-
-                IndexFor i_f( f._vs, _vs );
-                IndexFor i_g( g._vs, _vs );
-
-                _p.p().clear();
-                _p.p().reserve( N );
-                for( size_t i = 0; i < N; i++, ++i_f, ++i_g )
-                    _p.p().push_back( op( f._p[i_f], g._p[i_g] ) );
+                _p.p().resize( BigInt_size_t( _vs.nrStates() ) );
+                binaryOpBlocks( f, g, _vs, _p.p(), op );
             }
             return *this;
         }
@@ -403,15 +425,8 @@ class TFactor {
                 result._p = _p.pwBinaryTr( g._p, op );
             } else {
                 result._vs = _vs | g._vs;
-                size_t N = BigInt_size_t( result._vs.nrStates() );
-
-                IndexFor i_f( _vs, result.vars() );
-                IndexFor i_g( g._vs, result.vars() );
-
-                result._p.p().clear();
-                result._p.p().reserve( N );
-                for( size_t i = 0; i < N; i++, ++i_f, ++i_g )
-                    result._p.p().push_back( op( _p[i_f], g[i_g] ) );
+                result._p.p().resize( BigInt_size_t( result._vs.nrStates() ) );
+                binaryOpBlocks( *this, g, result._vs, result._p.p(), op );
             }
             return result;
         }
@@ -513,9 +528,27 @@ template<typename T> TFactor<T> TFactor<T>::marginal(const VarSet &vars, bool no
 
     TFactor<T> res( res_vars, 0.0 );
 
-    IndexFor i_res( res_vars, _vs );
-    for( size_t i = 0; i < _p.size(); i++, ++i_res )
-        res.set( i_res, res[i_res] + _p[i] );
+    // Loop over blocks of consecutive entries of *this, in the same order as
+    // IndexFor would, so that the entries are added in the same order
+    const T *p = &(_p.p()[0]);
+    T *pres = &(res._p.p()[0]);
+    for( BlockIndexFor i( res_vars, _vs, _vs ); i.valid(); ++i ) {
+        const T *a = p + i.index2();
+        T *r = pres + i.index1();
+        size_t n = i.blockSize();
+        long sr = i.stride1();
+        if( sr == 0 ) {
+            T sum = *r;
+            for( size_t j = 0; j < n; j++ )
+                sum += a[j];
+            *r = sum;
+        } else if( sr == 1 ) {
+            for( size_t j = 0; j < n; j++ )
+                r[j] += a[j];
+        } else
+            for( size_t j = 0; j < n; j++ )
+                r[j * sr] += a[j];
+    }
 
     if( normed )
         res.normalize( NORMPROB );
@@ -529,10 +562,28 @@ template<typename T> TFactor<T> TFactor<T>::maxMarginal(const VarSet &vars, bool
 
     TFactor<T> res( res_vars, 0.0 );
 
-    IndexFor i_res( res_vars, _vs );
-    for( size_t i = 0; i < _p.size(); i++, ++i_res )
-        if( _p[i] > res._p[i_res] )
-            res.set( i_res, _p[i] );
+    const T *p = &(_p.p()[0]);
+    T *pres = &(res._p.p()[0]);
+    for( BlockIndexFor i( res_vars, _vs, _vs ); i.valid(); ++i ) {
+        const T *a = p + i.index2();
+        T *r = pres + i.index1();
+        size_t n = i.blockSize();
+        long sr = i.stride1();
+        if( sr == 0 ) {
+            T max = *r;
+            for( size_t j = 0; j < n; j++ )
+                if( a[j] > max )
+                    max = a[j];
+            *r = max;
+        } else if( sr == 1 ) {
+            for( size_t j = 0; j < n; j++ )
+                if( a[j] > r[j] )
+                    r[j] = a[j];
+        } else
+            for( size_t j = 0; j < n; j++ )
+                if( a[j] > r[j * sr] )
+                    r[j * sr] = a[j];
+    }
 
     if( normed )
         res.normalize( NORMPROB );
@@ -72,12 +72,14 @@ class FactorGraph {
         std::vector<Factor>      _factors;
         /// Stores backups of some factors
         std::map<size_t,Factor>  _backup;
+        /// Stores the original values of the factors that were changed by the last call to reclamp()
+        std::map<size_t,Factor>  _reclampBackup;
 
     public:
     /// \name Constructors and destructors
     //@{
         /// Default constructor
-        FactorGraph() : _G(), _vars(), _factors(), _backup() {}
+        FactorGraph() : _G(), _vars(), _factors(), _backup(), _reclampBackup() {}
 
         /// Constructs a factor graph from a vector of factors
         FactorGraph( const std::vector<Factor>& P );
@@ -90,6 +92,19 @@ class FactorGraph {
         template<typename FactorInputIterator, typename VarInputIterator>
         FactorGraph(FactorInputIterator facBegin, FactorInputIterator facEnd, VarInputIterator varBegin, VarInputIterator varEnd, size_t nrFacHint = 0, size_t nrVarHint = 0 );
 
+        /// Constructs a factor graph from flat arrays, where the factor scopes are given in compressed sparse row format
+        /** This is meant for building large factor graphs in bulk (e.g., from the python interface).
+         *  \param labels Labels of the variables.
+         *  \param states Numbers of states of the variables (should have the same length as \a labels).
+         *  \param scopeBegin Offsets into \a scopeVars, of length <tt>nrFactors()+1</tt>: the \a I 'th factor depends on
+         *    the variables with indices <tt>scopeVars[scopeBegin[I]], ..., scopeVars[scopeBegin[I+1]-1]</tt>.
+         *  \param scopeVars Indices into \a labels.
+         *  \param values Concatenated values of all factors. As in the .fg file format, the values of a factor are ordered
+         *    according to the order in which its variables are listed in \a scopeVars (the first one changing fastest).
+         *  \throw RUNTIME_ERROR if the arrays are inconsistent
+         */
+        FactorGraph( const std::vector<size_t>& labels, const std::vector<size_t>& states, const std::vector<size_t>& scopeBegin, const std::vector<size_t>& scopeVars, const std::vector<Real>& values );
+
         /// Destructor
         virtual ~FactorGraph() {}
 
@@ -296,6 +311,16 @@ class FactorGraph {
          */
         virtual void clamp( size_t i, size_t x, bool backup = false );
 
+        /// Undo the clamping of the previous call to reclamp() and clamp the variables in \a x instead
+        /** First restores the factors that were changed by the previous call to reclamp(), then clamps the
+         *  variable with index \a i to value \a x[i] for all \a i in \a x, remembering the original value of
+         *  each factor that is changed. Changes made in any other way (e.g., by clamp()) are left alone, and
+         *  the backups made by backupFactors() are not touched.
+         *  This allows one to use the same object for many different clampings (e.g., for each evidence sample)
+         *  without copying it: only the factors neighboring the clamped variables are visited.
+         */
+        virtual void reclamp( const std::map<size_t, size_t>& x );
+
         /// Clamp a variable in a factor graph to have one out of a list of values
         /** If \a backup == \c true, make a backup of all factors that are changed
          */
@@ -327,6 +352,22 @@ class FactorGraph {
          */
         virtual void WriteToFile( const char *filename, size_t precision=15 ) const;
 
+        /// Reads a factor graph from a binary file
+        /** On POSIX systems, the file is memory-mapped and the factor values are copied directly
+         *  from the mapped file, so that no parsing is needed.
+         *  \see \ref fileformats-binaryfactorgraph
+         *  \throw CANNOT_READ_FILE if the file cannot be opened
+         *  \throw INVALID_FACTORGRAPH_FILE if the file is not valid
+         */
+        virtual void ReadFromBinaryFile( const char *filename );
+
+        /// Writes a factor graph to a binary file
+        /** The values of the factors are stored exactly, in the internal representation of libDAI.
+         *  \see \ref fileformats-binaryfactorgraph
+         *  \throw CANNOT_WRITE_FILE if the file cannot be written
+         */
+        virtual void WriteToBinaryFile( const char *filename ) const;
+
         /// Writes a factor graph to an output stream
         /** \see \ref fileformats-factorgraph
          */
@@ -349,7 +390,7 @@ class FactorGraph {
 
 
 template<typename FactorInputIterator, typename VarInputIterator>
-FactorGraph::FactorGraph(FactorInputIterator facBegin, FactorInputIterator facEnd, VarInputIterator varBegin, VarInputIterator varEnd, size_t nrFacHint, size_t nrVarHint ) : _G(), _backup() {
+FactorGraph::FactorGraph(FactorInputIterator facBegin, FactorInputIterator facEnd, VarInputIterator varBegin, VarInputIterator varEnd, size_t nrFacHint, size_t nrVarHint ) : _G(), _backup(), _reclampBackup() {
     // add factors
     size_t nrEdges = 0;
     _factors.reserve( nrFacHint );
@@ -17,13 +17,21 @@
 #include <dai/daialg.h>
 #include <dai/factorgraph.h>
 #include <dai/properties.h>
+#include <dai/enum.h>
+#include <boost/random/mersenne_twister.hpp>
 
 
 namespace dai {
 
 
 /// Approximate inference algorithm "Gibbs sampling"
-/** \author Frederik Eaton
+/** If Properties::nrchains is larger than one, run() samples several independent chains (distributed
+ *  over Properties::nthreads threads), each having its own random number generator and its own
+ *  counts. When the chains are finished, their counts are added, and the potential scale reduction
+ *  factor \f$\hat R\f$ of Gelman and Rubin is calculated for each variable, which can be used to
+ *  diagnose convergence (values close to one indicate that the chains sample from the same distribution).
+ *
+ *  \author Frederik Eaton
  */
 class Gibbs : public DAIAlgFG {
     private:
@@ -45,6 +53,24 @@ class Gibbs : public DAIAlgFG {
         _state_t _max_state;
         /// Highest score so far
         Real _max_score;
+        /// Linear index into each factor corresponding to the current state
+        std::vector<size_t> _factor_entries;
+        /// For each variable \a i and each neighboring factor \a I (indexed by its position in nbV(i)), the stride of \a i in the linear index into \a I
+        std::vector<std::vector<size_t> > _var_strides;
+        /// Sum of the logarithms of the nonzero factor entries corresponding to the current state
+        Real _log_score;
+        /// Number of factor entries corresponding to the current state that are zero
+        size_t _nr_zero_entries;
+        /// Number of iterations after which _log_score is recalculated from scratch, which bounds its accumulated rounding errors
+        static const size_t _resync_interval = 100;
+        /// Potential scale reduction factor of each variable (calculated by run() if Properties::nrchains > 1)
+        std::vector<Real> _rhat;
+        /// Groups of variables that are resampled together (the color classes for CHROMATIC updates, the blocks for BLOCKED updates)
+        std::vector<std::vector<size_t> > _var_groups;
+        /// Random number generator of this chain
+        boost::mt19937 _rnd_gen;
+        /// Whether _rnd_gen should be used (instead of the global random number generator)
+        bool _own_rnd;
 
     public:
         /// Parameters for Gibbs
@@ -63,17 +89,44 @@ class Gibbs : public DAIAlgFG {
 
             /// Verbosity (amount of output sent to stderr)
             size_t verbose;
+
+            /// Enumeration of possible update schedules
+            /** The following update schedules have been defined:
+             *  - SEQ resamples the variables one at a time, in the order 0, 1, ..., nrVars()-1
+             *  - CHROMATIC colors the Markov graph and resamples the variables of each color class
+             *    (which are conditionally independent given all other variables) in parallel
+             *  - BLOCKED resamples connected blocks of at most Properties::blocksize variables jointly,
+             *    drawing each block from its exact conditional distribution
+             */
+            DAI_ENUM(UpdateType,SEQ,CHROMATIC,BLOCKED);
+
+            /// Update schedule
+            UpdateType updates;
+
+            /// Maximum number of variables in a block (for BLOCKED updates)
+            size_t blocksize;
+
+            /// Number of independent chains
+            size_t nrchains;
+
+            /// Number of threads used for sampling the chains, or for resampling each color class if there is only one chain and \a updates == CHROMATIC (0 means one thread per available processor)
+            /** \note Only has an effect if libDAI has been built with OpenMP support (see WITH_OPENMP in Makefile.ALL).
+             *  The random number generator of each chain is seeded from the global random number generator
+             *  before the chains are started, and the random numbers for a color class are drawn before
+             *  its variables are resampled, so the results do not depend on the number of threads.
+             */
+            size_t nthreads;
         } props;
 
     public:
         /// Default constructor
-        Gibbs() : DAIAlgFG(), _sample_count(0), _var_counts(), _factor_counts(), _iters(0), _state(), _max_state(), _max_score(-INFINITY) {}
+        Gibbs() : DAIAlgFG(), _sample_count(0), _var_counts(), _factor_counts(), _iters(0), _state(), _max_state(), _max_score(-INFINITY), _factor_entries(), _var_strides(), _log_score(0.0), _nr_zero_entries(0), _rhat(), _var_groups(), _rnd_gen(), _own_rnd(false) {}
 
         /// Construct from FactorGraph \a fg and PropertySet \a opts
         /** \param fg Factor graph.
          *  \param opts Parameters @see Properties
          */
-        Gibbs( const FactorGraph &fg, const PropertySet &opts ) : DAIAlgFG(fg), _sample_count(0), _var_counts(), _factor_counts(), _iters(0), _state(), _max_state(), _max_score(-INFINITY) {
+        Gibbs( const FactorGraph &fg, const PropertySet &opts ) : DAIAlgFG(fg), _sample_count(0), _var_counts(), _factor_counts(), _iters(0), _state(), _max_state(), _max_score(-INFINITY), _factor_entries(), _var_strides(), _log_score(0.0), _nr_zero_entries(0), _rhat(), _var_groups(), _rnd_gen(), _own_rnd(false) {
             setProperties( opts );
             construct();
         }
@@ -111,6 +164,28 @@ class Gibbs : public DAIAlgFG {
         std::vector<size_t>& state() { return _state; }
         /// Return constant reference to current state of all variables
         const std::vector<size_t>& state() const { return _state; }
+        /// Returns the linear index into each factor corresponding to the current state
+        /** The indices are tracked incrementally while sampling. If the current state has been changed
+         *  through state(), they are only recalculated by the next run().
+         */
+        const std::vector<size_t>& factorEntries() const { return _factor_entries; }
+        /// Returns the logarithm of the score of the current state (as calculated by logScore(), but incrementally tracked)
+        /** \see factorEntries()
+         */
+        Real currentLogScore() const { return _nr_zero_entries ? -INFINITY : _log_score; }
+        /// Returns the groups of variables that are resampled together, as calculated by the last run()
+        /** These are the color classes for CHROMATIC updates and the blocks for BLOCKED updates (and empty for SEQ updates).
+         */
+        const std::vector<std::vector<size_t> >& varGroups() const { return _var_groups; }
+        /// Returns the potential scale reduction factor of variable \a i, calculated by the last run() with Properties::nrchains > 1
+        /** The factor is calculated for the indicator function of each state of the variable, and the maximum over these states is returned.
+         */
+        Real RhatV( size_t i ) const {
+            DAI_ASSERT( i < _rhat.size() );
+            return _rhat[i];
+        }
+        /// Returns the maximum potential scale reduction factor of all variables, calculated by the last run() with Properties::nrchains > 1
+        Real Rhat() const;
     //@}
 
     private:
@@ -118,14 +193,35 @@ class Gibbs : public DAIAlgFG {
         void construct();
         /// Updates all counts (_sample_count, _var_counts, _factor_counts) based on current state
         void updateCounts();
+        /// Samples the chain, starting from the current state, until Properties::maxiter iterations have been done or Properties::maxtime has passed
+        void runChain();
+        /// Samples Properties::nrchains independent chains, adds their counts and calculates the potential scale reduction factors
+        void runChains();
+        /// Returns a random number drawn from the uniform distribution on [0,1), using the random number generator of this chain
+        Real rndUniform();
         /// Calculate conditional distribution of variable \a i, given the current state
         Prob getVarDist( size_t i );
         /// Draw state of variable \a i randomly from its conditional distribution and update the current state
         void resampleVar( size_t i );
+        /// Draws a state of variable \a i from its conditional distribution, using the uniform random number \a u
+        size_t drawVar( size_t i, Real u );
+        /// Sets the state of variable \a i to \a st_i and updates the factor entries, adding the resulting change of the score to \a logScoreDiff and \a nrZeroEntriesDiff
+        void setVarState( size_t i, size_t st_i, Real &logScoreDiff, long &nrZeroEntriesDiff );
+        /// Draws the joint state of the variables in \a block randomly from their conditional distribution and updates the current state
+        void resampleBlock( const std::vector<size_t> &block );
+        /// Resamples all variables once, according to Properties::updates
+        void sweep();
+        /// Calculates _var_groups according to Properties::updates
+        void calcVarGroups();
         /// Calculates linear index into factor \a I corresponding to the current state
         size_t getFactorEntry( size_t I );
         /// Calculates the differences between linear indices into factor \a I corresponding with a state change of variable \a i
         size_t getFactorEntryDiff( size_t I, size_t i );
+        /// Recalculates _factor_entries, _log_score and _nr_zero_entries from the current state
+        /** This is needed whenever the current state has been changed by other means than resampleVar(),
+         *  which updates them incrementally.
+         */
+        void calcFactorEntries();
 };
 
 
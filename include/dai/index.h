@@ -7,7 +7,7 @@
 
 
 /// \file
-/// \brief Defines the IndexFor, multifor, Permute and State classes, which all deal with indexing multi-dimensional arrays
+/// \brief Defines the IndexFor, BlockIndexFor, multifor, Permute and State classes, which all deal with indexing multi-dimensional arrays
 
 
 #ifndef __defined_libdai_index_h
@@ -130,6 +130,179 @@ class IndexFor {
 };
 
 
+/// Tool for looping over the states of several variables in blocks.
+/** The class BlockIndexFor loops over all joint states of \a forVars, just like
+ *  IndexFor, and keeps track of the corresponding linear indices of two sets of
+ *  variables \a indexVars1 and \a indexVars2 simultaneously. Instead of visiting
+ *  the joint states one at a time, it visits them in blocks of blockSize()
+ *  consecutive joint states of \a forVars. Within a block, the linear index of
+ *  \a indexVars1 (resp. \a indexVars2) increases by stride1() (resp. stride2())
+ *  when going from one joint state to the next, which allows the innermost loop
+ *  of operations on factors to be written as a tight loop over arrays.
+ *
+ *  A block is obtained by merging as many of the variables of \a forVars with the
+ *  lowest labels as possible, starting at the one with the lowest label: two
+ *  subsequent variables are merged if they are laid out consecutively in both
+ *  \a indexVars1 and \a indexVars2 (or are both absent from them). Subsequent
+ *  variables are merged in the same way for the loop over the blocks.
+ *  The following code:
+ *  \code
+ *      size_t iter = 0;
+ *      for( BlockIndexFor i( indexVars1, indexVars2, forVars ); i.valid(); ++i )
+ *          for( size_t j = 0; j < i.blockSize(); j++, iter++ ) {
+ *              size_t i1 = i.index1() + j * i.stride1();
+ *              size_t i2 = i.index2() + j * i.stride2();
+ *          }
+ *  \endcode
+ *  yields the same values for \c i1 and \c i2 in iteration \c iter as
+ *  <tt>(size_t)IndexFor( indexVars1, forVars )</tt> and
+ *  <tt>(size_t)IndexFor( indexVars2, forVars )</tt>, respectively,
+ *  after \c iter increments.
+ */
+class BlockIndexFor {
+    private:
+        /// A merged dimension outside of the block
+        struct Dim {
+            /// Number of possible values
+            size_t range;
+            /// Amount of change in the linear index of indexVars1
+            long   sum1;
+            /// Amount of change in the linear index of indexVars2
+            long   sum2;
+            /// Current state
+            size_t state;
+        };
+
+        /// The current linear index of indexVars1 corresponding to the first state in the current block
+        long                _index1;
+
+        /// The current linear index of indexVars2 corresponding to the first state in the current block
+        long                _index2;
+
+        /// The number of joint states of forVars in each block
+        size_t              _blockSize;
+
+        /// The amount of change in _index1 within a block
+        long                _stride1;
+
+        /// The amount of change in _index2 within a block
+        long                _stride2;
+
+        /// The merged dimensions outside of the block
+        std::vector<Dim>    _dims;
+
+    public:
+        /// Default constructor
+        BlockIndexFor() : _index1(-1), _index2(-1), _blockSize(0), _stride1(0), _stride2(0), _dims() {}
+
+        /// Construct BlockIndexFor object from \a indexVars1, \a indexVars2 and \a forVars
+        BlockIndexFor( const VarSet& indexVars1, const VarSet& indexVars2, const VarSet& forVars ) : _index1(0), _index2(0), _blockSize(1), _stride1(0), _stride2(0), _dims() {
+            VarSet::const_iterator i1 = indexVars1.begin();
+            VarSet::const_iterator i2 = indexVars2.begin();
+            long prod1 = 1, prod2 = 1;
+            Dim dim = { 1, 0, 0, 0 };
+            bool first = true;
+            for( VarSet::const_iterator j = forVars.begin(); j != forVars.end(); ++j ) {
+                // Calculate the amount of change in the linear indices of indexVars1 and indexVars2 for variable *j
+                for( ; i1 != indexVars1.end() && *i1 < *j; ++i1 )
+                    prod1 *= i1->states();
+                for( ; i2 != indexVars2.end() && *i2 < *j; ++i2 )
+                    prod2 *= i2->states();
+                long sum1 = (i1 != indexVars1.end() && *i1 == *j) ? prod1 : 0;
+                long sum2 = (i2 != indexVars2.end() && *i2 == *j) ? prod2 : 0;
+
+                // Merge it with the current dimension if possible
+                if( dim.range > 1 && (sum1 != dim.sum1 * (long)dim.range || sum2 != dim.sum2 * (long)dim.range) ) {
+                    if( first ) {
+                        _blockSize = dim.range;
+                        _stride1 = dim.sum1;
+                        _stride2 = dim.sum2;
+                        first = false;
+                    } else
+                        _dims.push_back( dim );
+                    dim.range = 1;
+                }
+                if( dim.range == 1 ) {
+                    dim.sum1 = sum1;
+                    dim.sum2 = sum2;
+                }
+                dim.range *= j->states();
+            }
+            if( first ) {
+                _blockSize = dim.range;
+                _stride1 = dim.sum1;
+                _stride2 = dim.sum2;
+            } else
+                _dims.push_back( dim );
+        }
+
+        /// Resets the state
+        BlockIndexFor& reset() {
+            for( size_t i = 0; i < _dims.size(); i++ )
+                _dims[i].state = 0;
+            _index1 = 0;
+            _index2 = 0;
+            return( *this );
+        }
+
+        /// Returns the linear index of indexVars1 corresponding to the first state in the current block
+        size_t index1() const {
+            DAI_DEBASSERT( valid() );
+            return( _index1 );
+        }
+
+        /// Returns the linear index of indexVars2 corresponding to the first state in the current block
+        size_t index2() const {
+            DAI_DEBASSERT( valid() );
+            return( _index2 );
+        }
+
+        /// Returns the number of joint states of forVars in each block
+        size_t blockSize() const { return _blockSize; }
+
+        /// Returns the amount of change in the linear index of indexVars1 between subsequent states within a block
+        long stride1() const { return _stride1; }
+
+        /// Returns the amount of change in the linear index of indexVars2 between subsequent states within a block
+        long stride2() const { return _stride2; }
+
+        /// Proceeds to the next block (prefix)
+        BlockIndexFor& operator++ () {
+            if( _index1 >= 0 ) {
+                size_t i = 0;
+
+                while( i < _dims.size() ) {
+                    Dim &dim = _dims[i];
+                    _index1 += dim.sum1;
+                    _index2 += dim.sum2;
+                    if( ++dim.state < dim.range )
+                        break;
+                    _index1 -= dim.sum1 * dim.range;
+                    _index2 -= dim.sum2 * dim.range;
+                    dim.state = 0;
+                    i++;
+                }
+
+                if( i == _dims.size() ) {
+                    _index1 = -1;
+                    _index2 = -1;
+                }
+            }
+            return( *this );
+        }
+
+        /// Proceeds to the next block (postfix)
+        void operator++( int ) {
+            operator++();
+        }
+
+        /// Returns \c true if the current block is valid
+        bool valid() const {
+            return( _index1 >= 0 );
+        }
+};
+
+
 /// Tool for calculating permutations of linear indices of multi-dimensional arrays.
 /** \note This is mainly useful for converting indices into multi-dimensional arrays 
  *  corresponding to joint states of variables to and from the canonical ordering used in libDAI.
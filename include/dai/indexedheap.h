@@ -0,0 +1,150 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+/// \file
+/// \brief Defines the IndexedHeap<> class, which represents a priority queue with changeable keys.
+
+
+#ifndef __defined_libdai_indexedheap_h
+#define __defined_libdai_indexedheap_h
+
+
+#include <vector>
+#include <dai/exceptions.h>
+
+
+namespace dai {
+
+
+/// Represents a priority queue of the items 0, 1, ..., size()-1, each of which has a key that can be changed.
+/** IndexedHeap is a binary max-heap that is stored in contiguous arrays. In addition to the heap itself,
+ *  it stores the position of each item in the heap, so that the key of any item can be increased or
+ *  decreased in logarithmic time (without allocating memory). Copying an IndexedHeap is cheap, since it
+ *  does not contain any pointers or iterators.
+ *
+ *  \tparam T Type of the keys; should be less-than-comparable.
+ */
+template <typename T>
+class IndexedHeap {
+    private:
+        /// The key of each item
+        std::vector<T> _keys;
+        /// The heap, which contains the items such that the key of _heap[k] is not smaller than the keys of _heap[2k+1] and _heap[2k+2]
+        std::vector<size_t> _heap;
+        /// The position of each item in _heap
+        std::vector<size_t> _pos;
+
+        /// Places the item at position \a k of the heap at the right position by moving it towards the root
+        void siftUp( size_t k ) {
+            size_t item = _heap[k];
+            while( k > 0 ) {
+                size_t parent = (k - 1) / 2;
+                if( !(_keys[_heap[parent]] < _keys[item]) )
+                    break;
+                _heap[k] = _heap[parent];
+                _pos[_heap[k]] = k;
+                k = parent;
+            }
+            _heap[k] = item;
+            _pos[item] = k;
+        }
+
+        /// Places the item at position \a k of the heap at the right position by moving it towards the leaves
+        void siftDown( size_t k ) {
+            size_t item = _heap[k];
+            size_t n = _heap.size();
+            while( 2 * k + 1 < n ) {
+                size_t child = 2 * k + 1;
+                if( child + 1 < n && _keys[_heap[child]] < _keys[_heap[child + 1]] )
+                    child++;
+                if( !(_keys[item] < _keys[_heap[child]]) )
+                    break;
+                _heap[k] = _heap[child];
+                _pos[_heap[k]] = k;
+                k = child;
+            }
+            _heap[k] = item;
+            _pos[item] = k;
+        }
+
+    public:
+    /// \name Constructors and destructors
+    //@{
+        /// Default constructor (constructs an empty priority queue)
+        IndexedHeap() : _keys(), _heap(), _pos() {}
+
+        /// Construct a priority queue of \a n items, all having key \a key
+        IndexedHeap( size_t n, const T &key = T() ) : _keys( n, key ), _heap( n ), _pos( n ) {
+            for( size_t item = 0; item < n; item++ ) {
+                _heap[item] = item;
+                _pos[item] = item;
+            }
+        }
+    //@}
+
+    /// \name Queries
+    //@{
+        /// Returns the number of items
+        size_t size() const { return _keys.size(); }
+
+        /// Returns whether the priority queue is empty
+        bool empty() const { return _keys.empty(); }
+
+        /// Returns the key of item \a item
+        const T& key( size_t item ) const {
+            DAI_DEBASSERT( item < size() );
+            return _keys[item];
+        }
+
+        /// Returns an item with the largest key
+        /** \pre The priority queue should not be empty
+         */
+        size_t top() const {
+            DAI_DEBASSERT( !empty() );
+            return _heap[0];
+        }
+    //@}
+
+    /// \name Operations
+    //@{
+        /// Adds a new item with key \a key and returns its index (which equals the old size())
+        size_t push( const T &key ) {
+            size_t item = _keys.size();
+            _keys.push_back( key );
+            _heap.push_back( item );
+            _pos.push_back( _heap.size() - 1 );
+            siftUp( _heap.size() - 1 );
+            return item;
+        }
+
+        /// Changes the key of item \a item into \a key
+        void set( size_t item, const T &key ) {
+            DAI_DEBASSERT( item < size() );
+            if( _keys[item] < key ) {
+                _keys[item] = key;
+                siftUp( _pos[item] );
+            } else {
+                _keys[item] = key;
+                siftDown( _pos[item] );
+            }
+        }
+
+        /// Removes all items
+        void clear() {
+            _keys.clear();
+            _heap.clear();
+            _pos.clear();
+        }
+    //@}
+};
+
+
+} // end of namespace dai
+
+
+#endif
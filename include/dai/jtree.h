@@ -24,6 +24,9 @@
 #include <dai/weightedgraph.h>
 #include <dai/enum.h>
 #include <dai/properties.h>
+#include <dai/util.h>
+#include <map>
+#include <list>
 
 
 namespace dai {
@@ -41,20 +44,106 @@ namespace dai {
 class JTree : public DAIAlgRG {
     private:
         /// Stores the messages
-        std::vector<std::vector<Factor> >  _mes;
+        mutable std::vector<std::vector<Factor> >  _mes;
 
         /// Stores the logarithm of the partition sum
         Real _logZ;
 
+        /// For each variable label, the indices of the inner regions containing that variable (in increasing order)
+        hash_map<size_t, std::vector<size_t> > _var2IRs;
+        /// For each variable label, the indices of the outer regions containing that variable (in increasing order)
+        hash_map<size_t, std::vector<size_t> > _var2ORs;
+
+        /// Least recently used cache of marginals, indexed by their variables
+        class MarginalCache {
+            private:
+                /// The cached marginals, ordered from most recently used to least recently used
+                std::list<Factor> _lru;
+                /// For each cached marginal, its position in _lru
+                std::map<VarSet, std::list<Factor>::iterator> _index;
+
+                /// Rebuilds _index from _lru
+                void rebuildIndex() {
+                    _index.clear();
+                    for( std::list<Factor>::iterator it = _lru.begin(); it != _lru.end(); it++ )
+                        _index[it->vars()] = it;
+                }
+
+            public:
+                /// Default constructor
+                MarginalCache() : _lru(), _index() {}
+                /// Copy constructor (the copy gets its own index)
+                MarginalCache( const MarginalCache &x ) : _lru( x._lru ), _index() { rebuildIndex(); }
+                /// Assignment operator (the copy gets its own index)
+                MarginalCache& operator=( const MarginalCache &x ) {
+                    if( this != &x ) {
+                        _lru = x._lru;
+                        rebuildIndex();
+                    }
+                    return *this;
+                }
+
+                /// Returns the cached marginals, ordered from most recently used to least recently used
+                const std::list<Factor>& marginals() const { return _lru; }
+                /// Removes all cached marginals
+                void clear() { _lru.clear(); _index.clear(); }
+                /// Returns a pointer to the cached marginal of \a vs and marks it as most recently used, or returns \c NULL if it is not cached
+                const Factor* find( const VarSet &vs ) {
+                    std::map<VarSet, std::list<Factor>::iterator>::iterator it = _index.find( vs );
+                    if( it == _index.end() )
+                        return NULL;
+                    _lru.splice( _lru.begin(), _lru, it->second );
+                    return &(*it->second);
+                }
+                /// Adds \a marginal as most recently used, removing least recently used marginals such that at most \a maxSize marginals remain
+                void insert( const Factor &marginal, size_t maxSize ) {
+                    std::map<VarSet, std::list<Factor>::iterator>::iterator it = _index.find( marginal.vars() );
+                    if( it != _index.end() ) {
+                        _lru.erase( it->second );
+                        _index.erase( it );
+                    }
+                    while( !_lru.empty() && _lru.size() >= maxSize ) {
+                        _index.erase( _lru.back().vars() );
+                        _lru.pop_back();
+                    }
+                    if( maxSize ) {
+                        _lru.push_front( marginal );
+                        _index[marginal.vars()] = _lru.begin();
+                    }
+                }
+        };
+
+        /// Cache of marginals calculated by calcMarginal() that are not contained in a single region
+        MarginalCache _marginalCache;
+
+        /// For each outer region, the evidence assigned to it (maps variable indices to observed states)
+        std::vector<std::map<size_t, size_t> > _evidence;
+        /// For each outer region, the index of the edge of RTree that connects it with its parent (or -1 for the root)
+        std::vector<size_t> _parentEdge;
+        /// For each edge of RTree, the logarithm of the normalization constant of the message towards the root
+        std::vector<Real> _logZup;
+        /// Whether _mes contains the Shafer-Shenoy messages of the current factors and evidence
+        bool _mesValid;
+        /// For each edge of RTree, whether the message away from the root is up to date
+        mutable std::vector<bool> _downValid;
+        /// For each outer region, whether its belief is up to date
+        mutable std::vector<bool> _QaValid;
+        /// For each inner region, whether its belief is up to date
+        mutable std::vector<bool> _QbValid;
+
     public:
         /// The junction tree (stored as a rooted tree)
         RootedTree RTree;
 
         /// Outer region beliefs
-        std::vector<Factor> Qa;
+        /** \note After updateEvidence(), the outer region beliefs are updated lazily (by belief(), beliefs() and calcMarginal())
+         */
+        mutable std::vector<Factor> Qa;
 
         /// Inner region beliefs
-        std::vector<Factor> Qb;
+        /** \note After updateEvidence(), the inner region beliefs are updated lazily (by belief(), beliefs() and calcMarginal())
+         */
+        mutable std::vector<Factor> Qb;
 
         /// Parameters for JTree
         struct Properties {
@@ -98,13 +187,19 @@ class JTree : public DAIAlgRG {
 
             /// Maximum memory to use in bytes (0 means unlimited)
             size_t maxmem;
+
+            /// Maximum number of marginals that calcMarginal() caches for sets of variables that are not contained in a single region (0 disables caching)
+            /** When the cache is full, the least recently used marginal is removed. The cache is cleared
+             *  whenever the junction tree is run again, or whenever a factor is changed.
+             */
+            size_t cachesize;
         } props;
 
     public:
     /// \name Constructors/destructors
     //@{
         /// Default constructor
-        JTree() : DAIAlgRG(), _mes(), _logZ(), RTree(), Qa(), Qb(), props() {}
+        JTree() : DAIAlgRG(), _mes(), _logZ(), _var2IRs(), _var2ORs(), _marginalCache(), _evidence(), _parentEdge(), _logZup(), _mesValid(false), _downValid(), _QaValid(), _QbValid(), RTree(), Qa(), Qb(), props() {}
 
         /// Construct from FactorGraph \a fg and PropertySet \a opts
         /** \param fg factor graph
@@ -136,6 +231,22 @@ class JTree : public DAIAlgRG {
         virtual std::string printProperties() const;
     //@}
 
+    /// \name Changing the factors
+    //@{
+        /// Sets factor \a I to \a newFactor (and clears the cache of marginals)
+        virtual void setFactor( size_t I, const Factor &newFactor, bool backup = false ) {
+            DAIAlgRG::setFactor( I, newFactor, backup );
+            _marginalCache.clear();
+            _mesValid = false;
+        }
+        /// Sets several factors simultaneously (and clears the cache of marginals)
+        virtual void setFactors( const std::map<size_t, Factor> &facs, bool backup = false ) {
+            DAIAlgRG::setFactors( facs, backup );
+            _marginalCache.clear();
+            _mesValid = false;
+        }
+    //@}
+
 
     /// \name Additional interface specific for JTree
     //@{
@@ -188,9 +299,56 @@ class JTree : public DAIAlgRG {
 
         /// Calculates the marginal of a set of variables (using cutset conditioning, if necessary)
         /** \pre assumes that run() has been called already
+         *  \see Properties::cachesize
          */
         Factor calcMarginal( const VarSet& vs );
+
+        /// Returns the marginals cached by calcMarginal(), ordered from most recently used to least recently used
+        /** \see Properties::cachesize
+         */
+        const std::list<Factor>& cachedMarginals() const { return _marginalCache.marginals(); }
+
+        /// Changes the evidence and updates the junction tree incrementally
+        /** Evidence is handled by the junction tree itself (the factors are not changed): each observed
+         *  variable is clamped in the first outer region that contains it. Only the Shafer-Shenoy messages
+         *  towards the root on the paths from the changed outer regions to the root are recalculated,
+         *  which suffices for calculating logZ() exactly. The other messages and the beliefs are only
+         *  recalculated when they are needed by belief(), beliefs(), calcMarginal() or findMaximum().
+         *
+         *  If no valid Shafer-Shenoy messages are available (because run() has not been called yet,
+         *  Properties::updates == HUGIN, or a factor has been changed), runShaferShenoy() is called instead.
+         *  The results are identical to those of runShaferShenoy() with the same evidence.
+         *  \param evidence maps the index of each variable whose evidence changes to its observed state,
+         *    or to -1 (i.e., <tt>(size_t)-1</tt>) if its evidence should be retracted
+         */
+        void updateEvidence( const std::map<size_t, size_t> &evidence );
+
+        /// Returns the current evidence (maps variable indices to observed states)
+        std::map<size_t, size_t> evidence() const;
+
+        /// Returns the index of the first inner region (if \a inner == \c true) or outer region (if \a inner == \c false) that contains all variables in \a vs, or -1 if there is no such region
+        /** Only the regions that contain one of the variables in \a vs are checked, using an index that is built by construct().
+         */
+        size_t findRegion( const VarSet &vs, bool inner ) const;
     //@}
+
+    private:
+        /// Returns the factor of outer region \a alpha, multiplied with the evidence assigned to it
+        Factor potential( size_t alpha ) const;
+        /// Calculates the Shafer-Shenoy message on edge \a e of RTree towards the root and returns the logarithm of its normalization constant
+        Real calcMessageUp( size_t e );
+        /// Calculates the Shafer-Shenoy message on edge \a e of RTree away from the root
+        void calcMessageDown( size_t e ) const;
+        /// Returns the (unnormalized) product of the factor of outer region \a alpha, its evidence and its incoming messages
+        Factor calcBeliefOR( size_t alpha ) const;
+        /// Returns the index of the outer region at the root of RTree
+        size_t root() const { return nrIRs() ? RTree[0].first : 0; }
+        /// Makes sure that the belief of outer region \a alpha is up to date
+        void validateBeliefOR( size_t alpha ) const;
+        /// Makes sure that the belief of inner region \a beta is up to date
+        void validateBeliefIR( size_t beta ) const;
+        /// Makes sure that all beliefs are up to date
+        void validateBeliefs() const;
 };
 
 
@@ -86,6 +86,13 @@ class LC : public DAIAlgFG {
 
             /// Parameters for the algorithm used to initialize the cavity distributions
             PropertySet cavaiopts;
+
+            /// Number of threads used to initialize the cavity distributions (0 means one thread per available processor)
+            /** Each thread uses its own instance of the algorithm \a cavainame for the cavities of its share of the variables.
+             *  \note Only has an effect if libDAI has been built with OpenMP support (see WITH_OPENMP in Makefile.ALL).
+             *  The results do not depend on the number of threads, unless the algorithm \a cavainame uses random numbers.
+             */
+            size_t nthreads;
         } props;
 
     public:
@@ -124,7 +131,16 @@ class LC : public DAIAlgFG {
     //@{
         /// Approximates the cavity distribution of variable \a i, using the inference algorithm \a name with parameters \a opts
         Real CalcCavityDist( size_t i, const std::string &name, const PropertySet &opts );
+        /// Approximates the cavity distribution of variable \a i, using the inference algorithm \a cav
+        /** \param i Index of the variable.
+         *  \param cav Inference algorithm constructed from \c *this (may be \c NULL if props.cavity == UNIFORM);
+         *         the factors of \a cav that are changed to obtain the cavity are restored afterwards, so that
+         *         \a cav can be used for the cavities of other variables.
+         */
+        Real CalcCavityDist( size_t i, InfAlg *cav );
         /// Approximates all cavity distributions using inference algorithm \a name with parameters \a opts
+        /** The variables are distributed over props.nthreads threads.
+         */
         Real InitCavityDists( const std::string &name, const PropertySet &opts );
         /// Sets approximate cavity distributions to \a Q
         long SetCavityDists( std::vector<Factor> &Q );
@@ -90,6 +90,12 @@ class MR : public DAIAlgFG {
 
             /// How to initialize the cavity correlations
             InitType inits;
+
+            /// Number of threads used to initialize the cavity correlations (0 means one thread per available processor)
+            /** \note Only has an effect if libDAI has been built with OpenMP support (see WITH_OPENMP in Makefile.ALL).
+             *  The results do not depend on the number of threads.
+             */
+            size_t nthreads;
         } props;
 
     public:
@@ -127,7 +133,17 @@ class MR : public DAIAlgFG {
 
     private:
         /// Initialize cors
+        /** The variables are distributed over props.nthreads threads.
+         */
         Real calcCavityCorrelations();
+
+        /// Initialize cors[i]
+        /** \param i Index of the variable.
+         *  \param cav Inference algorithm constructed from \c *this that is used for the cavity of variable \a i:
+         *         a JTree if props.inits == EXACT, a BP if props.inits == CLAMPING, and ignored if props.inits == RESPPROP.
+         *         The factors of \a cav that are changed to obtain the cavity are restored afterwards.
+         */
+        Real calcCavityCorrelations( size_t i, InfAlg *cav );
         
         /// Iterate update equations for cavity fields
         void propagateCavityFields();
@@ -365,6 +365,20 @@ class TProb {
         /// Returns maximum absolute value of all entries
         T maxAbs() const { return accumulateMax( (T)0, fo_abs<T>(), false ); }
 
+        /// Returns the logarithm of the sum of the exponents of all entries, \f$\log \sum_i \exp(p_i)\f$
+        /** The maximum entry is subtracted before taking exponents, which prevents overflow and underflow.
+         *  Returns -Inf if all entries are -Inf.
+         */
+        T logSumExp() const {
+            T m = max();
+            if( m == -INFINITY )
+                return m;
+            T s = 0;
+            for( const_iterator it = begin(); it != end(); it++ )
+                s += fo_exp<T>()( *it - m );
+            return m + fo_log<T>()( s );
+        }
+
         /// Returns \c true if one or more entries are NaN
         bool hasNaNs() const {
             bool foundnan = false;
@@ -529,6 +543,19 @@ class TProb {
                 *this /= Z;
             return Z;
         }
+
+        /// Normalizes a vector of logarithms, such that the sum of the exponents of all entries becomes one
+        /** Subtracts logSumExp() from all entries and returns it.
+         *  \throw NOT_NORMALIZABLE if all entries are -Inf
+         */
+        T normalizeLog() {
+            T logZ = logSumExp();
+            if( logZ == -INFINITY )
+                DAI_THROW(NOT_NORMALIZABLE);
+            else
+                *this -= logZ;
+            return logZ;
+        }
     //@}
 
     /// \name Operations with scalars
@@ -241,6 +241,20 @@ class RegionGraph : public FactorGraph {
             DAI_THROW(NOT_IMPLEMENTED);
         }
 
+        /// Reads a region graph from a binary file
+        /** \note Not implemented yet
+         */
+        virtual void ReadFromBinaryFile( const char* /*filename*/ ) {
+            DAI_THROW(NOT_IMPLEMENTED);
+        }
+
+        /// Writes a region graph to a binary file
+        /** \note Not implemented yet
+         */
+        virtual void WriteToBinaryFile( const char* /*filename*/ ) const {
+            DAI_THROW(NOT_IMPLEMENTED);
+        }
+
         /// Writes a RegionGraph to an output stream
         friend std::ostream& operator<< ( std::ostream& os, const RegionGraph& rg );
 
@@ -115,18 +115,20 @@ class TRWBP : public BP {
         void sampleWeights( size_t nrTrees );
 
     protected:
-        /// Calculate the product of factor \a I and the incoming messages
-        /** If \a without_i == \c true, the message coming from variable \a i is omitted from the product
+        /// Calculate the product of factor \a I and the incoming messages and store it in \a prod
+        /** If \a without_i == \c true, the message coming from variable \a i is omitted from the product;
+         *  \a prod_j is used as scratch space
          *  \note This function is used by calcNewMessage() and calcBeliefF()
          */
-        virtual Prob calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) const;
+        virtual void calcIncomingMessageProduct( size_t I, bool without_i, size_t i, Prob &prod, Prob &prod_j ) const;
 
         /// Calculates unnormalized belief of variable \a i
         virtual void calcBeliefV( size_t i, Prob &p ) const;
 
         // Calculates unnormalized belief of factor \a I
         virtual void calcBeliefF( size_t I, Prob &p ) const {
-            p = calcIncomingMessageProduct( I, false, 0 );
+            Prob prod_j;
+            calcIncomingMessageProduct( I, false, 0, p, prod_j );
         }
 
         // Helper function for constructors
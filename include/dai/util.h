@@ -26,6 +26,7 @@
 #include <cerrno>
 #include <gmpxx.h>
 
+#include <dai/config.h>
 #include <dai/exceptions.h>
 
 
@@ -77,8 +78,13 @@
 namespace dai {
 
 
+#ifdef DAI_SINGLE_PRECISION
+/// Real number (alias for \c float, because libDAI has been built with single precision, see WITH_SINGLE_PRECISION in Makefile.ALL and dai/config.h)
+typedef float Real;
+#else
 /// Real number (alias for \c double, which could be changed to <tt>long double</tt> if necessary)
 typedef double Real;
+#endif
 
 /// Arbitrary precision integer number
 typedef mpz_class BigInt;
@@ -224,6 +230,63 @@ std::vector<T> concat( const std::vector<T>& u, const std::vector<T>& v ) {
 std::vector<std::string> tokenizeString( const std::string& s, bool singleDelim, const std::string& delim="\t\n" );
 
 
+/// Returns the number of threads that should be used for a parallel computation
+/** \param nthreads Requested number of threads; 0 means one thread per available processor
+ *  \note If libDAI has been built without OpenMP support (see WITH_OPENMP in Makefile.ALL), this always returns 1.
+ */
+size_t nrThreads( size_t nthreads );
+
+
+/// Collects the exceptions thrown by the threads of a parallel computation
+/** Exceptions may not propagate out of an OpenMP parallel region. Therefore, the code run by
+ *  thread \a t should catch all exceptions and store them using set(t, e). After the parallel
+ *  region, the calling thread should call rethrow(), which rethrows the exception stored by the
+ *  thread with the lowest index (if any).
+ */
+class ThreadExceptions {
+    private:
+        /// Stores the exception thrown by each thread (or NULL)
+        std::vector<Exception*> _errors;
+
+        /// Copying is not allowed
+        ThreadExceptions( const ThreadExceptions& );
+        /// Assignment is not allowed
+        ThreadExceptions& operator=( const ThreadExceptions& );
+
+    public:
+        /// Constructs an empty collection for \a nthreads threads
+        ThreadExceptions( size_t nthreads ) : _errors( nthreads, (Exception*)NULL ) {}
+
+        /// Destructor
+        ~ThreadExceptions() {
+            for( size_t t = 0; t < _errors.size(); t++ )
+                delete _errors[t];
+        }
+
+        /// Stores the exception \a e thrown by thread \a t (other exceptions than dai::Exception are converted into a RUNTIME_ERROR)
+        void set( size_t t, const std::exception &e ) {
+            const Exception *de = dynamic_cast<const Exception*>( &e );
+            delete _errors[t];
+            _errors[t] = de ? new Exception( *de ) : new Exception( Exception::RUNTIME_ERROR, __FILE__, __PRETTY_FUNCTION__, DAI_TOSTRING(__LINE__), e.what() );
+        }
+
+        /// Returns whether any thread has stored an exception
+        bool occurred() const {
+            for( size_t t = 0; t < _errors.size(); t++ )
+                if( _errors[t] )
+                    return true;
+            return false;
+        }
+
+        /// Rethrows the exception thrown by the thread with the lowest index, if any
+        void rethrow() const {
+            for( size_t t = 0; t < _errors.size(); t++ )
+                if( _errors[t] )
+                    throw Exception( *_errors[t] );
+        }
+};
+
+
 /// Enumerates different ways of normalizing a probability measure.
 /**
  *  - NORMPROB means that the sum of all entries should be 1;
@@ -8,6 +8,7 @@
 
 #include <iostream>
 #include <sstream>
+#include <cmath>
 #include <map>
 #include <set>
 #include <algorithm>
@@ -26,6 +27,9 @@ using namespace std;
 /// \todo Make DAI_BP_FAST a compile-time choice, as it is a memory/speed tradeoff
 
 
+const size_t BP::nrResidualBins;
+
+
 void BP::setProperties( const PropertySet &opts ) {
     DAI_ASSERT( opts.hasKey("tol") );
     DAI_ASSERT( opts.hasKey("logdomain") );
@@ -51,10 +55,22 @@ void BP::setProperties( const PropertySet &opts ) {
         props.damping = opts.getStringAs<Real>("damping");
     else
         props.damping = 0.0;
+    if( opts.hasKey("adaptivedamping") )
+        props.adaptivedamping = opts.getStringAs<bool>("adaptivedamping");
+    else
+        props.adaptivedamping = false;
+    if( opts.hasKey("maxdamping") )
+        props.maxdamping = opts.getStringAs<Real>("maxdamping");
+    else
+        props.maxdamping = 0.9;
     if( opts.hasKey("inference") )
         props.inference = opts.getStringAs<Properties::InfType>("inference");
     else
         props.inference = Properties::InfType::SUMPROD;
+    if( opts.hasKey("nthreads") )
+        props.nthreads = opts.getStringAs<size_t>("nthreads");
+    else
+        props.nthreads = 1;
 }
 
 
@@ -67,7 +83,10 @@ PropertySet BP::getProperties() const {
     opts.set( "logdomain", props.logdomain );
     opts.set( "updates", props.updates );
     opts.set( "damping", props.damping );
+    opts.set( "adaptivedamping", props.adaptivedamping );
+    opts.set( "maxdamping", props.maxdamping );
     opts.set( "inference", props.inference );
+    opts.set( "nthreads", props.nthreads );
     return opts;
 }
 
@@ -82,7 +101,10 @@ string BP::printProperties() const {
     s << "logdomain=" << props.logdomain << ",";
     s << "updates=" << props.updates << ",";
     s << "damping=" << props.damping << ",";
-    s << "inference=" << props.inference << "]";
+    s << "adaptivedamping=" << props.adaptivedamping << ",";
+    s << "maxdamping=" << props.maxdamping << ",";
+    s << "inference=" << props.inference << ",";
+    s << "nthreads=" << props.nthreads << "]";
     return s.str();
 }
 
@@ -92,13 +114,18 @@ void BP::construct() {
     _edges.clear();
     _edges.reserve( nrVars() );
     _edge2lut.clear();
-    if( props.updates == Properties::UpdateType::SEQMAX )
+    _lut2edge.clear();
+    _lut.clear();
+    _lutCounter = 0;
+    if( props.updates == Properties::UpdateType::SEQMAX ) {
         _edge2lut.reserve( nrVars() );
+        _lut2edge.reserve( nrEdges() );
+    }
     for( size_t i = 0; i < nrVars(); ++i ) {
         _edges.push_back( vector<EdgeProp>() );
         _edges[i].reserve( nbV(i).size() );
         if( props.updates == Properties::UpdateType::SEQMAX ) {
-            _edge2lut.push_back( vector<LutType::iterator>() );
+            _edge2lut.push_back( vector<size_t>() );
             _edge2lut[i].reserve( nbV(i).size() );
         }
         foreach( const Neighbor &I, nbV(i) ) {
@@ -114,8 +141,10 @@ void BP::construct() {
 
             newEP.residual = 0.0;
             _edges[i].push_back( newEP );
-            if( props.updates == Properties::UpdateType::SEQMAX )
-                _edge2lut[i].push_back( _lut.insert( make_pair( newEP.residual, make_pair( i, _edges[i].size() - 1 ))) );
+            if( props.updates == Properties::UpdateType::SEQMAX ) {
+                _edge2lut[i].push_back( _lut.push( make_pair( newEP.residual, _lutCounter++ ) ) );
+                _lut2edge.push_back( make_pair( i, _edges[i].size() - 1 ) );
+            }
         }
     }
 
@@ -129,6 +158,18 @@ void BP::construct() {
     for( size_t I = 0; I < nrFactors(); ++I )
         _oldBeliefsF.push_back( Factor( factor(I).vars() ) );
     
+    // create scratch space
+    _scratch.clear();
+    _scratch.resize( nrFactors() );
+    for( size_t I = 0; I < nrFactors(); I++ ) {
+        size_t maxStates = 0;
+        foreach( const Neighbor &i, nbF(I) )
+            maxStates = std::max( maxStates, var(i).states() );
+        _scratch[I].prod = Prob( factor(I).nrStates() );
+        _scratch[I].prod_j.p().reserve( maxStates );
+        _scratch[I].marg.p().reserve( maxStates );
+    }
+
     // create update sequence
     _updateSeq.clear();
     _updateSeq.reserve( nrEdges() );
@@ -148,30 +189,41 @@ void BP::init() {
                 updateResidual( i, I.iter, 0.0 );
         }
     }
+    // cache the logarithms of the factors (they are kept up to date by setFactor())
+    for( size_t I = 0; I < nrFactors(); ++I ) {
+        if( props.logdomain ) {
+            _scratch[I].logFactor = factor(I).p();
+            _scratch[I].logFactor.takeLog();
+        } else
+            _scratch[I].logFactor = Prob();
+    }
     _iters = 0;
 }
 
 
 void BP::findMaxResidual( size_t &i, size_t &_I ) {
     DAI_ASSERT( !_lut.empty() );
-    LutType::const_iterator largestEl = _lut.end();
-    --largestEl;
-    i  = largestEl->second.first;
-    _I = largestEl->second.second;
+    const pair<size_t, size_t> &largestEl = _lut2edge[_lut.top()];
+    i  = largestEl.first;
+    _I = largestEl.second;
 }
 
 
-Prob BP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) const {
-    Factor Fprod( factor(I) );
-    Prob &prod = Fprod.p();
-    if( props.logdomain )
-        prod.takeLog();
+void BP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i, Prob &prod, Prob &prod_j ) const {
+    if( props.logdomain && _scratch[I].logFactor.size() == factor(I).nrStates() )
+        prod = _scratch[I].logFactor;
+    else {
+        prod = factor(I).p();
+        if( props.logdomain )
+            prod.takeLog();
+    }
 
     // Calculate product of incoming messages and factor I
     foreach( const Neighbor &j, nbF(I) )
         if( !(without_i && (j == i)) ) {
             // prod_j will be the product of messages coming into j
-            Prob prod_j( var(j).states(), props.logdomain ? 0.0 : 1.0 );
+            prod_j.resize( var(j).states() );
+            prod_j.fill( props.logdomain ? 0.0 : 1.0 );
             foreach( const Neighbor &J, nbV(j) )
                 if( J != I ) { // for all J in nb(j) \ I
                     if( props.logdomain )
@@ -183,10 +235,12 @@ Prob BP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) const
             // multiply prod with prod_j
             if( !DAI_BP_FAST ) {
                 // UNOPTIMIZED (SIMPLE TO READ, BUT SLOW) VERSION
+                Factor Fprod( factor(I).vars(), prod );
                 if( props.logdomain )
                     Fprod += Factor( var(j), prod_j );
                 else
                     Fprod *= Factor( var(j), prod_j );
+                prod = Fprod.p();
             } else {
                 // OPTIMIZED VERSION
                 size_t _I = j.dual;
@@ -200,7 +254,6 @@ Prob BP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) const
                         prod.set( r, prod[r] * prod_j[ind[r]] );
             }
     }
-    return prod;
 }
 
 
@@ -208,31 +261,59 @@ void BP::calcNewMessage( size_t i, size_t _I ) {
     // calculate updated message I->i
     size_t I = nbV(i,_I);
 
-    Prob marg;
+    // use the scratch space of factor I, so that no memory is allocated
+    FactorScratch &scratch = _scratch[I];
+    Prob &marg = scratch.marg;
+    // whether marg already contains the logarithm of the message
+    bool margIsLog = false;
     if( factor(I).vars().size() == 1 ) // optimization
         marg = factor(I).p();
     else {
-        Factor Fprod( factor(I) );
-        Prob &prod = Fprod.p();
-        prod = calcIncomingMessageProduct( I, true, i );
-
-        if( props.logdomain ) {
-            prod -= prod.max();
-            prod.takeExp();
-        }
+        Prob &prod = scratch.prod;
+        calcIncomingMessageProduct( I, true, i, prod, scratch.prod_j );
 
         // Marginalize onto i
         if( !DAI_BP_FAST ) {
             // UNOPTIMIZED (SIMPLE TO READ, BUT SLOW) VERSION
+            if( props.logdomain ) {
+                prod -= prod.max();
+                prod.takeExp();
+            }
+            Factor Fprod( factor(I).vars(), prod );
             if( props.inference == Properties::InfType::SUMPROD )
                 marg = Fprod.marginal( var(i) ).p();
             else
                 marg = Fprod.maxMarginal( var(i) ).p();
+        } else if( props.logdomain ) {
+            // OPTIMIZED VERSION (LOG DOMAIN)
+            // ind is the precalculated IndexFor(i,I) i.e. to x_I == k corresponds x_i == ind[k]
+            const ind_t &ind = index(i,_I);
+            // marginalize in the log domain: first calculate the maximum for each state of i...
+            marg.resize( var(i).states() );
+            marg.fill( -INFINITY );
+            for( size_t r = 0; r < prod.size(); ++r )
+                if( prod[r] > marg[ind[r]] )
+                    marg.set( ind[r], prod[r] );
+            if( props.inference == Properties::InfType::SUMPROD ) {
+                // ...and then add the log-sum-exp of the remaining differences (using prod_j as scratch space)
+                Prob &sum = scratch.prod_j;
+                sum.resize( var(i).states() );
+                sum.fill( 0.0 );
+                for( size_t r = 0; r < prod.size(); ++r )
+                    if( marg[ind[r]] != -INFINITY )
+                        sum.set( ind[r], sum[ind[r]] + exp( prod[r] - marg[ind[r]] ) );
+                for( size_t k = 0; k < marg.size(); ++k )
+                    if( marg[k] != -INFINITY )
+                        marg.set( k, marg[k] + log( sum[k] ) );
+            }
+            marg.normalizeLog();
+            margIsLog = true;
         } else {
             // OPTIMIZED VERSION 
-            marg = Prob( var(i).states(), 0.0 );
+            marg.resize( var(i).states() );
+            marg.fill( 0.0 );
             // ind is the precalculated IndexFor(i,I) i.e. to x_I == k corresponds x_i == ind[k]
-            const ind_t ind = index(i,_I);
+            const ind_t &ind = index(i,_I);
             if( props.inference == Properties::InfType::SUMPROD )
                 for( size_t r = 0; r < prod.size(); ++r )
                     marg.set( ind[r], marg[ind[r]] + prod[r] );
@@ -245,10 +326,9 @@ void BP::calcNewMessage( size_t i, size_t _I ) {
     }
 
     // Store result
-    if( props.logdomain )
-        newMessage(i,_I) = marg.log();
-    else
-        newMessage(i,_I) = marg;
+    newMessage(i,_I) = marg;
+    if( props.logdomain && !margIsLog )
+        newMessage(i,_I).takeLog();
 
     // Update the residual if necessary
     if( props.updates == Properties::UpdateType::SEQMAX )
@@ -266,10 +346,22 @@ Real BP::run() {
 
     double tic = toc();
 
+    size_t nthreads = nrThreads( props.nthreads );
+
+    _damping = props.damping;
+    _tracing = recordTrace || _callback;
+    bool stopped = false;
+
     // do several passes over the network until maximum number of iterations has
     // been reached or until the maximum belief difference is smaller than tolerance
     Real maxDiff = INFINITY;
-    for( ; _iters < props.maxiter && maxDiff > props.tol && (toc() - tic) < props.maxtime; _iters++ ) {
+    for( ; !stopped && _iters < props.maxiter && maxDiff > props.tol && (toc() - tic) < props.maxtime; _iters++ ) {
+        if( _tracing ) {
+            _stats.nrUpdates = 0;
+            _stats.residuals.assign( nrResidualBins, 0 );
+            _stats.damping = _damping;
+        }
+
         if( props.updates == Properties::UpdateType::SEQMAX ) {
             if( _iters == 0 ) {
                 // do the first pass
@@ -298,13 +390,7 @@ Real BP::run() {
             }
         } else if( props.updates == Properties::UpdateType::PARALL ) {
             // Parallel updates
-            for( size_t i = 0; i < nrVars(); ++i )
-                foreach( const Neighbor &I, nbV(i) )
-                    calcNewMessage( i, I.iter );
-
-            for( size_t i = 0; i < nrVars(); ++i )
-                foreach( const Neighbor &I, nbV(i) )
-                    updateMessage( i, I.iter );
+            updateParallel( nthreads );
         } else {
             // Sequential updates
             if( props.updates == Properties::UpdateType::SEQRND )
@@ -317,21 +403,33 @@ Real BP::run() {
         }
 
         // calculate new beliefs and compare with old ones
-        maxDiff = -INFINITY;
-        for( size_t i = 0; i < nrVars(); ++i ) {
-            Factor b( beliefV(i) );
-            maxDiff = std::max( maxDiff, dist( b, _oldBeliefsV[i], DISTLINF ) );
-            _oldBeliefsV[i] = b;
-        }
-        for( size_t I = 0; I < nrFactors(); ++I ) {
-            Factor b( beliefF(I) );
-            maxDiff = std::max( maxDiff, dist( b, _oldBeliefsF[I], DISTLINF ) );
-            _oldBeliefsF[I] = b;
-        }
+        Real lastMaxDiff = maxDiff;
+        maxDiff = updateBeliefs( nthreads );
 
         if( props.verbose >= 3 )
             cerr << name() << "::run:  maxdiff " << maxDiff << " after " << _iters+1 << " passes" << endl;
+
+        if( _tracing ) {
+            _stats.iter = _iters + 1;
+            _stats.maxDiff = maxDiff;
+            _stats.time = toc() - tic;
+            if( recordTrace )
+                _trace.push_back( _stats );
+            if( _callback && !_callback( *this, _stats, _callbackData ) ) {
+                stopped = true;
+                if( props.verbose >= 3 )
+                    cerr << name() << "::run:  stopped by iteration callback" << endl;
+            }
+        }
+
+        // an increasing maximum difference indicates oscillations, which are damped more strongly
+        if( props.adaptivedamping && maxDiff > lastMaxDiff && _damping < props.maxdamping ) {
+            _damping += (props.maxdamping - _damping) / 2.0;
+            if( props.verbose >= 3 )
+                cerr << name() << "::run:  increased damping to " << _damping << endl;
+        }
     }
+    _tracing = false;
 
     if( maxDiff > _maxdiff )
         _maxdiff = maxDiff;
@@ -352,6 +450,84 @@ Real BP::run() {
 }
 
 
+void BP::updateParallel( size_t nthreads ) {
+    // The factors are divided into contiguous blocks, one for each thread;
+    // messages sent by different factors can be calculated independently
+    // (in particular, they use different scratch space)
+    size_t nthreadsF = std::max( std::min( nthreads, nrFactors() ), (size_t)1 );
+    ThreadExceptions errors( std::max( nthreads, (size_t)1 ) );
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nthreadsF)
+#endif
+    for( long t = 0; t < (long)nthreadsF; t++ ) {
+        try {
+            for( size_t I = (t * nrFactors()) / nthreadsF; I < ((t + 1) * nrFactors()) / nthreadsF; ++I )
+                foreach( const Neighbor &i, nbF(I) )
+                    calcNewMessage( i, i.dual );
+        } catch( std::exception &e ) {
+            errors.set( t, e );
+        }
+    }
+    errors.rethrow();
+
+    // The variables are divided into contiguous blocks, one for each thread;
+    // _sentMessages and _stats should be filled in the usual order
+    nthreads = std::max( std::min( nthreads, nrVars() ), (size_t)1 );
+    if( recordSentMessages || _tracing )
+        nthreads = 1;
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nthreads)
+#endif
+    for( long t = 0; t < (long)nthreads; t++ ) {
+        try {
+            for( size_t i = (t * nrVars()) / nthreads; i < ((t + 1) * nrVars()) / nthreads; ++i )
+                foreach( const Neighbor &I, nbV(i) )
+                    updateMessage( i, I.iter );
+        } catch( std::exception &e ) {
+            errors.set( t, e );
+        }
+    }
+    errors.rethrow();
+}
+
+
+Real BP::updateBeliefs( size_t nthreads ) {
+    // The variables and factors are divided into contiguous blocks, one for each thread;
+    // the maximum difference of each block is calculated separately
+    size_t nrItems = nrVars() + nrFactors();
+    nthreads = std::max( std::min( nthreads, nrItems ), (size_t)1 );
+    vector<Real> maxDiffs( nthreads, -INFINITY );
+    ThreadExceptions errors( nthreads );
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nthreads)
+#endif
+    for( long t = 0; t < (long)nthreads; t++ ) {
+        try {
+            for( size_t k = (t * nrItems) / nthreads; k < ((t + 1) * nrItems) / nthreads; ++k ) {
+                if( k < nrVars() ) {
+                    Factor b( beliefV(k) );
+                    maxDiffs[t] = std::max( maxDiffs[t], dist( b, _oldBeliefsV[k], DISTLINF ) );
+                    _oldBeliefsV[k] = b;
+                } else {
+                    size_t I = k - nrVars();
+                    Factor b( beliefF(I) );
+                    maxDiffs[t] = std::max( maxDiffs[t], dist( b, _oldBeliefsF[I], DISTLINF ) );
+                    _oldBeliefsF[I] = b;
+                }
+            }
+        } catch( std::exception &e ) {
+            errors.set( t, e );
+        }
+    }
+    errors.rethrow();
+
+    Real maxDiff = -INFINITY;
+    for( size_t t = 0; t < nthreads; t++ )
+        maxDiff = std::max( maxDiff, maxDiffs[t] );
+    return maxDiff;
+}
+
+
 void BP::calcBeliefV( size_t i, Prob &p ) const {
     p = Prob( var(i).states(), props.logdomain ? 0.0 : 1.0 );
     foreach( const Neighbor &I, nbV(i) )
@@ -445,15 +621,25 @@ void BP::init( const VarSet &ns ) {
 void BP::updateMessage( size_t i, size_t _I ) {
     if( recordSentMessages )
         _sentMessages.push_back(make_pair(i,_I));
-    if( props.damping == 0.0 ) {
+    if( _tracing ) {
+        _stats.nrUpdates++;
+        Real r = dist( newMessage(i,_I), message(i,_I), DISTLINF );
+        size_t bin = nrResidualBins - 1;
+        if( r >= 0.1 )
+            bin = 0;
+        else if( r > 0.0 )
+            bin = std::min( (size_t)std::max( std::ceil( -std::log10( r ) ) - 1.0, 0.0 ), nrResidualBins - 1 );
+        _stats.residuals[bin]++;
+    }
+    if( _damping == 0.0 ) {
         message(i,_I) = newMessage(i,_I);
         if( props.updates == Properties::UpdateType::SEQMAX )
             updateResidual( i, _I, 0.0 );
     } else {
         if( props.logdomain )
-            message(i,_I) = (message(i,_I) * props.damping) + (newMessage(i,_I) * (1.0 - props.damping));
+            message(i,_I) = (message(i,_I) * _damping) + (newMessage(i,_I) * (1.0 - _damping));
         else
-            message(i,_I) = (message(i,_I) ^ props.damping) * (newMessage(i,_I) ^ (1.0 - props.damping));
+            message(i,_I) = (message(i,_I) ^ _damping) * (newMessage(i,_I) ^ (1.0 - _damping));
         if( props.updates == Properties::UpdateType::SEQMAX )
             updateResidual( i, _I, dist( newMessage(i,_I), message(i,_I), DISTLINF ) );
     }
@@ -464,9 +650,8 @@ void BP::updateResidual( size_t i, size_t _I, Real r ) {
     EdgeProp* pEdge = &_edges[i][_I];
     pEdge->residual = r;
 
-    // rearrange look-up table (delete and reinsert new key)
-    _lut.erase( _edge2lut[i][_I] );
-    _edge2lut[i][_I] = _lut.insert( make_pair( r, make_pair(i, _I) ) );
+    // rearrange look-up table
+    _lut.set( _edge2lut[i][_I], make_pair( r, _lutCounter++ ) );
 }
 
 
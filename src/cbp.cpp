@@ -103,6 +103,7 @@ void CBP::construct() {
 
     _maxdiff = 0;
     _iters = 0;
+    _par_levels = 0;
 
     if( props.clamp_outfile.length() > 0 ) {
         _clamp_ofstream = shared_ptr<ofstream>(new ofstream( props.clamp_outfile.c_str(), ios_base::out|ios_base::trunc ));
@@ -134,10 +135,40 @@ Real CBP::run() {
     bp->run();
     _iters += bp->Iterations();
 
+    // The branches of the recursion are explored in parallel (as OpenMP tasks), unless the
+    // results would depend on the order in which they are explored (because the random
+    // number generator is used for choosing the clamping variables or by the BP update
+    // schedule, or because the clamping choices are written to a file)
+    size_t nthreads = nrThreads( props.nthreads );
+    bool useRandom = (props.choose == Properties::ChooseMethodType::CHOOSE_RANDOM) ||
+                     ((props.choose == Properties::ChooseMethodType::CHOOSE_BBP || props.choose == Properties::ChooseMethodType::CHOOSE_BP_CFN) && props.bbp_cfn.needGibbsState()) ||
+                     (props.updates == Properties::UpdateType::SEQRND);
+    if( nthreads > 1 && !useRandom && props.clamp_outfile.length() == 0 )
+        _par_levels = props.par_levels;
+    else {
+        _par_levels = 0;
+        nthreads = 1;
+    }
+
     vector<Factor> beliefs_out;
     Real lz_out;
     size_t choose_count=0;
-    runRecurse( bp, bp->logZ(), vector<size_t>(0), _num_leaves, choose_count, _sum_level, lz_out, beliefs_out );
+    ThreadExceptions errors( 1 );
+#ifdef _OPENMP
+#pragma omp parallel num_threads(nthreads)
+#pragma omp single
+#endif
+    {
+        try {
+            runRecurse( bp, bp->logZ(), vector<size_t>(0), _num_leaves, choose_count, _sum_level, lz_out, beliefs_out );
+        } catch( std::exception &e ) {
+            errors.set( 0, e );
+        }
+    }
+    if( errors.occurred() ) {
+        delete bp;
+        errors.rethrow();
+    }
     if( props.verbose >= 1 )
         cerr << "CBP average levels = " << (_sum_level / _num_leaves) << ", leaves = " << _num_leaves << endl;
     setBeliefs( beliefs_out, lz_out );
@@ -202,37 +233,42 @@ void CBP::runRecurse( InfAlg *bp, Real orig_logZ, vector<size_t> clamped_vars_li
     /// \idea dai::CBP::runRecurse() could be implemented more efficiently with a nesting version of backupFactors/restoreFactors
     // this improvement could also be done locally: backup the clamped factor in a local variable,
     // and restore it just before we return.
-    Real lz;
-    vector<Factor> b;
-    InfAlg *bp_c = bp->clone();
-    if( clampingVar ) {
-        bp_c->fg().clampVar( i, xis );
-        bp_c->init( var(i) );
-    } else {
-        bp_c->fg().clampFactor( i, xis );
-        bp_c->init( factor(i).vars() );
+    bool parallel = (clamped_vars_list.size() <= _par_levels);
+    InfAlg *bp_c = NULL, *cmp_bp_c = NULL;
+    ThreadExceptions errors( 2 );
+#ifdef _OPENMP
+#pragma omp task if(parallel) default(shared)
+#endif
+    {
+        try {
+            bp_c = runClamped( bp, i, xis );
+        } catch( std::exception &e ) {
+            errors.set( 0, e );
+        }
     }
-    bp_c->run();
-    _iters += bp_c->Iterations();
-
-    lz = bp_c->logZ();
-    b = bp_c->beliefs();
-
-    Real cmp_lz;
-    vector<Factor> cmp_b;
-    InfAlg *cmp_bp_c = bp->clone();
-    if( clampingVar ) {
-        cmp_bp_c->fg().clampVar( i, cmp_xis );
-        cmp_bp_c->init(var(i));
-    } else {
-        cmp_bp_c->fg().clampFactor( i, cmp_xis );
-        cmp_bp_c->init( factor(i).vars() );
+#ifdef _OPENMP
+#pragma omp task if(parallel) default(shared)
+#endif
+    {
+        try {
+            cmp_bp_c = runClamped( bp, i, cmp_xis );
+        } catch( std::exception &e ) {
+            errors.set( 1, e );
+        }
+    }
+#ifdef _OPENMP
+#pragma omp taskwait
+#endif
+    if( errors.occurred() ) {
+        delete bp_c;
+        delete cmp_bp_c;
+        errors.rethrow();
     }
-    cmp_bp_c->run();
-    _iters += cmp_bp_c->Iterations();
 
-    cmp_lz = cmp_bp_c->logZ();
-    cmp_b = cmp_bp_c->beliefs();
+    Real lz = bp_c->logZ();
+    vector<Factor> b = bp_c->beliefs();
+    Real cmp_lz = cmp_bp_c->logZ();
+    vector<Factor> cmp_b = cmp_bp_c->beliefs();
 
     Real p = unSoftMax( lz, cmp_lz );
     Real bp__d = 0.0;
@@ -246,14 +282,51 @@ void CBP::runRecurse( InfAlg *bp, Real orig_logZ, vector<size_t> clamped_vars_li
             sum_level += clamped_vars_list.size();
             beliefs_out = combined_b;
             lz_out = new_lz;
+            delete bp_c;
+            delete cmp_bp_c;
             return;
         }
     }
 
     // either we are not doing REC_BDIFF or the distance was large
     // enough to recurse:
-    runRecurse( bp_c, orig_logZ, clamped_vars_list, num_leaves, choose_count, sum_level, lz, b );
-    runRecurse( cmp_bp_c, orig_logZ, clamped_vars_list, num_leaves, choose_count, sum_level, cmp_lz, cmp_b );
+    // (if the branches are explored in parallel, the second branch uses its own counters)
+    size_t cmp_num_leaves = 0, cmp_choose_count = 0;
+    Real cmp_sum_level = 0.0;
+#ifdef _OPENMP
+#pragma omp task if(parallel) default(shared)
+#endif
+    {
+        try {
+            runRecurse( bp_c, orig_logZ, clamped_vars_list, num_leaves, choose_count, sum_level, lz, b );
+        } catch( std::exception &e ) {
+            errors.set( 0, e );
+        }
+    }
+#ifdef _OPENMP
+#pragma omp task if(parallel) default(shared)
+#endif
+    {
+        try {
+            if( parallel )
+                runRecurse( cmp_bp_c, orig_logZ, clamped_vars_list, cmp_num_leaves, cmp_choose_count, cmp_sum_level, cmp_lz, cmp_b );
+            else
+                runRecurse( cmp_bp_c, orig_logZ, clamped_vars_list, num_leaves, choose_count, sum_level, cmp_lz, cmp_b );
+        } catch( std::exception &e ) {
+            errors.set( 1, e );
+        }
+    }
+#ifdef _OPENMP
+#pragma omp taskwait
+#endif
+    num_leaves += cmp_num_leaves;
+    choose_count += cmp_choose_count;
+    sum_level += cmp_sum_level;
+    if( errors.occurred() ) {
+        delete bp_c;
+        delete cmp_bp_c;
+        errors.rethrow();
+    }
 
     p = unSoftMax( lz, cmp_lz );
 
@@ -273,6 +346,30 @@ void CBP::runRecurse( InfAlg *bp, Real orig_logZ, vector<size_t> clamped_vars_li
 }
 
 
+InfAlg* CBP::runClamped( const InfAlg *bp, size_t i, const vector<size_t> &xis ) {
+    InfAlg *bp_c = bp->clone();
+    try {
+        if( props.clamp == Properties::ClampType::CLAMP_VAR ) {
+            bp_c->fg().clampVar( i, xis );
+            bp_c->init( var(i) );
+        } else {
+            bp_c->fg().clampFactor( i, xis );
+            bp_c->init( factor(i).vars() );
+        }
+        bp_c->run();
+    } catch( ... ) {
+        delete bp_c;
+        throw;
+    }
+    size_t iters = bp_c->Iterations();
+#ifdef _OPENMP
+#pragma omp atomic
+#endif
+    _iters += iters;
+    return bp_c;
+}
+
+
 // 'xis' must be sorted
 bool CBP::chooseNextClampVar( InfAlg *bp, vector<size_t> &clamped_vars_list, size_t &i, vector<size_t> &xis, Real *maxVarOut ) {
     Real tiny = 1.0e-14;
@@ -534,6 +631,8 @@ void CBP::Properties::set(const PropertySet &opts)
         if( *i == "bbp_cfn" ) continue;
         if( *i == "rand_seed" ) continue;
         if( *i == "clamp_outfile" ) continue;
+        if( *i == "nthreads" ) continue;
+        if( *i == "par_levels" ) continue;
         errormsg = errormsg + "CBP: Unknown property " + *i + "\n";
     }
     if( !errormsg.empty() )
@@ -590,6 +689,16 @@ void CBP::Properties::set(const PropertySet &opts)
     } else {
         clamp_outfile = "";
     }
+    if( opts.hasKey("nthreads") ) {
+        nthreads = opts.getStringAs<size_t>("nthreads");
+    } else {
+        nthreads = 1;
+    }
+    if( opts.hasKey("par_levels") ) {
+        par_levels = opts.getStringAs<size_t>("par_levels");
+    } else {
+        par_levels = 4;
+    }
 }
 PropertySet CBP::Properties::get() const {
     PropertySet opts;
@@ -607,6 +716,8 @@ PropertySet CBP::Properties::get() const {
     opts.set("bbp_cfn", bbp_cfn);
     opts.set("rand_seed", rand_seed);
     opts.set("clamp_outfile", clamp_outfile);
+    opts.set("nthreads", nthreads);
+    opts.set("par_levels", par_levels);
     return opts;
 }
 string CBP::Properties::toString() const {
@@ -625,7 +736,9 @@ string CBP::Properties::toString() const {
     s << "bbp_props=" << bbp_props << ",";
     s << "bbp_cfn=" << bbp_cfn << ",";
     s << "rand_seed=" << rand_seed << ",";
-    s << "clamp_outfile=" << clamp_outfile;
+    s << "clamp_outfile=" << clamp_outfile << ",";
+    s << "nthreads=" << nthreads << ",";
+    s << "par_levels=" << par_levels;
     s << "]";
     return s.str();
 }
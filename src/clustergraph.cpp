@@ -7,10 +7,13 @@
 
 
 #include <set>
+#include <map>
 #include <vector>
 #include <iostream>
+#include <algorithm>
 #include <dai/varset.h>
 #include <dai/clustergraph.h>
+#include <dai/indexedheap.h>
 
 
 namespace dai {
@@ -22,23 +25,30 @@ using namespace std;
 ClusterGraph::ClusterGraph( const std::vector<VarSet> & cls ) : _G(), _vars(), _clusters() {
     // construct vars, clusters and edge list
     vector<Edge> edges;
+    set<VarSet> clusterSet;
+    map<Var, size_t> varIndex;
     foreach( const VarSet &cl, cls ) {
-        if( find( clusters().begin(), clusters().end(), cl ) == clusters().end() ) {
+        if( clusterSet.insert( cl ).second ) {
             // add cluster
             size_t n2 = nrClusters();
             _clusters.push_back( cl );
             for( VarSet::const_iterator n = cl.begin(); n != cl.end(); n++ ) {
-                size_t n1 = find( vars().begin(), vars().end(), *n ) - vars().begin();
-                if( n1 == nrVars() )
+                map<Var, size_t>::const_iterator it = varIndex.find( *n );
+                size_t n1;
+                if( it == varIndex.end() ) {
                     // add variable
+                    n1 = nrVars();
+                    varIndex[*n] = n1;
                     _vars.push_back( *n );
+                } else
+                    n1 = it->second;
                 edges.push_back( Edge( n1, n2 ) );
             }
         } // disregard duplicate clusters
     }
 
-    // Create bipartite graph
-    _G.construct( nrVars(), nrClusters(), edges.begin(), edges.end() );
+    // Create bipartite graph (the edges are unique, so they need not be checked)
+    _G.construct( nrVars(), nrClusters(), edges.begin(), edges.end(), false );
 }
 
 
@@ -67,6 +77,232 @@ ClusterGraph::ClusterGraph( const FactorGraph& fg, bool onlyMaximal ) : _G( fg.n
 }
 
 
+ClusterGraph& ClusterGraph::eraseNonMaximal() {
+    // A cluster is erased if it is contained in a larger cluster, or if it equals a cluster with a higher
+    // index; this yields the same result as erasing the non-maximal clusters one at a time
+    vector<size_t> newIndex( nrClusters(), -1UL );
+    vector<VarSet> clusters;
+    clusters.reserve( nrClusters() );
+    for( size_t I = 0; I < nrClusters(); I++ ) {
+        const VarSet &clI = _clusters[I];
+        bool maximal = true;
+        if( _G.nb2(I).size() ) {
+            // Any cluster containing clI contains its variable that occurs in the fewest clusters
+            size_t i = _G.nb2(I)[0];
+            foreach( const Neighbor &j, _G.nb2(I) )
+                if( _G.nb1(j).size() < _G.nb1(i).size() )
+                    i = j;
+            foreach( const Neighbor &J, _G.nb1(i) )
+                if( (J != I) && (clI << _clusters[J]) && (J > I || clI.size() < _clusters[J].size()) ) {
+                    maximal = false;
+                    break;
+                }
+        }
+        if( maximal ) {
+            newIndex[I] = clusters.size();
+            clusters.push_back( clI );
+        }
+    }
+
+    if( clusters.size() < nrClusters() ) {
+        BipartiteGraph G( nrVars(), clusters.size() );
+        for( size_t I = 0; I < nrClusters(); I++ ) {
+            if( newIndex[I] != -1UL ) {
+                foreach( const Neighbor &i, _G.nb2(I) )
+                    G.addEdge( i, newIndex[I], false );
+            }
+        }
+        _G = G;
+        _clusters.swap( clusters );
+    }
+    return *this;
+}
+
+
+/// Maintains the adjacency graph of the remaining variables and their elimination costs during greedy variable elimination
+class EliminationGraph {
+    public:
+        /// The supported cost functions
+        enum CostType {MINNEIGHBORS, MINWEIGHT, MINFILL, WEIGHTEDMINFILL};
+
+    private:
+        /// Priority of a variable: lower costs come first, and ties are broken in favor of the lowest index
+        struct Priority {
+            /// Whether the variable has been eliminated already
+            bool eliminated;
+            /// Elimination cost
+            size_t cost;
+            /// Index of the variable
+            size_t index;
+
+            /// Returns \c true if \a x should be eliminated before \c *this
+            bool operator<( const Priority &x ) const {
+                if( eliminated || x.eliminated )
+                    return eliminated && !x.eliminated;
+                return (cost > x.cost) || (cost == x.cost && index > x.index);
+            }
+        };
+
+        /// The cost function
+        CostType _type;
+        /// Number of states of each variable
+        vector<size_t> _states;
+        /// Sorted neighbors of each variable in the adjacency graph
+        vector<vector<size_t> > _nbs;
+        /// Priority queue of the variables
+        IndexedHeap<Priority> _queue;
+        /// Used for marking the neighbors of a variable (a variable is marked if its entry equals _stamp)
+        vector<size_t> _marks;
+        /// Current stamp
+        size_t _stamp;
+
+        /// Sets the priority of variable \a i according to its current cost
+        void updatePriority( size_t i ) {
+            Priority p;
+            p.eliminated = false;
+            p.cost = cost( i );
+            p.index = i;
+            _queue.set( i, p );
+        }
+
+    public:
+        /// Construct from the bipartite graph \a G and the variables \a vars of a cluster graph
+        EliminationGraph( const BipartiteGraph &G, const vector<Var> &vars, CostType type ) : _type(type), _states(), _nbs(), _queue(), _marks( vars.size(), 0 ), _stamp(0) {
+            _states.reserve( vars.size() );
+            _nbs.reserve( vars.size() );
+            Priority p;
+            p.eliminated = false;
+            p.cost = 0;
+            for( size_t i = 0; i < vars.size(); i++ ) {
+                _states.push_back( vars[i].states() );
+                _nbs.push_back( G.delta1( i ).elements() );
+                p.index = i;
+                _queue.push( p );
+            }
+            for( size_t i = 0; i < vars.size(); i++ )
+                updatePriority( i );
+        }
+
+        /// Returns the remaining variable that should be eliminated next
+        size_t next() const { return _queue.top(); }
+
+        /// Returns the sorted neighbors of variable \a i in the adjacency graph
+        const vector<size_t>& nbs( size_t i ) const { return _nbs[i]; }
+
+        /// Calculates the cost of eliminating variable \a i
+        /** The costs are identical to those calculated by eliminationCost_MinNeighbors(), eliminationCost_MinWeight(),
+         *  eliminationCost_MinFill() and eliminationCost_WeightedMinFill(), including the wrap-around of \c size_t arithmetic.
+         */
+        size_t cost( size_t i ) {
+            const vector<size_t> &nbs = _nbs[i];
+            size_t result = 0;
+            switch( _type ) {
+                case MINNEIGHBORS:
+                    result = nbs.size();
+                    break;
+                case MINWEIGHT:
+                    result = 1;
+                    foreach( size_t j, nbs )
+                        result *= _states[j];
+                    break;
+                case MINFILL:
+                case WEIGHTEDMINFILL: {
+                    // The cost of the pairs of neighbors that are not adjacent is the total cost of all pairs
+                    // minus the cost of the adjacent pairs, which are found by marking the neighbors of i
+                    _stamp++;
+                    foreach( size_t j, nbs )
+                        _marks[j] = _stamp;
+                    size_t sum = 0;
+                    foreach( size_t j, nbs ) {
+                        if( _type == MINFILL )
+                            result += sum++;
+                        else {
+                            result += _states[j] * sum;
+                            sum += _states[j];
+                        }
+                        foreach( size_t k, _nbs[j] )
+                            if( k > j && _marks[k] == _stamp )
+                                result -= (_type == MINFILL) ? 1 : _states[j] * _states[k];
+                    }
+                    break;
+                }
+            }
+            return result;
+        }
+
+        /// Eliminates variable \a i, connecting all its neighbors, and updates the costs of the remaining variables
+        void eliminate( size_t i ) {
+            vector<size_t> nbs_i;
+            nbs_i.swap( _nbs[i] );
+            Priority p;
+            p.eliminated = true;
+            p.cost = 0;
+            p.index = i;
+            _queue.set( i, p );
+
+            vector<size_t> changed( nbs_i );
+            vector<size_t> merged;
+            foreach( size_t j, nbs_i ) {
+                vector<size_t> &nbs_j = _nbs[j];
+                merged.clear();
+                merged.reserve( nbs_j.size() + nbs_i.size() );
+                set_union( nbs_j.begin(), nbs_j.end(), nbs_i.begin(), nbs_i.end(), back_inserter( merged ) );
+                merged.erase( remove( merged.begin(), merged.end(), i ), merged.end() );
+                merged.erase( remove( merged.begin(), merged.end(), j ), merged.end() );
+                bool newEdges = (merged.size() >= nbs_j.size());
+                nbs_j.swap( merged );
+                // The fill-in of a variable changes if two of its neighbors become adjacent
+                if( newEdges && (_type == MINFILL || _type == WEIGHTEDMINFILL) )
+                    changed.insert( changed.end(), nbs_j.begin(), nbs_j.end() );
+            }
+            sort( changed.begin(), changed.end() );
+            changed.erase( unique( changed.begin(), changed.end() ), changed.end() );
+            foreach( size_t j, changed )
+                updatePriority( j );
+        }
+};
+
+
+ClusterGraph ClusterGraph::VarElim( const greedyVariableElimination &f, size_t maxStates ) const {
+    EliminationGraph::CostType type;
+    if( f.costFunction() == eliminationCost_MinNeighbors )
+        type = EliminationGraph::MINNEIGHBORS;
+    else if( f.costFunction() == eliminationCost_MinWeight )
+        type = EliminationGraph::MINWEIGHT;
+    else if( f.costFunction() == eliminationCost_MinFill )
+        type = EliminationGraph::MINFILL;
+    else if( f.costFunction() == eliminationCost_WeightedMinFill )
+        type = EliminationGraph::WEIGHTEDMINFILL;
+    else
+        return VarElim<greedyVariableElimination>( f, maxStates );
+
+    EliminationGraph eg( _G, _vars, type );
+    vector<VarSet> cliques;
+    cliques.reserve( nrVars() );
+    BigInt totalStates = 0;
+    vector<Var> Di;
+    for( size_t n = 0; n < nrVars(); n++ ) {
+        size_t i = eg.next();
+        // Delta(i) is empty if the i'th variable is not contained in any cluster
+        Di.clear();
+        if( _G.nb1(i).size() ) {
+            Di.push_back( _vars[i] );
+            foreach( size_t j, eg.nbs(i) )
+                Di.push_back( _vars[j] );
+        }
+        cliques.push_back( VarSet( Di.begin(), Di.end(), Di.size() ) );
+        if( maxStates ) {
+            totalStates += cliques.back().nrStates();
+            if( totalStates > maxStates )
+                DAI_THROW(OUT_OF_MEMORY);
+        }
+        eg.eliminate( i );
+    }
+
+    return ClusterGraph( cliques );
+}
+
+
 size_t sequentialVariableElimination::operator()( const ClusterGraph &cl, const std::set<size_t> &/*remainingVars*/ ) {
     return cl.findVar( seq.at(i++) );
 }
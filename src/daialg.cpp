@@ -17,106 +17,160 @@ namespace dai {
 using namespace std;
 
 
-Factor calcMarginal( const InfAlg &obj, const VarSet &vs, bool reInit ) {
-    Factor Pvs (vs);
-
-    InfAlg *clamped = obj.clone();
-    if( !reInit )
+/// Initializes \a clamped (whose variables in \a vs have just been clamped), runs it and returns the log partition sum
+/** Returns -INFINITY if the clamped factor graph is not normalizable.
+ */
+static Real runClamped( InfAlg *clamped, const VarSet &vs, bool reInit ) {
+    if( reInit )
         clamped->init();
+    else
+        clamped->init(vs);
+
+    Real logZ;
+    try {
+        clamped->run();
+        logZ = clamped->logZ();
+    } catch( Exception &e ) {
+        if( e.getCode() == Exception::NOT_NORMALIZABLE )
+            logZ = -INFINITY;
+        else
+            throw;
+    }
+    return logZ;
+}
 
-    map<Var,size_t> varindices;
-    for( VarSet::const_iterator n = vs.begin(); n != vs.end(); n++ )
-        varindices[*n] = obj.fg().findVar( *n );
 
-    Real logZ0 = -INFINITY;
-    for( State s(vs); s.valid(); s++ ) {
-        // save unclamped factors connected to vs
-        clamped->backupFactors( vs );
+/// Returns \a nthreads clones of \a obj (initialized if \a reInit == \c false)
+static vector<InfAlg*> cloneForThreads( const InfAlg &obj, size_t nthreads, bool reInit ) {
+    vector<InfAlg*> clones( nthreads, (InfAlg*)NULL );
+    for( size_t t = 0; t < nthreads; t++ ) {
+        clones[t] = obj.clone();
+        if( !reInit )
+            clones[t]->init();
+    }
+    return clones;
+}
 
-        // set clamping Factors to delta functions
-        for( VarSet::const_iterator n = vs.begin(); n != vs.end(); n++ )
-            clamped->clamp( varindices[*n], s(*n) );
 
-        // run DAIAlg, calc logZ, store in Pvs
-        if( reInit )
-            clamped->init();
-        else
-            clamped->init(vs);
+Factor calcMarginal( const InfAlg &obj, const VarSet &vs, bool reInit, size_t nthreads ) {
+    Factor Pvs (vs);
+    size_t nrStates = Pvs.nrStates();
+    nthreads = std::min( nrThreads( nthreads ), nrStates );
 
-        Real logZ;
+    map<Var,size_t> varindices;
+    for( VarSet::const_iterator n = vs.begin(); n != vs.end(); n++ )
+        varindices[*n] = obj.fg().findVar( *n );
+
+    // calculate logZ for each clamped state; thread t handles a contiguous block of states using its own clone
+    vector<Real> logZs( nrStates );
+    vector<InfAlg*> clamped = cloneForThreads( obj, nthreads, reInit );
+    ThreadExceptions errors( nthreads );
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nthreads)
+#endif
+    for( long t = 0; t < (long)nthreads; t++ ) {
         try {
-            clamped->run();
-            logZ = clamped->logZ();
-        } catch( Exception &e ) {
-            if( e.getCode() == Exception::NOT_NORMALIZABLE )
-                logZ = -INFINITY;
-            else
-                throw;
+            size_t begin = (t * nrStates) / nthreads;
+            size_t end = ((t + 1) * nrStates) / nthreads;
+            State s( vs, begin );
+            map<size_t, size_t> x;
+            for( size_t li = begin; li < end; li++, s++ ) {
+                // set clamping Factors to delta functions (restoring the previously clamped factors)
+                for( VarSet::const_iterator n = vs.begin(); n != vs.end(); n++ )
+                    x[varindices.find(*n)->second] = s(*n);
+                clamped[t]->reclamp( x );
+
+                // run DAIAlg, calc logZ
+                logZs[li] = runClamped( clamped[t], vs, reInit );
+            }
+        } catch( std::exception &e ) {
+            errors.set( t, e );
         }
+    }
+    for( size_t t = 0; t < nthreads; t++ )
+        delete clamped[t];
+    errors.rethrow();
+
+    // store in Pvs
+    Real logZ0 = -INFINITY;
+    for( size_t li = 0; li < nrStates; li++ ) {
+        Real logZ = logZs[li];
 
         if( logZ0 == -INFINITY )
             if( logZ != -INFINITY )
                 logZ0 = logZ;
 
         if( logZ == -INFINITY )
-            Pvs.set( s, 0 );
+            Pvs.set( li, 0 );
         else
-            Pvs.set( s, exp(logZ - logZ0) ); // subtract logZ0 to avoid very large numbers
-
-        // restore clamped factors
-        clamped->restoreFactors( vs );
+            Pvs.set( li, exp(logZ - logZ0) ); // subtract logZ0 to avoid very large numbers
     }
 
-    delete clamped;
-
     return( Pvs.normalized() );
 }
 
 
-vector<Factor> calcPairBeliefs( const InfAlg & obj, const VarSet& vs, bool reInit, bool accurate ) {
+vector<Factor> calcPairBeliefs( const InfAlg & obj, const VarSet& vs, bool reInit, bool accurate, size_t nthreads ) {
     vector<Factor> result;
     size_t N = vs.size();
     result.reserve( N * (N - 1) / 2 );
 
-    InfAlg *clamped = obj.clone();
-    if( !reInit )
-        clamped->init();
-
     map<Var,size_t> varindices;
     for( VarSet::const_iterator v = vs.begin(); v != vs.end(); v++ )
         varindices[*v] = obj.fg().findVar( *v );
 
+    // convert vs to vector<VarSet>
+    vector<Var> vvs( vs.begin(), vs.end() );
+
     if( accurate ) {
+        // enumerate the clamped states of all pairs (j,k) with j < k
+        vector<size_t> runJ, runK, runJval, runKval;
+        for( size_t j = 0; j < N; j++ )
+            for( size_t k = j + 1; k < N; k++ )
+                for( size_t j_val = 0; j_val < vvs[j].states(); j_val++ )
+                    for( size_t k_val = 0; k_val < vvs[k].states(); k_val++ ) {
+                        runJ.push_back( j );
+                        runK.push_back( k );
+                        runJval.push_back( j_val );
+                        runKval.push_back( k_val );
+                    }
+        size_t nrRuns = runJ.size();
+
+        // calculate logZ for each of them; thread t handles a contiguous block using its own clone
+        vector<Real> logZs( nrRuns );
+        size_t nrWorkers = std::max( std::min( nrThreads( nthreads ), nrRuns ), (size_t)1 );
+        vector<InfAlg*> clamped = cloneForThreads( obj, nrWorkers, reInit );
+        ThreadExceptions errors( nrWorkers );
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nrWorkers)
+#endif
+        for( long t = 0; t < (long)nrWorkers; t++ ) {
+            try {
+                size_t end = ((t + 1) * nrRuns) / nrWorkers;
+                for( size_t r = (t * nrRuns) / nrWorkers; r < end; r++ ) {
+                    // clamp Vars j and k to their possible values (restoring the previously clamped factors)
+                    map<size_t, size_t> x;
+                    x[varindices.find(vvs[runJ[r]])->second] = runJval[r];
+                    x[varindices.find(vvs[runK[r]])->second] = runKval[r];
+                    clamped[t]->reclamp( x );
+                    logZs[r] = runClamped( clamped[t], vs, reInit );
+                }
+            } catch( std::exception &e ) {
+                errors.set( t, e );
+            }
+        }
+        for( size_t t = 0; t < nrWorkers; t++ )
+            delete clamped[t];
+        errors.rethrow();
+
         Real logZ0 = 0.0;
-        VarSet::const_iterator nj = vs.begin();
-        for( long j = 0; j < (long)N - 1; j++, nj++ ) {
-            size_t k = 0;
-            for( VarSet::const_iterator nk = nj; (++nk) != vs.end(); k++ ) {
-                Factor pairbelief( VarSet(*nj, *nk) );
-
-                // clamp Vars j and k to their possible values
-                for( size_t j_val = 0; j_val < nj->states(); j_val++ )
-                    for( size_t k_val = 0; k_val < nk->states(); k_val++ ) {
-                        // save unclamped factors connected to vs
-                        clamped->backupFactors( vs );
-
-                        clamped->clamp( varindices[*nj], j_val );
-                        clamped->clamp( varindices[*nk], k_val );
-                        if( reInit )
-                            clamped->init();
-                        else
-                            clamped->init(vs);
-
-                        Real logZ;
-                        try {
-                            clamped->run();
-                            logZ = clamped->logZ();
-                        } catch( Exception &e ) {
-                            if( e.getCode() == Exception::NOT_NORMALIZABLE )
-                                logZ = -INFINITY;
-                            else
-                                throw;
-                        }
+        size_t r = 0;
+        for( size_t j = 0; j < N; j++ )
+            for( size_t k = j + 1; k < N; k++ ) {
+                Factor pairbelief( VarSet(vvs[j], vvs[k]) );
+                for( size_t j_val = 0; j_val < vvs[j].states(); j_val++ )
+                    for( size_t k_val = 0; k_val < vvs[k].states(); k_val++, r++ ) {
+                        Real logZ = logZs[r];
 
                         if( logZ0 == -INFINITY )
                             if( logZ != -INFINITY )
@@ -130,19 +184,12 @@ vector<Factor> calcPairBeliefs( const InfAlg & obj, const VarSet& vs, bool reIni
 
                         // we assume that j.label() < k.label()
                         // i.e. we make an assumption here about the indexing
-                        pairbelief.set( j_val + (k_val * nj->states()), Z_xj );
-
-                        // restore clamped factors
-                        clamped->restoreFactors( vs );
+                        pairbelief.set( j_val + (k_val * vvs[j].states()), Z_xj );
                     }
 
                 result.push_back( pairbelief.normalized() );
             }
-        }
     } else {
-        // convert vs to vector<VarSet>
-        vector<Var> vvs( vs.begin(), vs.end() );
-
         vector<Factor> pairbeliefs;
         pairbeliefs.reserve( N * N );
         for( size_t j = 0; j < N; j++ )
@@ -152,50 +199,73 @@ vector<Factor> calcPairBeliefs( const InfAlg & obj, const VarSet& vs, bool reIni
                 else
                     pairbeliefs.push_back( Factor( VarSet(vvs[j], vvs[k]) ) );
 
-        Real logZ0 = -INFINITY;
-        for( size_t j = 0; j < N; j++ ) {
-            // clamp Var j to its possible values
+        // enumerate the clamped states of all single variables
+        vector<size_t> runJ, runJval;
+        for( size_t j = 0; j < N; j++ )
             for( size_t j_val = 0; j_val < vvs[j].states(); j_val++ ) {
-                clamped->clamp( varindices[vvs[j]], j_val, true );
-                if( reInit )
-                    clamped->init();
-                else
-                    clamped->init(vs);
-
-                Real logZ;
-                try {
-                    clamped->run();
-                    logZ = clamped->logZ();
-                } catch( Exception &e ) {
-                    if( e.getCode() == Exception::NOT_NORMALIZABLE )
-                        logZ = -INFINITY;
-                    else
-                        throw;
+                runJ.push_back( j );
+                runJval.push_back( j_val );
+            }
+        size_t nrRuns = runJ.size();
+
+        // calculate logZ and single variable beliefs for each of them; thread t handles a contiguous block using its own clone
+        vector<Real> logZs( nrRuns );
+        vector<vector<Factor> > beliefs( nrRuns );
+        size_t nrWorkers = std::max( std::min( nrThreads( nthreads ), nrRuns ), (size_t)1 );
+        vector<InfAlg*> clamped = cloneForThreads( obj, nrWorkers, reInit );
+        ThreadExceptions errors( nrWorkers );
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nrWorkers)
+#endif
+        for( long t = 0; t < (long)nrWorkers; t++ ) {
+            try {
+                size_t end = ((t + 1) * nrRuns) / nrWorkers;
+                for( size_t r = (t * nrRuns) / nrWorkers; r < end; r++ ) {
+                    size_t j = runJ[r];
+                    // clamp Var j to its possible values (restoring the previously clamped factors)
+                    map<size_t, size_t> x;
+                    x[varindices.find(vvs[j])->second] = runJval[r];
+                    clamped[t]->reclamp( x );
+                    logZs[r] = runClamped( clamped[t], vs, reInit );
+
+                    beliefs[r].resize( N );
+                    for( size_t k = 0; k < N; k++ )
+                        if( k != j )
+                            beliefs[r][k] = clamped[t]->belief(vvs[k]);
                 }
+            } catch( std::exception &e ) {
+                errors.set( t, e );
+            }
+        }
+        for( size_t t = 0; t < nrWorkers; t++ )
+            delete clamped[t];
+        errors.rethrow();
 
-                if( logZ0 == -INFINITY )
-                    if( logZ != -INFINITY )
-                        logZ0 = logZ;
-
-                Real Z_xj;
-                if( logZ == -INFINITY )
-                    Z_xj = 0;
-                else
-                    Z_xj = exp(logZ - logZ0); // subtract logZ0 to avoid very large numbers
-
-                for( size_t k = 0; k < N; k++ )
-                    if( k != j ) {
-                        Factor b_k = clamped->belief(vvs[k]);
-                        for( size_t k_val = 0; k_val < vvs[k].states(); k_val++ )
-                            if( vvs[j].label() < vvs[k].label() )
-                                pairbeliefs[j * N + k].set( j_val + (k_val * vvs[j].states()), Z_xj * b_k[k_val] );
-                            else
-                                pairbeliefs[j * N + k].set( k_val + (j_val * vvs[k].states()), Z_xj * b_k[k_val] );
-                    }
+        Real logZ0 = -INFINITY;
+        for( size_t r = 0; r < nrRuns; r++ ) {
+            size_t j = runJ[r];
+            size_t j_val = runJval[r];
+            Real logZ = logZs[r];
+
+            if( logZ0 == -INFINITY )
+                if( logZ != -INFINITY )
+                    logZ0 = logZ;
+
+            Real Z_xj;
+            if( logZ == -INFINITY )
+                Z_xj = 0;
+            else
+                Z_xj = exp(logZ - logZ0); // subtract logZ0 to avoid very large numbers
 
-                // restore clamped factors
-                clamped->restoreFactors( vs );
-            }
+            for( size_t k = 0; k < N; k++ )
+                if( k != j ) {
+                    const Factor &b_k = beliefs[r][k];
+                    for( size_t k_val = 0; k_val < vvs[k].states(); k_val++ )
+                        if( vvs[j].label() < vvs[k].label() )
+                            pairbeliefs[j * N + k].set( j_val + (k_val * vvs[j].states()), Z_xj * b_k[k_val] );
+                        else
+                            pairbeliefs[j * N + k].set( k_val + (j_val * vvs[k].states()), Z_xj * b_k[k_val] );
+                }
         }
 
         // Calculate result by taking the geometric average
@@ -203,7 +273,6 @@ vector<Factor> calcPairBeliefs( const InfAlg & obj, const VarSet& vs, bool reIni
             for( size_t k = j+1; k < N; k++ )
                 result.push_back( ((pairbeliefs[j * N + k] * pairbeliefs[k * N + j]) ^ 0.5).normalized() );
     }
-    delete clamped;
     return result;
 }
 
@@ -29,6 +29,11 @@ void DecMAP::setProperties( const PropertySet &opts ) {
         props.reinit = opts.getStringAs<bool>("reinit");
     else
         props.reinit = true;
+    if( opts.hasKey("batchsize") )
+        props.batchsize = opts.getStringAs<size_t>("batchsize");
+    else
+        props.batchsize = 1;
+    DAI_ASSERT( props.batchsize >= 1 );
 }
 
 
@@ -36,6 +41,7 @@ PropertySet DecMAP::getProperties() const {
     PropertySet opts;
     opts.set( "verbose", props.verbose );
     opts.set( "reinit", props.reinit );
+    opts.set( "batchsize", props.batchsize );
     opts.set( "ianame", props.ianame );
     opts.set( "iaopts", props.iaopts );
     return opts;
@@ -47,6 +53,7 @@ string DecMAP::printProperties() const {
     s << "[";
     s << "verbose=" << props.verbose << ",";
     s << "reinit=" << props.reinit << ",";
+    s << "batchsize=" << props.batchsize << ",";
     s << "ianame=" << props.ianame << ",";
     s << "iaopts=" << props.iaopts << "]";
     return s.str();
@@ -88,66 +95,166 @@ vector<Factor> DecMAP::beliefs() const {
 }
 
 
+/// Priority of a factor in the decimation: lower entropies come first, and ties are broken in favor of the lowest index
+struct DecMAPPriority {
+    /// Whether the factor has no free variables left
+    bool clamped;
+    /// Entropy of the belief of the factor
+    Real entropy;
+    /// Index of the factor
+    size_t index;
+
+    /// Returns \c true if \a x should be clamped before \c *this
+    bool operator<( const DecMAPPriority &x ) const {
+        if( clamped || x.clamped )
+            return clamped && !x.clamped;
+        return (entropy > x.entropy) || (entropy == x.entropy && index > x.index);
+    }
+};
+
+
 Real DecMAP::run() {
     if( props.verbose >= 1 )
         cerr << "Starting " << identify() << "...";
     if( props.verbose >= 2 )
         cerr << endl;
 
+    double tic = toc();
+
     // the variables which have not been clamped yet
-    SmallSet<size_t> freeVars;
+    vector<size_t> freeVars;
+    freeVars.reserve( nrVars() );
     for( size_t i = 0; i < nrVars(); i++ )
-        freeVars |= i;
+        freeVars.push_back( i );
+    vector<bool> isFree( nrVars(), true );
+    size_t nrFreeVars = nrVars();
+    // the round in which each variable has been clamped as part of a factor
+    vector<size_t> clampRound( nrVars(), (size_t)-1 );
+
+    // the factors which still contain free variables, and their number of free variables
+    vector<size_t> freeFactors;
+    freeFactors.reserve( nrFactors() );
+    vector<size_t> nrFree( nrFactors() );
+    for( size_t I = 0; I < nrFactors(); I++ ) {
+        freeFactors.push_back( I );
+        nrFree[I] = nbF(I).size();
+    }
+
+    // priority queue of the factors, ordered by the entropy of their beliefs
+    DecMAPPriority p;
+    p.clamped = false;
+    p.entropy = INFINITY;
+    IndexedHeap<DecMAPPriority> queue;
+    for( size_t I = 0; I < nrFactors(); I++ ) {
+        p.index = I;
+        queue.push( p );
+    }
 
     // prepare the inference algorithm object
     InfAlg *clamped = newInfAlg( props.ianame, fg(), props.iaopts );
 
     // decimate until no free variables remain
-    while( freeVars.size() ) {
+    for( size_t round = 0; nrFreeVars; round++ ) {
+        double ticRound = toc();
         Real md = clamped->run();
         if( md > _maxdiff )
             _maxdiff = md;
-        _iters += clamped->Iterations();
+        size_t iters = clamped->Iterations();
+        _iters += iters;
+        double tocRun = toc();
 
         // store the variables that need initialization
         VarSet varsToInit;
         SmallSet<size_t> varsToClamp;
 
         // schedule clamping for the free variables with zero entropy
-        for( SmallSet<size_t>::const_iterator it = freeVars.begin(); it != freeVars.end(); ) {
-            if( clamped->beliefV( *it ).entropy() == 0.0 ) {
+        size_t nrKept = 0;
+        for( size_t k = 0; k < freeVars.size(); k++ ) {
+            size_t i = freeVars[k];
+            if( !isFree[i] )
+                continue;
+            Factor bi = clamped->beliefV( i );
+            if( bi.entropy() == 0.0 ) {
                 // this variable should be clamped
-                varsToInit |= var( *it );
-                varsToClamp |= *it;
-                _state[*it] = clamped->beliefV( *it ).p().argmax().first;
-                freeVars.erase( *it );
+                varsToInit |= var(i);
+                varsToClamp |= i;
+                _state[i] = bi.p().argmax().first;
+                isFree[i] = false;
+                nrFreeVars--;
+                foreach( const Neighbor &I, nbV(i) )
+                    nrFree[I]--;
             } else
-                it++;
+                freeVars[nrKept++] = i;
         }
-
-        // find the free factor with lowest entropy
-        size_t bestI = 0;
-        Real bestEnt = INFINITY;
-        for( size_t I = 0; I < nrFactors(); I++ ) {
-            // check if the factor is still free
-            if( freeVars.intersects( bipGraph().nb2Set(I) ) ) {
-                Real EntI = clamped->beliefF(I).entropy();
-                if( EntI < bestEnt ) {
-                    bestI = I;
-                    bestEnt = EntI;
-                }
+        freeVars.resize( nrKept );
+
+        // update the priorities of the free factors whose entropy has changed, and remove the other factors
+        nrKept = 0;
+        for( size_t k = 0; k < freeFactors.size(); k++ ) {
+            size_t I = freeFactors[k];
+            p.index = I;
+            if( nrFree[I] ) {
+                p.clamped = false;
+                p.entropy = clamped->beliefF(I).entropy();
+                if( !(p.entropy == queue.key(I).entropy) )
+                    queue.set( I, p );
+                freeFactors[nrKept++] = I;
+            } else {
+                p.clamped = true;
+                queue.set( I, p );
             }
         }
+        freeFactors.resize( nrKept );
+
+        // schedule clamping for at most props.batchsize free factors with lowest entropy, skipping
+        // those that share a variable with a factor that has been scheduled in this round
+        vector<DecMAPPriority> skipped;
+        for( size_t nrClampedFactors = 0; nrClampedFactors < props.batchsize && !queue.empty() && !queue.key( queue.top() ).clamped; ) {
+            size_t I = queue.top();
+            DecMAPPriority pI = queue.key( I );
+            p.clamped = true;
+            p.index = I;
+            queue.set( I, p );
+
+            bool conflict = false;
+            foreach( const Neighbor &i, nbF(I) )
+                if( clampRound[i] == round ) {
+                    conflict = true;
+                    break;
+                }
+            if( conflict ) {
+                skipped.push_back( pI );
+                continue;
+            }
 
-        // schedule clamping for the factor with lowest entropy
-        vector<size_t> Istate(1,0);
-        Istate[0] = clamped->beliefF(bestI).p().argmax().first;
-        map<Var, size_t> Istatemap = calcState( factor(bestI).vars(), Istate[0] );
-        foreach( size_t i, bipGraph().nb2Set(bestI) & freeVars ) {
-            varsToInit |= var(i);
-            varsToClamp |= i;
-            _state[i] = Istatemap[var(i)];
-            freeVars.erase(i);
+            // clamp the free variables of this factor to its most probable state
+            map<Var, size_t> Istatemap = calcState( factor(I).vars(), clamped->beliefF(I).p().argmax().first );
+            foreach( const Neighbor &i, nbF(I) )
+                if( isFree[i] ) {
+                    varsToInit |= var(i);
+                    varsToClamp |= i;
+                    _state[i] = Istatemap[var(i)];
+                    isFree[i] = false;
+                    nrFreeVars--;
+                    clampRound[i] = round;
+                    foreach( const Neighbor &J, nbV(i) )
+                        nrFree[J]--;
+                }
+            nrClampedFactors++;
+        }
+        foreach( const DecMAPPriority &pI, skipped )
+            queue.set( pI.index, pI );
+
+        // if no factor contains free variables, clamp the remaining free variables to their most probable states
+        if( varsToClamp.size() == 0 ) {
+            foreach( size_t i, freeVars )
+                if( isFree[i] ) {
+                    varsToInit |= var(i);
+                    varsToClamp |= i;
+                    _state[i] = clamped->beliefV( i ).p().argmax().first;
+                    isFree[i] = false;
+                    nrFreeVars--;
+                }
         }
 
         // clamp all variables scheduled for clamping
@@ -159,6 +266,9 @@ Real DecMAP::run() {
             clamped->init();
         else
             clamped->init( varsToInit );
+
+        if( props.verbose >= 2 )
+            cerr << name() << "::run:  round " << round << ": inference took " << tocRun - ticRound << " seconds (" << iters << " iterations), selecting and clamping " << varsToClamp.size() << " variables took " << toc() - tocRun << " seconds, " << nrFreeVars << " free variables left" << endl;
     }
 
     // calculate MAP state
@@ -172,6 +282,9 @@ Real DecMAP::run() {
     // clean up
     delete clamped;
 
+    if( props.verbose >= 1 )
+        cerr << name() << " needed " << toc() - tic << " seconds." << endl;
+
     return _maxdiff;
 }
 
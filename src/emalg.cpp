@@ -56,6 +56,11 @@ void CondProbEstimation::addSufficientStatistics( const Prob &p ) {
 }
 
 
+void CondProbEstimation::addRepeatedSufficientStatistics( const Prob &p, size_t count ) {
+    _stats += p * (Real)count;
+}
+
+
 Prob CondProbEstimation::estimate() {
     // normalize pseudocounts
     for( size_t parent = 0; parent < _stats.size(); parent += _target_dim ) {
@@ -164,16 +169,33 @@ SharedParameters::SharedParameters( std::istream &is, const FactorGraph &fg )
 
 
 void SharedParameters::collectSufficientStatistics( InfAlg &alg ) {
-    for( std::map< FactorIndex, Permute >::iterator i = _perms.begin(); i != _perms.end(); ++i ) {
-        Permute &perm = i->second;
-        VarSet &vs = _varsets[i->first];
+    addSufficientStatistics( calcSufficientStatistics( alg ) );
+}
+
+
+std::vector<Prob> SharedParameters::calcSufficientStatistics( const InfAlg &alg ) const {
+    std::vector<Prob> stats;
+    stats.reserve( _perms.size() );
+    for( std::map< FactorIndex, Permute >::const_iterator i = _perms.begin(); i != _perms.end(); ++i ) {
+        const Permute &perm = i->second;
+        const VarSet &vs = _varsets.find(i->first)->second;
 
         Factor b = alg.belief(vs);
         Prob p( b.nrStates(), 0.0 );
         for( size_t entry = 0; entry < b.nrStates(); ++entry )
             p.set( entry, b[perm.convertLinearIndex(entry)] ); // apply inverse permutation
-        _estimation->addSufficientStatistics( p );
+        stats.push_back( p );
     }
+    return stats;
+}
+
+
+void SharedParameters::addSufficientStatistics( const std::vector<Prob> &stats, size_t count ) {
+    for( size_t i = 0; i < stats.size(); ++i )
+        if( count == 1 )
+            _estimation->addSufficientStatistics( stats[i] );
+        else
+            _estimation->addRepeatedSufficientStatistics( stats[i], count );
 }
 
 
@@ -207,6 +229,22 @@ void MaximizationStep::addExpectations( InfAlg &alg ) {
 }
 
 
+std::vector<std::vector<Prob> > MaximizationStep::calcExpectations( const InfAlg &alg ) const {
+    std::vector<std::vector<Prob> > expectations;
+    expectations.reserve( _params.size() );
+    for( size_t i = 0; i < _params.size(); ++i )
+        expectations.push_back( _params[i].calcSufficientStatistics( alg ) );
+    return expectations;
+}
+
+
+void MaximizationStep::addExpectations( const std::vector<std::vector<Prob> > &expectations, size_t count ) {
+    DAI_ASSERT( expectations.size() == _params.size() );
+    for( size_t i = 0; i < _params.size(); ++i )
+        _params[i].addSufficientStatistics( expectations[i], count );
+}
+
+
 void MaximizationStep::maximize( FactorGraph &fg ) {
     for( size_t i = 0; i < _params.size(); ++i )
         _params[i].setParameters( fg );
@@ -217,10 +255,14 @@ const std::string EMAlg::MAX_ITERS_KEY("max_iters");
 const std::string EMAlg::LOG_Z_TOL_KEY("log_z_tol");
 const size_t EMAlg::MAX_ITERS_DEFAULT = 30;
 const Real EMAlg::LOG_Z_TOL_DEFAULT = 0.01;
+const std::string EMAlg::NTHREADS_KEY("nthreads");
+const size_t EMAlg::NTHREADS_DEFAULT = 1;
+const std::string EMAlg::DEDUP_SAMPLES_KEY("dedup_samples");
+const bool EMAlg::DEDUP_SAMPLES_DEFAULT = false;
 
 
 EMAlg::EMAlg( const Evidence &evidence, InfAlg &estep, std::istream &msteps_file )
-  : _evidence(evidence), _estep(estep), _msteps(), _iters(0), _lastLogZ(), _max_iters(MAX_ITERS_DEFAULT), _log_z_tol(LOG_Z_TOL_DEFAULT)
+  : _evidence(evidence), _estep(estep), _msteps(), _iters(0), _lastLogZ(), _max_iters(MAX_ITERS_DEFAULT), _log_z_tol(LOG_Z_TOL_DEFAULT), _nthreads(NTHREADS_DEFAULT), _dedup_samples(DEDUP_SAMPLES_DEFAULT)
 {
     msteps_file.exceptions( std::istream::eofbit | std::istream::failbit | std::istream::badbit );
     size_t num_msteps = -1;
@@ -236,6 +278,10 @@ void EMAlg::setTermConditions( const PropertySet &p ) {
         _max_iters = p.getStringAs<size_t>(MAX_ITERS_KEY);
     if( p.hasKey(LOG_Z_TOL_KEY) )
         _log_z_tol = p.getStringAs<Real>(LOG_Z_TOL_KEY);
+    if( p.hasKey(NTHREADS_KEY) )
+        _nthreads = p.getStringAs<size_t>(NTHREADS_KEY);
+    if( p.hasKey(DEDUP_SAMPLES_KEY) )
+        _dedup_samples = p.getStringAs<bool>(DEDUP_SAMPLES_KEY);
 }
 
 
@@ -270,20 +316,74 @@ Real EMAlg::iterate( MaximizationStep &mstep ) {
     logZ = _estep.logZ();
 
     // Expectation calculation
-    for( Evidence::const_iterator e = _evidence.begin(); e != _evidence.end(); ++e ) {
-        InfAlg* clamped = _estep.clone();
-        // Apply evidence
-        for( Evidence::Observation::const_iterator i = e->begin(); i != e->end(); ++i )
-            clamped->clamp( clamped->fg().findVar(i->first), i->second );
-        clamped->init();
-        clamped->run();
-
-        likelihood += clamped->logZ() - logZ;
-
-        mstep.addExpectations( *clamped );
+    // If _dedup_samples is set, inference is done once for each distinct sample, and the
+    // results are weighted by the number of occurrences of the sample. The samples are
+    // processed in batches. Within a batch, each thread handles a contiguous block of samples
+    // using its own clone of _estep; afterwards, the results are added in the order of the
+    // samples, such that they do not depend on the number of threads.
+    std::vector<size_t> samples;
+    std::vector<size_t> counts;
+    if( _dedup_samples )
+        samples = _evidence.uniqueSamples( counts );
+    else {
+        samples.reserve( _evidence.nrSamples() );
+        for( size_t s = 0; s < _evidence.nrSamples(); s++ )
+            samples.push_back( s );
+        counts.assign( _evidence.nrSamples(), 1 );
+    }
+    size_t nrSamples = samples.size();
+    size_t nthreads = std::max( std::min( nrThreads( _nthreads ), nrSamples ), (size_t)1 );
+    size_t batchSize = 64 * nthreads;
+    // Indices in the factor graph of the variables in the columns of the evidence
+    std::vector<size_t> varIndices;
+    varIndices.reserve( _evidence.nrVars() );
+    for( size_t j = 0; j < _evidence.nrVars(); j++ )
+        varIndices.push_back( _estep.fg().findVar( _evidence.vars()[j] ) );
+    std::vector<InfAlg*> clamped( nthreads );
+    for( size_t t = 0; t < nthreads; t++ )
+        clamped[t] = _estep.clone();
+    std::vector<Real> logZs( batchSize );
+    std::vector<std::vector<std::vector<Prob> > > expectations( batchSize );
+    ThreadExceptions errors( nthreads );
+    for( size_t batchBegin = 0; batchBegin < nrSamples; batchBegin += batchSize ) {
+        size_t batchEnd = std::min( batchBegin + batchSize, nrSamples );
+        size_t nrBatchSamples = batchEnd - batchBegin;
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nthreads)
+#endif
+        for( long t = 0; t < (long)nthreads; t++ ) {
+            try {
+                size_t end = ((t + 1) * nrBatchSamples) / nthreads;
+                for( size_t s = (t * nrBatchSamples) / nthreads; s < end; s++ ) {
+                    size_t sample = samples[batchBegin + s];
+                    // Apply evidence (undoing the evidence of the previous sample)
+                    std::map<size_t, size_t> x;
+                    for( size_t j = 0; j < varIndices.size(); j++ )
+                        if( _evidence.observed( sample, j ) )
+                            x[varIndices[j]] = _evidence.state( sample, j );
+                    clamped[t]->reclamp( x );
+                    clamped[t]->init();
+                    clamped[t]->run();
+
+                    logZs[s] = clamped[t]->logZ();
+                    expectations[s] = mstep.calcExpectations( *clamped[t] );
+                }
+            } catch( std::exception &e ) {
+                errors.set( t, e );
+            }
+        }
+        if( errors.occurred() )
+            break;
 
-        delete clamped;
+        for( size_t s = 0; s < nrBatchSamples; s++ ) {
+            size_t count = counts[batchBegin + s];
+            likelihood += count * (logZs[s] - logZ);
+            mstep.addExpectations( expectations[s], count );
+        }
     }
+    for( size_t t = 0; t < nthreads; t++ )
+        delete clamped[t];
+    errors.rethrow();
 
     // Maximization of parameters
     mstep.maximize( _estep.fg() );
@@ -8,7 +8,8 @@
 
 #include <sstream>
 #include <string>
-#include <cstdlib>
+#include <limits>
+#include <algorithm>
 
 #include <dai/util.h>
 #include <dai/evidence.h>
@@ -18,7 +19,136 @@
 namespace dai {
 
 
-void Evidence::addEvidenceTabFile( std::istream &is, FactorGraph &fg ) {
+Evidence::Evidence( const std::vector<Observation> &samples ) : _vars(), _columns(), _states(), _observed(), _nrSamples(0) {
+    for( std::vector<Observation>::const_iterator s = samples.begin(); s != samples.end(); ++s )
+        addSample( *s );
+}
+
+
+size_t Evidence::addVar( const Var &v ) {
+    std::map<Var, size_t>::const_iterator it = _columns.find( v );
+    if( it != _columns.end() )
+        return it->second;
+    if( v.states() > (size_t)std::numeric_limits<State>::max() + 1 )
+        DAI_THROWE(NOT_IMPLEMENTED,"Variable " + toString(v) + " has too many states");
+    size_t j = _vars.size();
+    _vars.push_back( v );
+    _columns[v] = j;
+    _states.push_back( std::vector<State>( _nrSamples, 0 ) );
+    _observed.push_back( std::vector<bool>( _nrSamples, false ) );
+    return j;
+}
+
+
+void Evidence::addEmptySample() {
+    for( size_t j = 0; j < _vars.size(); j++ ) {
+        _states[j].push_back( 0 );
+        _observed[j].push_back( false );
+    }
+    _nrSamples++;
+}
+
+
+void Evidence::addSample( const Observation &sample ) {
+    std::vector<size_t> cols;
+    cols.reserve( sample.size() );
+    for( Observation::const_iterator i = sample.begin(); i != sample.end(); ++i ) {
+        if( i->second >= i->first.states() )
+            DAI_THROWE(INVALID_EVIDENCE_FILE,"State " + toString(i->second) + " of variable " + toString(i->first) + " too large");
+        cols.push_back( addVar( i->first ) );
+    }
+    addEmptySample();
+    size_t k = 0;
+    for( Observation::const_iterator i = sample.begin(); i != sample.end(); ++i, ++k )
+        setLastState( cols[k], i->second );
+}
+
+
+void Evidence::addSamples( const std::vector<Var> &vars, const std::vector<size_t> &states, const std::vector<bool> &observed ) {
+    size_t nrCols = vars.size();
+    if( nrCols == 0 ? !states.empty() : (states.size() % nrCols != 0) )
+        DAI_THROWE(INVALID_EVIDENCE_FILE,"Number of states (" + toString(states.size()) + ") is not a multiple of the number of variables (" + toString(nrCols) + ")");
+    if( !observed.empty() && observed.size() != states.size() )
+        DAI_THROWE(INVALID_EVIDENCE_FILE,"Size of observed mask (" + toString(observed.size()) + ") does not match number of states (" + toString(states.size()) + ")");
+    for( size_t k = 0; k < states.size(); k++ )
+        if( (observed.empty() || observed[k]) && states[k] >= vars[k % nrCols].states() )
+            DAI_THROWE(INVALID_EVIDENCE_FILE,"State " + toString(states[k]) + " of variable " + toString(vars[k % nrCols]) + " too large in sample " + toString(k / nrCols));
+
+    std::vector<size_t> cols;
+    cols.reserve( nrCols );
+    for( size_t i = 0; i < nrCols; i++ )
+        cols.push_back( addVar( vars[i] ) );
+    size_t nrNew = nrCols ? states.size() / nrCols : 0;
+    for( size_t j = 0; j < _vars.size(); j++ ) {
+        _states[j].reserve( _nrSamples + nrNew );
+        _observed[j].reserve( _nrSamples + nrNew );
+    }
+    for( size_t s = 0; s < nrNew; s++ ) {
+        addEmptySample();
+        for( size_t i = 0; i < nrCols; i++ ) {
+            size_t k = s * nrCols + i;
+            if( observed.empty() || observed[k] )
+                setLastState( cols[i], states[k] );
+        }
+    }
+}
+
+
+void Evidence::clear() {
+    _vars.clear();
+    _columns.clear();
+    _states.clear();
+    _observed.clear();
+    _nrSamples = 0;
+}
+
+
+size_t Evidence::nrObserved( size_t s ) const {
+    size_t n = 0;
+    for( size_t j = 0; j < _vars.size(); j++ )
+        if( _observed[j][s] )
+            n++;
+    return n;
+}
+
+
+Evidence::Observation Evidence::sample( size_t s ) const {
+    Observation result;
+    for( size_t j = 0; j < _vars.size(); j++ )
+        if( _observed[j][s] )
+            result[_vars[j]] = _states[j][s];
+    return result;
+}
+
+
+std::vector<size_t> Evidence::uniqueSamples( std::vector<size_t> &counts ) const {
+    std::vector<size_t> result;
+    counts.clear();
+    // Maps each distinct sample (as the vector of states plus one, where zero means missing) to its index in result
+    hash_map<std::vector<size_t>, size_t> index;
+    std::vector<size_t> key( _vars.size() );
+    for( size_t s = 0; s < _nrSamples; s++ ) {
+        for( size_t j = 0; j < _vars.size(); j++ )
+            key[j] = _observed[j][s] ? (size_t)_states[j][s] + 1 : 0;
+        hash_map<std::vector<size_t>, size_t>::const_iterator it = index.find( key );
+        if( it == index.end() ) {
+            index[key] = result.size();
+            result.push_back( s );
+            counts.push_back( 1 );
+        } else
+            counts[it->second]++;
+    }
+    return result;
+}
+
+
+void Evidence::addEvidenceTabFile( std::istream &is, const FactorGraph &fg ) {
+    TabFileReader reader( is, fg );
+    reader.read( *this );
+}
+
+
+Evidence::TabFileReader::TabFileReader( std::istream &is, const FactorGraph &fg ) : _is(is), _vars(), _lineNumber(0), _line(), _row() {
     std::map<std::string, Var> varMap;
     for( std::vector<Var>::const_iterator v = fg.vars().begin(); v != fg.vars().end(); ++v ) {
         std::stringstream s;
@@ -26,56 +156,73 @@ void Evidence::addEvidenceTabFile( std::istream &is, FactorGraph &fg ) {
         varMap[s.str()] = *v;
     }
 
-    addEvidenceTabFile( is, varMap );
-}
-
-
-void Evidence::addEvidenceTabFile( std::istream &is, std::map<std::string, Var> &varMap ) {
-    std::string line;
-    getline( is, line );
-    size_t line_number = 2;
+    getline( _is, _line );
+    _lineNumber++;
 
     // Parse header
     std::vector<std::string> header_fields;
-    header_fields = tokenizeString( line, true );
+    header_fields = tokenizeString( _line, true );
     std::vector<std::string>::const_iterator p_field = header_fields.begin();
     if( p_field == header_fields.end() )
         DAI_THROWE(INVALID_EVIDENCE_FILE,"Empty header line");
 
-    std::vector<Var> vars;
     for( ; p_field != header_fields.end(); ++p_field ) {
         std::map<std::string, Var>::iterator elem = varMap.find( *p_field );
         if( elem == varMap.end() )
             DAI_THROWE(INVALID_EVIDENCE_FILE,"Variable " + *p_field + " not known");
-        vars.push_back( elem->second );
+        _vars.push_back( elem->second );
     }
 
-    getline(is,line);
-    if( is.fail() || line.size() > 0 )
+    getline( _is, _line );
+    _lineNumber++;
+    if( _is.fail() || _line.size() > 0 )
         DAI_THROWE(INVALID_EVIDENCE_FILE,"Expecting empty line");
+    _row.resize( _vars.size() );
+}
+
 
-    // Read samples
-    while( getline(is, line) ) {
-        line_number++;
-
-        std::vector<std::string> fields;
-        fields = tokenizeString( line, true, "\t" );
-        if( fields.size() != vars.size() )
-            DAI_THROWE(INVALID_EVIDENCE_FILE,"Invalid number of fields in line " + boost::lexical_cast<std::string>(line_number));
-
-        Observation sample;
-        for( size_t i = 0; i < vars.size(); ++i ) {
-            if( fields[i].size() > 0 ) { // skip if missing observation
-                if( fields[i].find_first_not_of("0123456789") != std::string::npos )
-                    DAI_THROWE(INVALID_EVIDENCE_FILE,"Invalid state " + fields[i] + " in line " + boost::lexical_cast<std::string>(line_number));
-                size_t state = fromString<size_t>( fields[i].c_str() );
-                if( state >= vars[i].states() )
-                    DAI_THROWE(INVALID_EVIDENCE_FILE,"State " + fields[i] + " too large in line " + boost::lexical_cast<std::string>(line_number));
-                sample[vars[i]] = state;
+size_t Evidence::TabFileReader::read( Evidence &evidence, size_t maxSamples ) {
+    std::vector<size_t> cols;
+    cols.reserve( _vars.size() );
+    for( size_t i = 0; i < _vars.size(); i++ )
+        cols.push_back( evidence.addVar( _vars[i] ) );
+
+    size_t nrRead = 0;
+    while( nrRead < maxSamples && getline( _is, _line ) ) {
+        _lineNumber++;
+        if( (size_t)std::count( _line.begin(), _line.end(), '\t' ) + 1 != _vars.size() )
+            DAI_THROWE(INVALID_EVIDENCE_FILE,"Invalid number of fields in line " + boost::lexical_cast<std::string>(_lineNumber));
+
+        // Parse the fields of the line, which are separated by single tabs
+        const char *pos = _line.c_str();
+        for( size_t i = 0; i < _vars.size(); i++, pos++ ) {
+            const char *begin = pos;
+            size_t state = 0;
+            bool valid = true, tooLarge = false;
+            for( ; *pos != '\t' && *pos != '\0'; pos++ ) {
+                if( *pos < '0' || *pos > '9' )
+                    valid = false;
+                else if( !tooLarge ) {
+                    state = 10 * state + (*pos - '0');
+                    if( state >= _vars[i].states() )
+                        tooLarge = true;
+                }
             }
+            if( !valid )
+                DAI_THROWE(INVALID_EVIDENCE_FILE,"Invalid state " + std::string(begin, pos) + " in line " + boost::lexical_cast<std::string>(_lineNumber));
+            if( tooLarge )
+                DAI_THROWE(INVALID_EVIDENCE_FILE,"State " + std::string(begin, pos) + " too large in line " + boost::lexical_cast<std::string>(_lineNumber));
+            _row[i] = (pos != begin) ? state : (size_t)-1;
         }
-        _samples.push_back( sample );
+
+        evidence.addEmptySample();
+        nrRead++;
+        for( size_t i = 0; i < _vars.size(); i++ )
+            if( _row[i] != (size_t)-1 ) // skip if missing observation
+                evidence.setLastState( cols[i], _row[i] );
     } // finished sample line
+
+    return nrRead;
 }
 
 
@@ -19,6 +19,16 @@
 #include <dai/util.h>
 #include <dai/exceptions.h>
 #include <boost/lexical_cast.hpp>
+#include <boost/cstdint.hpp>
+#include <cstring>
+#include <cstdlib>
+#include <limits>
+#ifndef WINDOWS
+    #include <sys/mman.h>
+    #include <sys/stat.h>
+    #include <fcntl.h>
+    #include <unistd.h>
+#endif
 
 
 namespace dai {
@@ -27,7 +37,7 @@ namespace dai {
 using namespace std;
 
 
-FactorGraph::FactorGraph( const std::vector<Factor> &P ) : _G(), _backup() {
+FactorGraph::FactorGraph( const std::vector<Factor> &P ) : _G(), _backup(), _reclampBackup() {
     // add factors, obtain variables
     set<Var> varset;
     _factors.reserve( P.size() );
@@ -48,6 +58,73 @@ FactorGraph::FactorGraph( const std::vector<Factor> &P ) : _G(), _backup() {
 }
 
 
+FactorGraph::FactorGraph( const std::vector<size_t>& labels, const std::vector<size_t>& states, const std::vector<size_t>& scopeBegin, const std::vector<size_t>& scopeVars, const std::vector<Real>& values ) : _G(), _backup(), _reclampBackup() {
+    if( labels.size() != states.size() )
+        DAI_THROWE(RUNTIME_ERROR,"Number of variable labels and number of variable states differ");
+    if( scopeBegin.empty() || scopeBegin.front() != 0 || scopeBegin.back() != scopeVars.size() )
+        DAI_THROWE(RUNTIME_ERROR,"Factor scope offsets do not match the factor scope variables");
+    for( size_t I = 0; I + 1 < scopeBegin.size(); I++ )
+        if( scopeBegin[I+1] < scopeBegin[I] || scopeBegin[I+1] > scopeVars.size() )
+            DAI_THROWE(RUNTIME_ERROR,"Factor scope offsets should be nondecreasing");
+
+    // create variables
+    vector<Var> vars;
+    vars.reserve( labels.size() );
+    for( size_t i = 0; i < labels.size(); i++ )
+        vars.push_back( Var( labels[i], states[i] ) );
+
+    // add vars, ordered by label (as in the other constructors)
+    _vars = vars;
+    sort( _vars.begin(), _vars.end() );
+    for( size_t i = 1; i < _vars.size(); i++ )
+        if( _vars[i].label() == _vars[i-1].label() )
+            DAI_THROWE(RUNTIME_ERROR,"Variable with label " + boost::lexical_cast<string>(_vars[i].label()) + " occurs more than once");
+
+    // add factors
+    size_t nrFacs = scopeBegin.size() - 1;
+    _factors.reserve( nrFacs );
+    size_t nrEdges = 0;
+    size_t offset = 0;
+    vector<Var> Ivars;
+    for( size_t I = 0; I < nrFacs; I++ ) {
+        Ivars.clear();
+        bool ordered = true;
+        for( size_t k = scopeBegin[I]; k < scopeBegin[I+1]; k++ ) {
+            if( scopeVars[k] >= vars.size() )
+                DAI_THROWE(RUNTIME_ERROR,"Factor scope refers to a nonexisting variable");
+            Ivars.push_back( vars[scopeVars[k]] );
+            if( Ivars.size() > 1 && !(Ivars[Ivars.size()-2] < Ivars.back()) )
+                ordered = false;
+        }
+        VarSet Ivs( Ivars.begin(), Ivars.end(), Ivars.size() );
+        if( Ivs.size() != Ivars.size() )
+            DAI_THROWE(RUNTIME_ERROR,"Factor scope contains the same variable more than once");
+
+        size_t N = BigInt_size_t( Ivs.nrStates() );
+        if( offset + N > values.size() )
+            DAI_THROWE(RUNTIME_ERROR,"Not enough factor values");
+        if( ordered )
+            // the values are already in the internal representation
+            _factors.push_back( Factor( Ivs, &(values[offset]) ) );
+        else {
+            // permute indices according to internal representation
+            Factor f( Ivs, (Real)0 );
+            Permute permindex( Ivars );
+            for( size_t li = 0; li < N; li++ )
+                f.set( permindex.convertLinearIndex( li ), values[offset + li] );
+            _factors.push_back( f );
+        }
+        offset += N;
+        nrEdges += Ivars.size();
+    }
+    if( offset != values.size() )
+        DAI_THROWE(RUNTIME_ERROR,"Too many factor values");
+
+    // create graph structure
+    constructGraph( nrEdges );
+}
+
+
 void FactorGraph::constructGraph( size_t nrEdges ) {
     // create a mapping for indices
     hash_map<size_t, size_t> hashmap;
@@ -228,14 +305,316 @@ void FactorGraph::makeCavity( size_t i, bool backup ) {
 }
 
 
+/// Provides read-only access to the contents of a file
+/** On POSIX systems, the file is memory-mapped; otherwise, it is read into memory.
+ */
+class MappedFile {
+    private:
+        /// Contents of the file
+        const char *_data;
+        /// Size of the file (in bytes)
+        size_t _size;
+#ifdef WINDOWS
+        /// Buffer containing the contents of the file
+        std::vector<boost::uint64_t> _buffer;
+#endif
+
+        /// Copying is not allowed
+        MappedFile( const MappedFile& );
+        /// Assignment is not allowed
+        MappedFile& operator=( const MappedFile& );
+
+    public:
+        /// Opens the file \a filename
+        /** \throw CANNOT_READ_FILE if the file cannot be opened
+         */
+        MappedFile( const char *filename ) : _data(NULL), _size(0) {
+#ifdef WINDOWS
+            ifstream infile( filename, ios::in | ios::binary );
+            if( !infile.is_open() )
+                DAI_THROWE(CANNOT_READ_FILE,"Cannot read from file " + std::string(filename));
+            infile.seekg( 0, ios::end );
+            _size = infile.tellg();
+            infile.seekg( 0, ios::beg );
+            // use 64-bit words in order to align the data
+            _buffer.resize( (_size + 7) / 8 );
+            if( _size )
+                infile.read( reinterpret_cast<char *>( &(_buffer[0]) ), _size );
+            if( infile.fail() )
+                DAI_THROWE(CANNOT_READ_FILE,"Cannot read from file " + std::string(filename));
+            _data = _size ? reinterpret_cast<const char *>( &(_buffer[0]) ) : NULL;
+#else
+            int fd = open( filename, O_RDONLY );
+            if( fd < 0 )
+                DAI_THROWE(CANNOT_READ_FILE,"Cannot read from file " + std::string(filename));
+            struct stat st;
+            if( fstat( fd, &st ) != 0 ) {
+                close( fd );
+                DAI_THROWE(CANNOT_READ_FILE,"Cannot read from file " + std::string(filename));
+            }
+            _size = st.st_size;
+            if( _size ) {
+                void *map = mmap( NULL, _size, PROT_READ, MAP_PRIVATE, fd, 0 );
+                if( map == MAP_FAILED ) {
+                    close( fd );
+                    DAI_THROWE(CANNOT_READ_FILE,"Cannot map file " + std::string(filename));
+                }
+                _data = static_cast<const char *>( map );
+            }
+            close( fd );
+#endif
+        }
+
+        /// Destructor
+        ~MappedFile() {
+#ifndef WINDOWS
+            if( _data )
+                munmap( const_cast<char *>( _data ), _size );
+#endif
+        }
+
+        /// Returns the contents of the file
+        const char *data() const { return _data; }
+
+        /// Returns the size of the file (in bytes)
+        size_t size() const { return _size; }
+};
+
+
+/// Parses a factor graph in the .fg file format from a buffer in memory
+/** This is a faster alternative to operator>>( std::istream&, FactorGraph& ): numbers are parsed
+ *  directly from the buffer, without the overhead of input streams and locales. Comment lines are
+ *  skipped at the same positions as by operator>>, and for valid input, the resulting factor graph
+ *  is identical. Invalid input that operator>> does not detect (for example, a missing number)
+ *  results in an INVALID_FACTORGRAPH_FILE exception.
+ */
+class FGTextParser {
+    private:
+        /// Current position in the buffer
+        const char *_pos;
+        /// End of the buffer
+        const char *_end;
+
+        /// Returns whether \a c is a white-space character (in the "C" locale)
+        static bool isSpace( char c ) {
+            return c == ' ' || c == '\n' || c == '\t' || c == '\r' || c == '\v' || c == '\f';
+        }
+
+        /// Returns whether \a c is a decimal digit
+        static bool isDigit( char c ) {
+            return c >= '0' && c <= '9';
+        }
+
+        /// Skips comment lines (starting with #) at the current position
+        void skipComments() {
+            while( _pos != _end && *_pos == '#' ) {
+                while( _pos != _end && *_pos != '\n' )
+                    _pos++;
+                if( _pos != _end )
+                    _pos++;
+            }
+        }
+
+        /// Skips comment lines and white space
+        void skipToToken() {
+            skipComments();
+            while( _pos != _end && isSpace( *_pos ) )
+                _pos++;
+        }
+
+        /// Parses a nonnegative integer
+        size_t readSize() {
+            skipToToken();
+            if( _pos != _end && *_pos == '+' )
+                _pos++;
+            if( _pos == _end || !isDigit( *_pos ) )
+                DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Expecting a nonnegative integer");
+            size_t x = 0;
+            for( ; _pos != _end && isDigit( *_pos ); _pos++ ) {
+                size_t d = *_pos - '0';
+                if( x > (std::numeric_limits<size_t>::max() - d) / 10 )
+                    DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Integer too large");
+                x = 10 * x + d;
+            }
+            return x;
+        }
+
+        /// Parses an integer
+        long readLong() {
+            skipToToken();
+            bool negative = false;
+            if( _pos != _end && (*_pos == '+' || *_pos == '-') )
+                negative = (*_pos++ == '-');
+            if( _pos == _end || !isDigit( *_pos ) )
+                DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Expecting an integer");
+            unsigned long x = 0;
+            unsigned long limit = negative ? (unsigned long)std::numeric_limits<long>::max() + 1 : (unsigned long)std::numeric_limits<long>::max();
+            for( ; _pos != _end && isDigit( *_pos ); _pos++ ) {
+                unsigned long d = *_pos - '0';
+                if( x > (limit - d) / 10 )
+                    DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Integer too large");
+                x = 10 * x + d;
+            }
+            return negative ? (long)(0 - x) : (long)x;
+        }
+
+        /// Parses a real number
+        /** Numbers with at most 15 significant digits and a small exponent are converted exactly
+         *  (using a single correctly rounded multiplication or division); other numbers are
+         *  converted by strtod(), as is done by input streams.
+         */
+        Real readReal() {
+            static const double powersOfTen[] = { 1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11,
+                1e12, 1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22 };
+
+            skipToToken();
+            const char *begin = _pos;
+            bool negative = false;
+            if( _pos != _end && (*_pos == '+' || *_pos == '-') )
+                negative = (*_pos++ == '-');
+
+            // mantissa
+            unsigned long long mantissa = 0;
+            size_t nrDigits = 0;
+            size_t nrSignificant = 0;
+            long exponent = 0;
+            for( ; _pos != _end && isDigit( *_pos ); _pos++, nrDigits++ )
+                if( mantissa || *_pos != '0' ) {
+                    if( nrSignificant < 19 )
+                        mantissa = 10 * mantissa + (*_pos - '0');
+                    else
+                        exponent++;
+                    nrSignificant++;
+                }
+            if( _pos != _end && *_pos == '.' ) {
+                for( _pos++; _pos != _end && isDigit( *_pos ); _pos++, nrDigits++ ) {
+                    if( mantissa || *_pos != '0' ) {
+                        if( nrSignificant < 19 ) {
+                            mantissa = 10 * mantissa + (*_pos - '0');
+                            exponent--;
+                        }
+                        nrSignificant++;
+                    } else
+                        exponent--;
+                }
+            }
+            if( nrDigits == 0 )
+                DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Expecting a real number");
+
+            // exponent
+            if( _pos != _end && (*_pos == 'e' || *_pos == 'E') ) {
+                const char *e = _pos + 1;
+                bool expNegative = false;
+                if( e != _end && (*e == '+' || *e == '-') )
+                    expNegative = (*e++ == '-');
+                if( e == _end || !isDigit( *e ) )
+                    DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Expecting a real number");
+                long expValue = 0;
+                for( ; e != _end && isDigit( *e ); e++ )
+                    if( expValue < 100000 )
+                        expValue = 10 * expValue + (*e - '0');
+                exponent += expNegative ? -expValue : expValue;
+                _pos = e;
+            }
+
+            if( nrSignificant <= 15 && exponent >= -22 && exponent <= 22 ) {
+                // fast path: both the mantissa and the power of ten are exactly representable
+                double x = (double)mantissa;
+                if( exponent < 0 )
+                    x /= powersOfTen[-exponent];
+                else
+                    x *= powersOfTen[exponent];
+                return negative ? -x : x;
+            } else {
+                // slow path: let strtod() do the rounding
+                std::string token( begin, _pos );
+                return strtod( token.c_str(), NULL );
+            }
+        }
+
+    public:
+        /// Construct a parser for the buffer [\a begin, \a end)
+        FGTextParser( const char *begin, const char *end ) : _pos(begin), _end(end) {}
+
+        /// Parses the buffer and returns the corresponding factor graph
+        /** \throw INVALID_FACTORGRAPH_FILE if the buffer does not contain a valid factor graph
+         */
+        FactorGraph parse() {
+            size_t nr_Factors;
+            try {
+                nr_Factors = readSize();
+            } catch( Exception &e ) {
+                DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Cannot read number of factors");
+            }
+
+            // the remainder of the line should be empty
+            if( _pos == _end )
+                DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Expecting empty line");
+            if( *_pos++ != '\n' )
+                DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Expecting empty line");
+
+            vector<Factor> facs;
+            facs.reserve( nr_Factors );
+            hash_map<long,size_t> vardims;
+            vector<long> labels;
+            vector<size_t> dims;
+            vector<Var> Ivars;
+            for( size_t I = 0; I < nr_Factors; I++ ) {
+                size_t nr_members = readSize();
+                labels.resize( nr_members );
+                for( size_t mi = 0; mi < nr_members; mi++ )
+                    labels[mi] = readLong();
+                dims.resize( nr_members );
+                for( size_t mi = 0; mi < nr_members; mi++ )
+                    dims[mi] = readSize();
+
+                // add the Factor
+                Ivars.clear();
+                bool ordered = true;
+                for( size_t mi = 0; mi < nr_members; mi++ ) {
+                    hash_map<long,size_t>::iterator vdi = vardims.find( labels[mi] );
+                    if( vdi != vardims.end() ) {
+                        // check whether dimensions are consistent
+                        if( vdi->second != dims[mi] )
+                            DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Variable with label " + boost::lexical_cast<string>(labels[mi]) + " has inconsistent dimensions.");
+                    } else
+                        vardims[labels[mi]] = dims[mi];
+                    Ivars.push_back( Var(labels[mi], dims[mi]) );
+                    if( mi > 0 && !(Ivars[mi-1] < Ivars[mi]) )
+                        ordered = false;
+                }
+                facs.push_back( Factor( VarSet( Ivars.begin(), Ivars.end(), Ivars.size() ), (Real)0 ) );
+                Factor &fac = facs.back();
+                if( fac.vars().size() != nr_members )
+                    DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Factor contains the same variable more than once");
+
+                // calculate permutation object (only needed if the variables are not ordered by label)
+                Permute permindex;
+                if( !ordered )
+                    permindex = Permute( Ivars );
+
+                // read values
+                size_t nr_nonzeros = readSize();
+                for( size_t k = 0; k < nr_nonzeros; k++ ) {
+                    size_t li = readSize();
+                    Real val = readReal();
+                    if( li >= fac.nrStates() )
+                        DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Factor table index out of range");
+
+                    // store value, but permute indices first according to internal representation
+                    fac.set( ordered ? li : permindex.convertLinearIndex( li ), val );
+                }
+            }
+
+            return FactorGraph( facs );
+        }
+};
+
+
 void FactorGraph::ReadFromFile( const char *filename ) {
-    ifstream infile;
-    infile.open( filename );
-    if( infile.is_open() ) {
-        infile >> *this;
-        infile.close();
-    } else
-        DAI_THROWE(CANNOT_READ_FILE,"Cannot read from file " + std::string(filename));
+    MappedFile file( filename );
+    FGTextParser parser( file.data(), file.data() + file.size() );
+    *this = parser.parse();
 }
 
 
@@ -251,6 +630,149 @@ void FactorGraph::WriteToFile( const char *filename, size_t precision ) const {
 }
 
 
+/// Magic string at the start of a binary factor graph file
+static const char binaryFGMagic[8] = { 'l', 'i', 'b', 'D', 'A', 'I', 'f', 'g' };
+/// Version of the binary factor graph file format
+static const boost::uint32_t binaryFGVersion = 1;
+/// Written in the native byte order, in order to detect files written on machines with a different byte order
+static const boost::uint32_t binaryFGByteOrderMark = 0x01020304;
+/// Size of the header of a binary factor graph file (in bytes)
+static const size_t binaryFGHeaderSize = 56;
+
+
+void FactorGraph::ReadFromBinaryFile( const char *filename ) {
+    MappedFile file( filename );
+    const char *data = file.data();
+    size_t size = file.size();
+
+    // read header
+    if( size < binaryFGHeaderSize || memcmp( data, binaryFGMagic, sizeof(binaryFGMagic) ) != 0 )
+        DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Not a binary factor graph file");
+    boost::uint32_t header32[4];
+    memcpy( header32, data + 8, sizeof(header32) );
+    if( header32[1] != binaryFGByteOrderMark )
+        DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Binary factor graph file has a different byte order");
+    if( header32[0] != binaryFGVersion )
+        DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Unsupported binary factor graph file version " + boost::lexical_cast<string>(header32[0]));
+    if( header32[2] != sizeof(Real) )
+        DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Binary factor graph file has factor values of a different type");
+    boost::uint64_t header64[4];
+    memcpy( header64, data + 24, sizeof(header64) );
+    size_t nrVars = header64[0];
+    size_t nrFacs = header64[1];
+    size_t nrScopeVars = header64[2];
+    size_t nrValues = header64[3];
+
+    // check size (the integer arrays consist of 8-byte words, the factor values of sizeof(Real) bytes)
+    size_t nrBytes = size - binaryFGHeaderSize;
+    size_t nrWords = nrBytes / 8;
+    if( nrVars > nrWords || nrFacs >= nrWords || nrScopeVars > nrWords || nrValues > nrBytes / sizeof(Real) || 8 * (2 * nrVars + (nrFacs + 1) + nrScopeVars) + sizeof(Real) * nrValues != nrBytes )
+        DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Binary factor graph file has an invalid size");
+    const boost::uint64_t *labels = reinterpret_cast<const boost::uint64_t *>( data + binaryFGHeaderSize );
+    const boost::uint64_t *states = labels + nrVars;
+    const boost::uint64_t *scopeBegin = states + nrVars;
+    const boost::uint64_t *scopeVars = scopeBegin + nrFacs + 1;
+    const Real *values = reinterpret_cast<const Real *>( scopeVars + nrScopeVars );
+
+    // create variables (which should be ordered by label, as in the other constructors)
+    vector<Var> vars;
+    vars.reserve( nrVars );
+    for( size_t i = 0; i < nrVars; i++ ) {
+        if( i > 0 && labels[i] <= labels[i-1] )
+            DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Variables in binary factor graph file are not ordered by label");
+        vars.push_back( Var( labels[i], states[i] ) );
+    }
+
+    // create factors, copying the values directly from the file
+    if( scopeBegin[0] != 0 || scopeBegin[nrFacs] != nrScopeVars )
+        DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Factor scope offsets do not match the factor scope variables");
+    vector<Factor> facs;
+    facs.reserve( nrFacs );
+    size_t offset = 0;
+    vector<Var> Ivars;
+    for( size_t I = 0; I < nrFacs; I++ ) {
+        if( scopeBegin[I+1] < scopeBegin[I] || scopeBegin[I+1] > nrScopeVars )
+            DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Factor scope offsets should be nondecreasing");
+        Ivars.clear();
+        for( size_t k = scopeBegin[I]; k < scopeBegin[I+1]; k++ ) {
+            if( scopeVars[k] >= nrVars )
+                DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Factor scope refers to a nonexisting variable");
+            if( k > scopeBegin[I] && scopeVars[k] <= scopeVars[k-1] )
+                DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Factor scope variables should be ordered by label");
+            Ivars.push_back( vars[scopeVars[k]] );
+        }
+        VarSet Ivs( Ivars.begin(), Ivars.end(), Ivars.size() );
+        size_t N = BigInt_size_t( Ivs.nrStates() );
+        if( N > nrValues - offset )
+            DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Not enough factor values");
+        facs.push_back( Factor( Ivs, values + offset ) );
+        offset += N;
+    }
+    if( offset != nrValues )
+        DAI_THROWE(INVALID_FACTORGRAPH_FILE,"Too many factor values");
+
+    _vars.swap( vars );
+    _factors.swap( facs );
+    _backup.clear();
+    _reclampBackup.clear();
+    constructGraph( nrScopeVars );
+}
+
+
+void FactorGraph::WriteToBinaryFile( const char *filename ) const {
+    ofstream outfile( filename, ios::out | ios::binary );
+    if( !outfile.is_open() )
+        DAI_THROWE(CANNOT_WRITE_FILE,"Cannot write to file " + std::string(filename));
+
+    // collect factor scopes
+    hash_map<size_t, size_t> varIndex;
+    for( size_t i = 0; i < nrVars(); i++ )
+        varIndex[var(i).label()] = i;
+    vector<boost::uint64_t> scopeBegin;
+    vector<boost::uint64_t> scopeVars;
+    scopeBegin.reserve( nrFactors() + 1 );
+    scopeBegin.push_back( 0 );
+    size_t nrValues = 0;
+    for( size_t I = 0; I < nrFactors(); I++ ) {
+        for( VarSet::const_iterator n = factor(I).vars().begin(); n != factor(I).vars().end(); n++ )
+            scopeVars.push_back( varIndex[n->label()] );
+        scopeBegin.push_back( scopeVars.size() );
+        nrValues += factor(I).nrStates();
+    }
+
+    // write header
+    outfile.write( binaryFGMagic, sizeof(binaryFGMagic) );
+    boost::uint32_t header32[4] = { binaryFGVersion, binaryFGByteOrderMark, sizeof(Real), 0 };
+    outfile.write( reinterpret_cast<const char *>( header32 ), sizeof(header32) );
+    boost::uint64_t header64[4] = { nrVars(), nrFactors(), scopeVars.size(), nrValues };
+    outfile.write( reinterpret_cast<const char *>( header64 ), sizeof(header64) );
+
+    // write variables
+    vector<boost::uint64_t> labels, states;
+    labels.reserve( nrVars() );
+    states.reserve( nrVars() );
+    for( size_t i = 0; i < nrVars(); i++ ) {
+        labels.push_back( var(i).label() );
+        states.push_back( var(i).states() );
+    }
+    if( nrVars() ) {
+        outfile.write( reinterpret_cast<const char *>( &(labels[0]) ), labels.size() * sizeof(boost::uint64_t) );
+        outfile.write( reinterpret_cast<const char *>( &(states[0]) ), states.size() * sizeof(boost::uint64_t) );
+    }
+
+    // write factors
+    outfile.write( reinterpret_cast<const char *>( &(scopeBegin[0]) ), scopeBegin.size() * sizeof(boost::uint64_t) );
+    if( scopeVars.size() )
+        outfile.write( reinterpret_cast<const char *>( &(scopeVars[0]) ), scopeVars.size() * sizeof(boost::uint64_t) );
+    for( size_t I = 0; I < nrFactors(); I++ )
+        if( factor(I).nrStates() )
+            outfile.write( reinterpret_cast<const char *>( &(factor(I).p().p()[0]) ), factor(I).nrStates() * sizeof(Real) );
+
+    if( outfile.fail() )
+        DAI_THROWE(CANNOT_WRITE_FILE,"Cannot write to file " + std::string(filename));
+}
+
+
 void FactorGraph::printDot( std::ostream &os ) const {
     os << "graph FactorGraph {" << endl;
     os << "node[shape=circle,width=0.4,fixedsize=true];" << endl;
@@ -367,6 +889,31 @@ void FactorGraph::clamp( size_t i, size_t x, bool backup ) {
 }
 
 
+void FactorGraph::reclamp( const map<size_t, size_t>& x ) {
+    map<size_t, Factor> orgFacs;
+    orgFacs.swap( _reclampBackup );
+    setFactors( orgFacs );
+
+    map<size_t, Factor> newFacs;
+    for( map<size_t, size_t>::const_iterator ix = x.begin(); ix != x.end(); ix++ ) {
+        DAI_ASSERT( ix->second < var(ix->first).states() );
+        Factor mask( var(ix->first), (Real)0 );
+        mask.set( ix->second, (Real)1 );
+
+        foreach( const Neighbor &I, nbV(ix->first) ) {
+            map<size_t, Factor>::iterator it = newFacs.find( I );
+            if( it == newFacs.end() )
+                newFacs[I] = factor(I) * mask;
+            else
+                it->second *= mask;
+        }
+    }
+    for( map<size_t, Factor>::const_iterator it = newFacs.begin(); it != newFacs.end(); it++ )
+        _reclampBackup[it->first] = factor(it->first);
+    setFactors( newFacs );
+}
+
+
 void FactorGraph::clampVar( size_t i, const vector<size_t> &is, bool backup ) {
     Var n = var(i);
     Factor mask_n( n, (Real)0 );
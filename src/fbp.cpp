@@ -37,11 +37,10 @@ Real FBP::logZ() const {
 
 
 // This code has been copied from bp.cpp, except where comments indicate FBP-specific behaviour
-Prob FBP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) const {
+void FBP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i, Prob &prod, Prob &prod_j ) const {
     Real c_I = Weight(I); // FBP: c_I
 
-    Factor Fprod( factor(I) );
-    Prob &prod = Fprod.p();
+    prod = factor(I).p();
 
     if( props.logdomain ) {
         prod.takeLog();
@@ -54,7 +53,8 @@ Prob FBP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) const
         if( !(without_i && (j == i)) ) {
             // prod_j will be the product of messages coming into j
             // FBP: corresponds to messages n_jI
-            Prob prod_j( var(j).states(), props.logdomain ? 0.0 : 1.0 );
+            prod_j.resize( var(j).states() );
+            prod_j.fill( props.logdomain ? 0.0 : 1.0 );
             foreach( const Neighbor &J, nbV(j) )
                 if( J != I ) { // for all J in nb(j) \ I
                     if( props.logdomain )
@@ -72,10 +72,12 @@ Prob FBP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) const
             // multiply prod with prod_j
             if( !DAI_FBP_FAST ) {
                 // UNOPTIMIZED (SIMPLE TO READ, BUT SLOW) VERSION
+                Factor Fprod( factor(I).vars(), prod );
                 if( props.logdomain )
                     Fprod += Factor( var(j), prod_j );
                 else
                     Fprod *= Factor( var(j), prod_j );
+                prod = Fprod.p();
             } else {
                 // OPTIMIZED VERSION
                 size_t _I = j.dual;
@@ -89,7 +91,6 @@ Prob FBP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) const
                         prod.set( r, prod[r] * prod_j[ind[r]] );
             }
     }
-    return prod;
 }
 
 
@@ -100,9 +101,10 @@ void FBP::calcNewMessage( size_t i, size_t _I ) {
 
     Real c_I = Weight(I); // FBP: c_I
 
-    Factor Fprod( factor(I) );
-    Prob &prod = Fprod.p();
-    prod = calcIncomingMessageProduct( I, true, i );
+    // use the scratch space of factor I, so that no memory is allocated
+    FactorScratch &scratch = _scratch[I];
+    Prob &prod = scratch.prod;
+    calcIncomingMessageProduct( I, true, i, prod, scratch.prod_j );
 
     if( props.logdomain ) {
         prod -= prod.max();
@@ -110,18 +112,20 @@ void FBP::calcNewMessage( size_t i, size_t _I ) {
     }
 
     // Marginalize onto i
-    Prob marg;
+    Prob &marg = scratch.marg;
     if( !DAI_FBP_FAST ) {
         // UNOPTIMIZED (SIMPLE TO READ, BUT SLOW) VERSION
+        Factor Fprod( factor(I).vars(), prod );
         if( props.inference == Properties::InfType::SUMPROD )
             marg = Fprod.marginal( var(i) ).p();
         else
             marg = Fprod.maxMarginal( var(i) ).p();
     } else {
         // OPTIMIZED VERSION
-        marg = Prob( var(i).states(), 0.0 );
+        marg.resize( var(i).states() );
+        marg.fill( 0.0 );
         // ind is the precalculated IndexFor(i,I) i.e. to x_I == k corresponds x_i == ind[k]
-        const ind_t ind = index(i,_I);
+        const ind_t &ind = index(i,_I);
         if( props.inference == Properties::InfType::SUMPROD )
             for( size_t r = 0; r < prod.size(); ++r )
                 marg.set( ind[r], marg[ind[r]] + prod[r] );
@@ -136,10 +140,9 @@ void FBP::calcNewMessage( size_t i, size_t _I ) {
     marg ^= c_I;
 
     // Store result
+    newMessage(i,_I) = marg;
     if( props.logdomain )
-        newMessage(i,_I) = marg.log();
-    else
-        newMessage(i,_I) = marg;
+        newMessage(i,_I).takeLog();
 
     // Update the residual if necessary
     if( props.updates == Properties::UpdateType::SEQMAX )
@@ -11,6 +11,8 @@
 #include <map>
 #include <set>
 #include <algorithm>
+#include <cmath>
+#include <limits>
 #include <dai/gibbs.h>
 #include <dai/util.h>
 #include <dai/properties.h>
@@ -22,6 +24,9 @@ namespace dai {
 using namespace std;
 
 
+const size_t Gibbs::_resync_interval;
+
+
 void Gibbs::setProperties( const PropertySet &opts ) {
     DAI_ASSERT( opts.hasKey("maxiter") );
     props.maxiter = opts.getStringAs<size_t>("maxiter");
@@ -42,6 +47,22 @@ void Gibbs::setProperties( const PropertySet &opts ) {
         props.verbose = opts.getStringAs<size_t>("verbose");
     else
         props.verbose = 0;
+    if( opts.hasKey("updates") )
+        props.updates = opts.getStringAs<Properties::UpdateType>("updates");
+    else
+        props.updates = Properties::UpdateType::SEQ;
+    if( opts.hasKey("blocksize") )
+        props.blocksize = opts.getStringAs<size_t>("blocksize");
+    else
+        props.blocksize = 2;
+    if( opts.hasKey("nrchains") )
+        props.nrchains = opts.getStringAs<size_t>("nrchains");
+    else
+        props.nrchains = 1;
+    if( opts.hasKey("nthreads") )
+        props.nthreads = opts.getStringAs<size_t>("nthreads");
+    else
+        props.nthreads = 1;
 }
 
 
@@ -52,6 +73,10 @@ PropertySet Gibbs::getProperties() const {
     opts.set( "restart", props.restart );
     opts.set( "burnin", props.burnin );
     opts.set( "verbose", props.verbose );
+    opts.set( "updates", props.updates );
+    opts.set( "blocksize", props.blocksize );
+    opts.set( "nrchains", props.nrchains );
+    opts.set( "nthreads", props.nthreads );
     return opts;
 }
 
@@ -63,7 +88,11 @@ string Gibbs::printProperties() const {
     s << "maxtime=" << props.maxtime << ",";
     s << "restart=" << props.restart << ",";
     s << "burnin=" << props.burnin << ",";
-    s << "verbose=" << props.verbose << "]";
+    s << "verbose=" << props.verbose << ",";
+    s << "updates=" << props.updates << ",";
+    s << "blocksize=" << props.blocksize << ",";
+    s << "nrchains=" << props.nrchains << ",";
+    s << "nthreads=" << props.nthreads << "]";
     return s.str();
 }
 
@@ -90,6 +119,18 @@ void Gibbs::construct() {
     _max_state.resize( nrVars(), 0 );
 
     _max_score = logScore( _max_state );
+
+    _var_strides.clear();
+    _var_strides.reserve( nrVars() );
+    for( size_t i = 0; i < nrVars(); i++ ) {
+        _var_strides.push_back( vector<size_t>() );
+        _var_strides[i].reserve( nbV(i).size() );
+        foreach( const Neighbor &I, nbV(i) )
+            _var_strides[i].push_back( getFactorEntryDiff( I, i ) );
+    }
+    calcFactorEntries();
+
+    _rhat.clear();
 }
 
 
@@ -98,11 +139,35 @@ void Gibbs::updateCounts() {
     for( size_t i = 0; i < nrVars(); i++ )
         _var_counts[i][_state[i]]++;
     for( size_t I = 0; I < nrFactors(); I++ )
-        _factor_counts[I][getFactorEntry(I)]++;
-    Real score = logScore( _state );
-    if( score > _max_score ) {
-        _max_state = _state;
-        _max_score = score;
+        _factor_counts[I][_factor_entries[I]]++;
+    // the incrementally tracked score may contain rounding errors, which are bounded because it
+    // is recalculated every _resync_interval iterations; therefore, the score of every state that
+    // comes close to the maximum is recalculated in the same way as logScore()
+    Real scoreTol = _resync_interval * nrVars() * std::numeric_limits<Real>::epsilon() * (1.0 + abs( _max_score ) + abs( _log_score ));
+    if( currentLogScore() > _max_score - scoreTol ) {
+        Real score = 0.0;
+        for( size_t I = 0; I < nrFactors(); I++ )
+            score += dai::log( factor(I)[_factor_entries[I]] );
+        _log_score = score;
+        if( score > _max_score ) {
+            _max_state = _state;
+            _max_score = score;
+        }
+    }
+}
+
+
+void Gibbs::calcFactorEntries() {
+    _factor_entries.resize( nrFactors() );
+    _log_score = 0.0;
+    _nr_zero_entries = 0;
+    for( size_t I = 0; I < nrFactors(); I++ ) {
+        _factor_entries[I] = getFactorEntry( I );
+        Real f = factor(I)[_factor_entries[I]];
+        if( f == 0.0 )
+            _nr_zero_entries++;
+        else
+            _log_score += dai::log( f );
     }
 }
 
@@ -143,8 +208,8 @@ Prob Gibbs::getVarDist( size_t i ) {
     // use Markov blanket of var(i) to calculate distribution
     foreach( const Neighbor &I, nbV(i) ) {
         const Factor &f_I = factor(I);
-        size_t I_skip = getFactorEntryDiff( I, i );
-        size_t I_entry = getFactorEntry(I) - (_state[i] * I_skip);
+        size_t I_skip = _var_strides[i][I.iter];
+        size_t I_entry = _factor_entries[I] - (_state[i] * I_skip);
         for( size_t st_i = 0; st_i < i_states; st_i++ ) {
             i_given_MB.set( st_i, i_given_MB[st_i] * f_I[I_entry] );
             I_entry += I_skip;
@@ -161,14 +226,232 @@ Prob Gibbs::getVarDist( size_t i ) {
 }
 
 
+Real Gibbs::rndUniform() {
+    if( _own_rnd )
+        return _rnd_gen() / 4294967296.0;
+    else
+        return rnd_uniform();
+}
+
+
+size_t Gibbs::drawVar( size_t i, Real u ) {
+    // equivalent to getVarDist(i).draw(), but uses the uniform random number u
+    Prob i_given_MB = getVarDist( i );
+    Real x = u * i_given_MB.sum();
+    Real s = 0.0;
+    size_t st_i;
+    for( st_i = 0; st_i + 1 < i_given_MB.size(); st_i++ ) {
+        s += i_given_MB[st_i];
+        if( s > x )
+            break;
+    }
+    return st_i;
+}
+
+
+void Gibbs::setVarState( size_t i, size_t st_i, Real &logScoreDiff, long &nrZeroEntriesDiff ) {
+    if( st_i != _state[i] ) {
+        // update the factor entries and the score incrementally
+        foreach( const Neighbor &I, nbV(i) ) {
+            const Factor &f_I = factor(I);
+            size_t &I_entry = _factor_entries[I];
+            Real f = f_I[I_entry];
+            if( f == 0.0 )
+                nrZeroEntriesDiff--;
+            else
+                logScoreDiff -= dai::log( f );
+            size_t I_skip = _var_strides[i][I.iter];
+            I_entry = I_entry - _state[i] * I_skip + st_i * I_skip;
+            f = f_I[I_entry];
+            if( f == 0.0 )
+                nrZeroEntriesDiff++;
+            else
+                logScoreDiff += dai::log( f );
+        }
+        _state[i] = st_i;
+    }
+}
+
+
 void Gibbs::resampleVar( size_t i ) {
-    _state[i] = getVarDist(i).draw();
+    Real logScoreDiff = 0.0;
+    long nrZeroEntriesDiff = 0;
+    setVarState( i, drawVar( i, rndUniform() ), logScoreDiff, nrZeroEntriesDiff );
+    _log_score += logScoreDiff;
+    _nr_zero_entries += nrZeroEntriesDiff;
+}
+
+
+void Gibbs::resampleBlock( const vector<size_t> &block ) {
+    size_t nrStates = 1;
+    foreach( size_t j, block )
+        nrStates *= var(j).states();
+
+    // collect the factors that depend on the block
+    vector<size_t> blockFactors;
+    foreach( size_t j, block )
+        foreach( const Neighbor &I, nbV(j) )
+            if( find( blockFactors.begin(), blockFactors.end(), (size_t)I ) == blockFactors.end() )
+                blockFactors.push_back( I );
+
+    // calculate the conditional distribution of the block, given the current state of all other variables;
+    // the joint state of the block is enumerated with the first variable of the block changing fastest
+    Prob block_given_MB( nrStates, 1.0 );
+    vector<size_t> strides( block.size() );
+    vector<size_t> digits( block.size() );
+    foreach( size_t I, blockFactors ) {
+        const Factor &f_I = factor(I);
+        size_t I_entry = _factor_entries[I];
+        for( size_t k = 0; k < block.size(); k++ ) {
+            strides[k] = 0;
+            foreach( const Neighbor &J, nbV(block[k]) )
+                if( J == I ) {
+                    strides[k] = _var_strides[block[k]][J.iter];
+                    break;
+                }
+            I_entry -= _state[block[k]] * strides[k];
+            digits[k] = 0;
+        }
+        for( size_t st = 0; st < nrStates; st++ ) {
+            block_given_MB.set( st, block_given_MB[st] * f_I[I_entry] );
+            for( size_t k = 0; k < block.size(); k++ ) {
+                I_entry += strides[k];
+                if( ++digits[k] < var(block[k]).states() )
+                    break;
+                I_entry -= digits[k] * strides[k];
+                digits[k] = 0;
+            }
+        }
+    }
+    if( block_given_MB.sum() == 0.0 )
+        // If no joint state of the block is allowed, use uniform distribution
+        block_given_MB = Prob( nrStates );
+
+    // draw the joint state of the block and update the current state
+    Real x = rndUniform() * block_given_MB.sum();
+    Real s = 0.0;
+    size_t st;
+    for( st = 0; st + 1 < nrStates; st++ ) {
+        s += block_given_MB[st];
+        if( s > x )
+            break;
+    }
+    Real logScoreDiff = 0.0;
+    long nrZeroEntriesDiff = 0;
+    foreach( size_t j, block ) {
+        setVarState( j, st % var(j).states(), logScoreDiff, nrZeroEntriesDiff );
+        st /= var(j).states();
+    }
+    _log_score += logScoreDiff;
+    _nr_zero_entries += nrZeroEntriesDiff;
+}
+
+
+void Gibbs::sweep() {
+    if( props.updates == Properties::UpdateType::SEQ ) {
+        for( size_t i = 0; i < nrVars(); i++ )
+            resampleVar( i );
+    } else if( props.updates == Properties::UpdateType::CHROMATIC ) {
+        size_t nthreads = nrThreads( props.nthreads );
+        vector<Real> uniforms;
+        vector<Real> logScoreDiffs;
+        vector<long> nrZeroEntriesDiffs;
+        foreach( const vector<size_t> &color, _var_groups ) {
+            // the variables of a color class do not share any factor, hence they can be resampled
+            // in parallel; the random numbers are drawn beforehand, so that the result does not
+            // depend on the number of threads
+            size_t n = color.size();
+            uniforms.resize( n );
+            for( size_t k = 0; k < n; k++ )
+                uniforms[k] = rndUniform();
+            logScoreDiffs.assign( n, 0.0 );
+            nrZeroEntriesDiffs.assign( n, 0 );
+
+            size_t nrWorkers = std::max( std::min( nthreads, n ), (size_t)1 );
+            ThreadExceptions errors( nrWorkers );
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nrWorkers)
+#endif
+            for( long t = 0; t < (long)nrWorkers; t++ ) {
+                try {
+                    size_t begin = (t * n) / nrWorkers;
+                    size_t end = ((t + 1) * n) / nrWorkers;
+                    for( size_t k = begin; k < end; k++ )
+                        setVarState( color[k], drawVar( color[k], uniforms[k] ), logScoreDiffs[k], nrZeroEntriesDiffs[k] );
+                } catch( std::exception &e ) {
+                    errors.set( t, e );
+                }
+            }
+            errors.rethrow();
+
+            for( size_t k = 0; k < n; k++ ) {
+                _log_score += logScoreDiffs[k];
+                _nr_zero_entries += nrZeroEntriesDiffs[k];
+            }
+        }
+    } else {
+        foreach( const vector<size_t> &block, _var_groups )
+            resampleBlock( block );
+    }
+}
+
+
+void Gibbs::calcVarGroups() {
+    _var_groups.clear();
+    if( props.updates == Properties::UpdateType::SEQ )
+        return;
+
+    GraphAL G = MarkovGraph();
+    if( props.updates == Properties::UpdateType::CHROMATIC ) {
+        // greedy coloring, visiting the variables in order of decreasing degree
+        vector<pair<size_t, size_t> > order;
+        order.reserve( nrVars() );
+        for( size_t i = 0; i < nrVars(); i++ )
+            order.push_back( make_pair( nrVars() - G.nb(i).size(), i ) );
+        sort( order.begin(), order.end() );
+        vector<size_t> colors( nrVars(), 0 );
+        vector<size_t> usedBy;
+        size_t nrColors = 0;
+        for( size_t k = 0; k < order.size(); k++ ) {
+            size_t i = order[k].second;
+            // usedBy[c] == i + 1 means that color c is used by a neighbor of i
+            usedBy.resize( nrColors + 1, 0 );
+            foreach( const Neighbor &j, G.nb(i) )
+                if( colors[j] )
+                    usedBy[colors[j] - 1] = i + 1;
+            size_t c = 0;
+            while( usedBy[c] == i + 1 )
+                c++;
+            colors[i] = c + 1;
+            nrColors = std::max( nrColors, c + 1 );
+        }
+        _var_groups.resize( nrColors );
+        for( size_t i = 0; i < nrVars(); i++ )
+            _var_groups[colors[i] - 1].push_back( i );
+    } else {
+        // grow connected blocks of at most props.blocksize variables by breadth-first search
+        DAI_ASSERT( props.blocksize > 0 );
+        vector<bool> assigned( nrVars(), false );
+        for( size_t i = 0; i < nrVars(); i++ )
+            if( !assigned[i] ) {
+                vector<size_t> block( 1, i );
+                assigned[i] = true;
+                for( size_t k = 0; k < block.size() && block.size() < props.blocksize; k++ )
+                    foreach( const Neighbor &j, G.nb(block[k]) )
+                        if( !assigned[j] && block.size() < props.blocksize ) {
+                            block.push_back( j );
+                            assigned[j] = true;
+                        }
+                _var_groups.push_back( block );
+            }
+    }
 }
 
 
 void Gibbs::randomizeState() {
     for( size_t i = 0; i < nrVars(); i++ )
-        _state[i] = rnd( var(i).states() );
+        _state[i] = static_cast<size_t>( rndUniform() * var(i).states() );
+    calcFactorEntries();
 }
 
 
@@ -190,21 +473,25 @@ Real Gibbs::run() {
 
     double tic = toc();
 
-    for( ; _iters < props.maxiter && (toc() - tic) < props.maxtime; _iters++ ) {
-        if( (_iters % props.restart) == 0 )
-            randomizeState();
-        for( size_t i = 0; i < nrVars(); i++ )
-            resampleVar( i );
-        if( (_iters % props.restart) > props.burnin )
-            updateCounts();
-    }
+    // the current state may have been changed through state()
+    calcFactorEntries();
+    calcVarGroups();
+
+    if( props.nrchains > 1 )
+        runChains();
+    else
+        runChain();
 
     if( props.verbose >= 3 ) {
         for( size_t i = 0; i < nrVars(); i++ ) {
             cerr << "Belief for variable " << var(i) << ": " << beliefV(i) << endl;
             cerr << "Counts for variable " << var(i) << ": " << Prob( _var_counts[i] ) << endl;
+            if( props.nrchains > 1 )
+                cerr << "R-hat for variable " << var(i) << ": " << _rhat[i] << endl;
         }
     }
+    if( props.verbose >= 2 && props.nrchains > 1 )
+        cerr << name() << "::run:  maximum R-hat of " << props.nrchains << " chains is " << Rhat() << endl;
 
     if( props.verbose >= 3 )
         cerr << name() << "::run:  ran " << _iters << " passes (" << toc() - tic << " seconds)." << endl;
@@ -216,6 +503,121 @@ Real Gibbs::run() {
 }
 
 
+void Gibbs::runChain() {
+    double tic = toc();
+
+    for( ; _iters < props.maxiter && (toc() - tic) < props.maxtime; _iters++ ) {
+        if( (_iters % props.restart) == 0 )
+            randomizeState();
+        else if( (_iters % _resync_interval) == 0 )
+            calcFactorEntries();
+        sweep();
+        if( (_iters % props.restart) > props.burnin )
+            updateCounts();
+    }
+}
+
+
+void Gibbs::runChains() {
+    size_t nrchains = props.nrchains;
+
+    // each chain starts with empty counts and gets its own random number generator,
+    // seeded from the global one before any chain is started
+    vector<Gibbs> chains( nrchains, *this );
+    for( size_t c = 0; c < nrchains; c++ ) {
+        chains[c].props.nrchains = 1;
+        chains[c].props.nthreads = 1;
+        chains[c].init();
+        chains[c]._iters = _iters;
+        chains[c]._rnd_gen.seed( static_cast<boost::uint32_t>( rnd_uniform() * 4294967296.0 ) );
+        chains[c]._own_rnd = true;
+    }
+
+    size_t nthreads = std::min( nrThreads( props.nthreads ), nrchains );
+    ThreadExceptions errors( nthreads );
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nthreads)
+#endif
+    for( long t = 0; t < (long)nthreads; t++ ) {
+        try {
+            size_t begin = (t * nrchains) / nthreads;
+            size_t end = ((t + 1) * nrchains) / nthreads;
+            for( size_t c = begin; c < end; c++ )
+                chains[c].runChain();
+        } catch( std::exception &e ) {
+            errors.set( t, e );
+        }
+    }
+    errors.rethrow();
+
+    // merge the chains
+    for( size_t c = 0; c < nrchains; c++ ) {
+        const Gibbs &chain = chains[c];
+        _sample_count += chain._sample_count;
+        for( size_t i = 0; i < nrVars(); i++ )
+            for( size_t s = 0; s < _var_counts[i].size(); s++ )
+                _var_counts[i][s] += chain._var_counts[i][s];
+        for( size_t I = 0; I < nrFactors(); I++ )
+            for( size_t s = 0; s < _factor_counts[I].size(); s++ )
+                _factor_counts[I][s] += chain._factor_counts[I][s];
+        if( chain._max_score > _max_score ) {
+            _max_state = chain._max_state;
+            _max_score = chain._max_score;
+        }
+        _iters = std::max( _iters, chain._iters );
+    }
+    _state = chains[0]._state;
+
+    // calculate the potential scale reduction factor of the indicator function of each state
+    // (using the estimates of the between-chain and within-chain variances by Gelman and Rubin)
+    Real n = 0.0;
+    bool enoughSamples = true;
+    for( size_t c = 0; c < nrchains; c++ ) {
+        n += chains[c]._sample_count;
+        if( chains[c]._sample_count < 2 )
+            enoughSamples = false;
+    }
+    n /= nrchains;
+    _rhat.assign( nrVars(), enoughSamples ? 0.0 : INFINITY );
+    if( enoughSamples ) {
+        vector<Real> mean( nrchains );
+        for( size_t i = 0; i < nrVars(); i++ )
+            for( size_t s = 0; s < var(i).states(); s++ ) {
+                Real W = 0.0;
+                Real meanOfMeans = 0.0;
+                for( size_t c = 0; c < nrchains; c++ ) {
+                    Real n_c = chains[c]._sample_count;
+                    mean[c] = chains[c]._var_counts[i][s] / n_c;
+                    W += n_c / (n_c - 1.0) * mean[c] * (1.0 - mean[c]);
+                    meanOfMeans += mean[c];
+                }
+                W /= nrchains;
+                meanOfMeans /= nrchains;
+                Real B_n = 0.0;
+                for( size_t c = 0; c < nrchains; c++ )
+                    B_n += (mean[c] - meanOfMeans) * (mean[c] - meanOfMeans);
+                B_n /= nrchains - 1;
+
+                Real rhat;
+                if( W > 0.0 )
+                    rhat = std::sqrt( ((n - 1.0) / n * W + B_n) / W );
+                else
+                    rhat = (B_n > 0.0) ? INFINITY : 1.0;
+                _rhat[i] = std::max( _rhat[i], rhat );
+            }
+    }
+}
+
+
+Real Gibbs::Rhat() const {
+    DAI_ASSERT( !_rhat.empty() || nrVars() == 0 );
+    Real result = 0.0;
+    for( size_t i = 0; i < _rhat.size(); i++ )
+        result = std::max( result, _rhat[i] );
+    return result;
+}
+
+
 Factor Gibbs::beliefV( size_t i ) const {
     if( _sample_count == 0 )
         return Factor( var(i) );
@@ -8,6 +8,7 @@
 
 #include <iostream>
 #include <stack>
+#include <algorithm>
 #include <dai/jtree.h>
 
 
@@ -37,6 +38,10 @@ void JTree::setProperties( const PropertySet &opts ) {
         props.maxmem = opts.getStringAs<size_t>("maxmem");
     else
         props.maxmem = 0;
+    if( opts.hasKey("cachesize") )
+        props.cachesize = opts.getStringAs<size_t>("cachesize");
+    else
+        props.cachesize = 0;
 }
 
 
@@ -47,6 +52,7 @@ PropertySet JTree::getProperties() const {
     opts.set( "inference", props.inference );
     opts.set( "heuristic", props.heuristic );
     opts.set( "maxmem", props.maxmem );
+    opts.set( "cachesize", props.cachesize );
     return opts;
 }
 
@@ -58,12 +64,13 @@ string JTree::printProperties() const {
     s << "updates=" << props.updates << ",";
     s << "heuristic=" << props.heuristic << ",";
     s << "inference=" << props.inference << ",";
-    s << "maxmem=" << props.maxmem << "]";
+    s << "maxmem=" << props.maxmem << ",";
+    s << "cachesize=" << props.cachesize << "]";
     return s.str();
 }
 
 
-JTree::JTree( const FactorGraph &fg, const PropertySet &opts, bool automatic ) : DAIAlgRG(), _mes(), _logZ(), RTree(), Qa(), Qb(), props() {
+JTree::JTree( const FactorGraph &fg, const PropertySet &opts, bool automatic ) : DAIAlgRG(), _mes(), _logZ(), _var2IRs(), _var2ORs(), _marginalCache(), _evidence(), _parentEdge(), _logZup(), _mesValid(false), _downValid(), _QaValid(), _QbValid(), RTree(), Qa(), Qb(), props() {
     setProperties( opts );
 
     if( automatic ) {
@@ -199,6 +206,35 @@ void JTree::construct( const FactorGraph &fg, const std::vector<VarSet> &cl, boo
     Qb.reserve( nrIRs() );
     for( size_t beta = 0; beta < nrIRs(); beta++ )
         Qb.push_back( Factor( IR(beta), 1.0 ) );
+
+    // Create index from variables to regions
+    _var2IRs.clear();
+    for( size_t beta = 0; beta < nrIRs(); beta++ )
+        foreach( const Var &v, IR(beta) )
+            _var2IRs[v.label()].push_back( beta );
+    _var2ORs.clear();
+    for( size_t alpha = 0; alpha < nrORs(); alpha++ )
+        foreach( const Var &v, OR(alpha).vars() )
+            _var2ORs[v.label()].push_back( alpha );
+
+    _marginalCache.clear();
+
+    // Initialize the data structures used for incremental evidence updates
+    _evidence.clear();
+    _evidence.resize( nrORs() );
+    _parentEdge.clear();
+    _parentEdge.resize( nrORs(), -1 );
+    for( size_t beta = 0; beta < nrIRs(); beta++ )
+        _parentEdge[nbIR(beta)[1].node] = beta;
+    _logZup.clear();
+    _logZup.resize( nrIRs(), 0.0 );
+    _mesValid = false;
+    _downValid.clear();
+    _downValid.resize( nrIRs(), true );
+    _QaValid.clear();
+    _QaValid.resize( nrORs(), true );
+    _QbValid.clear();
+    _QbValid.resize( nrIRs(), true );
 }
 
 
@@ -220,35 +256,54 @@ void JTree::GenerateJT( const FactorGraph &fg, const std::vector<VarSet> &cl ) {
 }
 
 
+size_t JTree::findRegion( const VarSet &vs, bool inner ) const {
+    size_t nrRegions = inner ? nrIRs() : nrORs();
+    if( vs.size() == 0 )
+        return nrRegions ? 0 : -1;
+
+    // only consider the regions that contain the variable of vs that is contained in the fewest regions
+    const hash_map<size_t, vector<size_t> > &index = inner ? _var2IRs : _var2ORs;
+    const vector<size_t> *candidates = NULL;
+    foreach( const Var &v, vs ) {
+        hash_map<size_t, vector<size_t> >::const_iterator it = index.find( v.label() );
+        if( it == index.end() )
+            return -1;
+        if( candidates == NULL || it->second.size() < candidates->size() )
+            candidates = &(it->second);
+    }
+    foreach( size_t r, *candidates )
+        if( (inner ? Qb[r].vars() : Qa[r].vars()) >> vs )
+            return r;
+    return -1;
+}
+
+
 Factor JTree::belief( const VarSet &vs ) const {
-    vector<Factor>::const_iterator beta;
-    for( beta = Qb.begin(); beta != Qb.end(); beta++ )
-        if( beta->vars() >> vs )
-            break;
-    if( beta != Qb.end() ) {
+    size_t beta = findRegion( vs, true );
+    if( beta != (size_t)-1 ) {
+        validateBeliefIR( beta );
         if( props.inference == Properties::InfType::SUMPROD )
-            return( beta->marginal(vs) );
+            return( Qb[beta].marginal(vs) );
         else
-            return( beta->maxMarginal(vs) );
+            return( Qb[beta].maxMarginal(vs) );
     } else {
-        vector<Factor>::const_iterator alpha;
-        for( alpha = Qa.begin(); alpha != Qa.end(); alpha++ )
-            if( alpha->vars() >> vs )
-                break;
-        if( alpha == Qa.end() ) {
+        size_t alpha = findRegion( vs, false );
+        if( alpha == (size_t)-1 ) {
             DAI_THROW(BELIEF_NOT_AVAILABLE);
             return Factor();
         } else {
+            validateBeliefOR( alpha );
             if( props.inference == Properties::InfType::SUMPROD )
-                return( alpha->marginal(vs) );
+                return( Qa[alpha].marginal(vs) );
             else
-                return( alpha->maxMarginal(vs) );
+                return( Qa[alpha].maxMarginal(vs) );
         }
     }
 }
 
 
 vector<Factor> JTree::beliefs() const {
+    validateBeliefs();
     vector<Factor> result;
     for( size_t beta = 0; beta < nrIRs(); beta++ )
         result.push_back( Qb[beta] );
@@ -259,8 +314,15 @@ vector<Factor> JTree::beliefs() const {
 
 
 void JTree::runHUGIN() {
+    _marginalCache.clear();
+
+    _mesValid = false;
+    _downValid.assign( nrIRs(), true );
+    _QaValid.assign( nrORs(), true );
+    _QbValid.assign( nrIRs(), true );
+
     for( size_t alpha = 0; alpha < nrORs(); alpha++ )
-        Qa[alpha] = OR(alpha);
+        Qa[alpha] = potential( alpha );
 
     for( size_t beta = 0; beta < nrIRs(); beta++ )
         Qb[beta].fill( 1.0 );
@@ -305,53 +367,116 @@ void JTree::runHUGIN() {
 }
 
 
+Factor JTree::potential( size_t alpha ) const {
+    Factor pot = OR(alpha);
+    for( map<size_t, size_t>::const_iterator it = _evidence[alpha].begin(); it != _evidence[alpha].end(); it++ )
+        pot *= createFactorDelta( var(it->first), it->second );
+    return pot;
+}
+
+
+Real JTree::calcMessageUp( size_t e ) {
+    // send a message from RTree[e].second to RTree[e].first
+    // or, actually, from the seperator IR(e) to RTree[e].first
+    size_t i = nbIR(e)[1].node; // = RTree[e].second
+    size_t j = nbIR(e)[0].node; // = RTree[e].first
+    size_t _e = nbIR(e)[0].dual;
+
+    Factor msg = potential( i );
+    foreach( const Neighbor &k, nbOR(i) )
+        if( k != e )
+            msg *= message( i, k.iter );
+    if( props.inference == Properties::InfType::SUMPROD )
+        message( j, _e ) = msg.marginal( IR(e), false );
+    else
+        message( j, _e ) = msg.maxMarginal( IR(e), false );
+    return log( message(j,_e).normalize() );
+}
+
+
+void JTree::calcMessageDown( size_t e ) const {
+    size_t i = nbIR(e)[0].node; // = RTree[e].first
+    size_t j = nbIR(e)[1].node; // = RTree[e].second
+    size_t _e = nbIR(e)[1].dual;
+
+    Factor msg = potential( i );
+    foreach( const Neighbor &k, nbOR(i) )
+        if( k != e )
+            msg *= message( i, k.iter );
+    if( props.inference == Properties::InfType::SUMPROD )
+        _mes[j][_e] = msg.marginal( IR(e) );
+    else
+        _mes[j][_e] = msg.maxMarginal( IR(e) );
+    _downValid[e] = true;
+}
+
+
+Factor JTree::calcBeliefOR( size_t alpha ) const {
+    Factor piet = potential( alpha );
+    foreach( const Neighbor &k, nbOR(alpha) )
+        piet *= message( alpha, k.iter );
+    return piet;
+}
+
+
+void JTree::validateBeliefOR( size_t alpha ) const {
+    if( _QaValid[alpha] )
+        return;
+
+    // Collect the outdated messages on the path from the root to alpha
+    vector<size_t> path;
+    for( size_t gamma = alpha; _parentEdge[gamma] != (size_t)-1; gamma = nbIR(_parentEdge[gamma])[0].node )
+        if( !_downValid[_parentEdge[gamma]] )
+            path.push_back( _parentEdge[gamma] );
+    // and recalculate them, starting at the root
+    for( size_t i = path.size(); (i--) != 0; )
+        calcMessageDown( path[i] );
+
+    Qa[alpha] = calcBeliefOR( alpha ).normalized();
+    _QaValid[alpha] = true;
+}
+
+
+void JTree::validateBeliefIR( size_t beta ) const {
+    if( _QbValid[beta] )
+        return;
+
+    size_t alpha = nbIR(beta)[0].node;
+    validateBeliefOR( alpha );
+    if( props.inference == Properties::InfType::SUMPROD )
+        Qb[beta] = Qa[alpha].marginal( IR(beta) );
+    else
+        Qb[beta] = Qa[alpha].maxMarginal( IR(beta) );
+    _QbValid[beta] = true;
+}
+
+
+void JTree::validateBeliefs() const {
+    for( size_t alpha = 0; alpha < nrORs(); alpha++ )
+        validateBeliefOR( alpha );
+    for( size_t beta = 0; beta < nrIRs(); beta++ )
+        validateBeliefIR( beta );
+}
+
+
 void JTree::runShaferShenoy() {
+    _marginalCache.clear();
+
     // First pass
     _logZ = 0.0;
     for( size_t e = nrIRs(); (e--) != 0; ) {
-        // send a message from RTree[e].second to RTree[e].first
-        // or, actually, from the seperator IR(e) to RTree[e].first
-
-        size_t i = nbIR(e)[1].node; // = RTree[e].second
-        size_t j = nbIR(e)[0].node; // = RTree[e].first
-        size_t _e = nbIR(e)[0].dual;
-
-        Factor msg = OR(i);
-        foreach( const Neighbor &k, nbOR(i) )
-            if( k != e )
-                msg *= message( i, k.iter );
-        if( props.inference == Properties::InfType::SUMPROD )
-            message( j, _e ) = msg.marginal( IR(e), false );
-        else
-            message( j, _e ) = msg.maxMarginal( IR(e), false );
-        _logZ += log( message(j,_e).normalize() );
+        _logZup[e] = calcMessageUp( e );
+        _logZ += _logZup[e];
     }
 
     // Second pass
-    for( size_t e = 0; e < nrIRs(); e++ ) {
-        size_t i = nbIR(e)[0].node; // = RTree[e].first
-        size_t j = nbIR(e)[1].node; // = RTree[e].second
-        size_t _e = nbIR(e)[1].dual;
-
-        Factor msg = OR(i);
-        foreach( const Neighbor &k, nbOR(i) )
-            if( k != e )
-                msg *= message( i, k.iter );
-        if( props.inference == Properties::InfType::SUMPROD )
-            message( j, _e ) = msg.marginal( IR(e) );
-        else
-            message( j, _e ) = msg.maxMarginal( IR(e) );
-    }
+    for( size_t e = 0; e < nrIRs(); e++ )
+        calcMessageDown( e );
 
     // Calculate beliefs
     for( size_t alpha = 0; alpha < nrORs(); alpha++ ) {
-        Factor piet = OR(alpha);
-        foreach( const Neighbor &k, nbOR(alpha) )
-            piet *= message( alpha, k.iter );
-        if( nrIRs() == 0 ) {
-            _logZ += log( piet.normalize() );
-            Qa[alpha] = piet;
-        } else if( alpha == nbIR(0)[0].node /*RTree[0].first*/ ) {
+        Factor piet = calcBeliefOR( alpha );
+        if( alpha == root() ) {
             _logZ += log( piet.normalize() );
             Qa[alpha] = piet;
         } else
@@ -365,6 +490,95 @@ void JTree::runShaferShenoy() {
         else
             Qb[beta] = Qa[nbIR(beta)[0].node].maxMarginal( IR(beta) );
     }
+
+    _mesValid = true;
+    _QaValid.assign( nrORs(), true );
+    _QbValid.assign( nrIRs(), true );
+}
+
+
+void JTree::updateEvidence( const std::map<size_t, size_t> &evidence ) {
+    // Assign the changed evidence to the first outer region containing the variable
+    vector<size_t> changed;
+    for( map<size_t, size_t>::const_iterator it = evidence.begin(); it != evidence.end(); it++ ) {
+        DAI_ASSERT( it->first < nrVars() );
+        DAI_ASSERT( it->second == (size_t)-1 || it->second < var(it->first).states() );
+        hash_map<size_t, vector<size_t> >::const_iterator ORs = _var2ORs.find( var(it->first).label() );
+        DAI_ASSERT( ORs != _var2ORs.end() );
+        size_t alpha = ORs->second.front();
+        map<size_t, size_t>::iterator old = _evidence[alpha].find( it->first );
+        if( it->second == (size_t)-1 ) {
+            if( old == _evidence[alpha].end() )
+                continue;
+            _evidence[alpha].erase( old );
+        } else {
+            if( old != _evidence[alpha].end() && old->second == it->second )
+                continue;
+            _evidence[alpha][it->first] = it->second;
+        }
+        changed.push_back( alpha );
+    }
+    sort( changed.begin(), changed.end() );
+    changed.erase( unique( changed.begin(), changed.end() ), changed.end() );
+
+    _marginalCache.clear();
+    if( !_mesValid ) {
+        runShaferShenoy();
+        return;
+    }
+    if( changed.empty() )
+        return;
+
+    // For each outer region, count the changed outer regions in the subtree rooted at it,
+    // and mark the edges on the paths from the changed outer regions to the root
+    vector<size_t> nrChanged( nrORs(), 0 );
+    vector<bool> upDirty( nrIRs(), false );
+    foreach( size_t alpha, changed )
+        for( size_t gamma = alpha; ; gamma = nbIR(_parentEdge[gamma])[0].node ) {
+            nrChanged[gamma]++;
+            if( _parentEdge[gamma] == (size_t)-1 )
+                break;
+            upDirty[_parentEdge[gamma]] = true;
+        }
+
+    // Recalculate the messages towards the root on the marked edges
+    for( size_t e = nrIRs(); (e--) != 0; )
+        if( upDirty[e] )
+            _logZup[e] = calcMessageUp( e );
+
+    // Invalidate the messages away from the root and the beliefs that depend on the changes
+    foreach( size_t alpha, changed )
+        _QaValid[alpha] = false;
+    for( size_t e = 0; e < nrIRs(); e++ ) {
+        size_t parent = nbIR(e)[0].node;
+        size_t child = nbIR(e)[1].node;
+        if( upDirty[e] )
+            _QaValid[parent] = false;
+        if( nrChanged[child] < changed.size() ) {
+            _downValid[e] = false;
+            _QaValid[child] = false;
+        }
+    }
+    for( size_t e = 0; e < nrIRs(); e++ )
+        if( !_QaValid[nbIR(e)[0].node] )
+            _QbValid[e] = false;
+
+    // Recalculate logZ and the belief of the root
+    _logZ = 0.0;
+    for( size_t e = nrIRs(); (e--) != 0; )
+        _logZ += _logZup[e];
+    Factor piet = calcBeliefOR( root() );
+    _logZ += log( piet.normalize() );
+    Qa[root()] = piet;
+    _QaValid[root()] = true;
+}
+
+
+std::map<size_t, size_t> JTree::evidence() const {
+    map<size_t, size_t> result;
+    for( size_t alpha = 0; alpha < nrORs(); alpha++ )
+        result.insert( _evidence[alpha].begin(), _evidence[alpha].end() );
+    return result;
 }
 
 
@@ -460,27 +674,31 @@ size_t JTree::findEfficientTree( const VarSet& vs, RootedTree &Tree, size_t Prev
 
 
 Factor JTree::calcMarginal( const VarSet& vs ) {
-    vector<Factor>::const_iterator beta;
-    for( beta = Qb.begin(); beta != Qb.end(); beta++ )
-        if( beta->vars() >> vs )
-            break;
-    if( beta != Qb.end() ) {
+    size_t beta = findRegion( vs, true );
+    if( beta != (size_t)-1 ) {
+        validateBeliefIR( beta );
         if( props.inference == Properties::InfType::SUMPROD )
-            return( beta->marginal(vs) );
+            return( Qb[beta].marginal(vs) );
         else
-            return( beta->maxMarginal(vs) );
+            return( Qb[beta].maxMarginal(vs) );
     } else {
-        vector<Factor>::const_iterator alpha;
-        for( alpha = Qa.begin(); alpha != Qa.end(); alpha++ )
-            if( alpha->vars() >> vs )
-                break;
-        if( alpha != Qa.end() ) {
+        size_t alpha = findRegion( vs, false );
+        if( alpha != (size_t)-1 ) {
+            validateBeliefOR( alpha );
             if( props.inference == Properties::InfType::SUMPROD )
-                return( alpha->marginal(vs) );
+                return( Qa[alpha].marginal(vs) );
             else
-                return( alpha->maxMarginal(vs) );
+                return( Qa[alpha].maxMarginal(vs) );
         } else {
+            // Look up the marginal in the cache
+            if( props.cachesize ) {
+                const Factor *cached = _marginalCache.find( vs );
+                if( cached )
+                    return *cached;
+            }
+
             // Find subtree to do efficient inference
+            validateBeliefs();
             RootedTree T;
             size_t Tsize = findEfficientTree( vs, T );
 
@@ -514,7 +732,9 @@ Factor JTree::calcMarginal( const VarSet& vs ) {
             for( State s(vsrem); s.valid(); s++ ) {
                 // CollectEvidence
                 Real logZ = 0.0;
-                for( size_t i = Tsize; (i--) != 0; ) {
+                // States of vsrem with probability zero (e.g., because of evidence) do not contribute
+                bool possible = true;
+                for( size_t i = Tsize; possible && (i--) != 0; ) {
                 // Make outer region T[i].first consistent with outer region T[i].second
                 // IR(i) = seperator OR(T[i].first) && OR(T[i].second)
 
@@ -530,18 +750,24 @@ Factor JTree::calcMarginal( const VarSet& vs ) {
                         new_Qb = Qa[T[i].second].marginal( IR( b[i] ), false );
                     else
                         new_Qb = Qa[T[i].second].maxMarginal( IR( b[i] ), false );
-                    logZ += log(new_Qb.normalize());
-                    Qa[T[i].first] *= new_Qb / Qb[b[i]];
-                    Qb[b[i]] = new_Qb;
+                    if( new_Qb.sum() == 0.0 )
+                        possible = false;
+                    else {
+                        logZ += log(new_Qb.normalize());
+                        Qa[T[i].first] *= new_Qb / Qb[b[i]];
+                        Qb[b[i]] = new_Qb;
+                    }
                 }
-                logZ += log(Qa[T[0].first].normalize());
+                if( possible && Qa[T[0].first].sum() != 0.0 ) {
+                    logZ += log(Qa[T[0].first].normalize());
 
-                Factor piet( vsrem, 0.0 );
-                piet.set( s, exp(logZ) );
-                if( props.inference == Properties::InfType::SUMPROD )
-                    Pvs += piet * Qa[T[0].first].marginal( vs / vsrem, false );      // OPTIMIZE ME
-                else
-                    Pvs += piet * Qa[T[0].first].maxMarginal( vs / vsrem, false );      // OPTIMIZE ME
+                    Factor piet( vsrem, 0.0 );
+                    piet.set( s, exp(logZ) );
+                    if( props.inference == Properties::InfType::SUMPROD )
+                        Pvs += piet * Qa[T[0].first].marginal( vs / vsrem, false );      // OPTIMIZE ME
+                    else
+                        Pvs += piet * Qa[T[0].first].maxMarginal( vs / vsrem, false );      // OPTIMIZE ME
+                }
 
                 // Restore clamped beliefs
                 for( map<size_t,Factor>::const_iterator alpha = Qa_old.begin(); alpha != Qa_old.end(); alpha++ )
@@ -550,7 +776,13 @@ Factor JTree::calcMarginal( const VarSet& vs ) {
                     Qb[beta->first] = beta->second;
             }
 
-            return( Pvs.normalized() );
+            Pvs.normalize();
+
+            // Store the marginal in the cache, removing the least recently used one if necessary
+            if( props.cachesize )
+                _marginalCache.insert( Pvs, props.cachesize );
+
+            return( Pvs );
         }
     }
 }
@@ -579,6 +811,7 @@ std::pair<size_t,BigInt> boundTreewidth( const FactorGraph &fg, greedyVariableEl
 
 
 std::vector<size_t> JTree::findMaximum() const {
+    validateBeliefs();
     vector<size_t> maximum( nrVars() );
     vector<bool> visitedVars( nrVars(), false );
     vector<bool> visitedORs( nrORs(), false );
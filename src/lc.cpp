@@ -45,6 +45,10 @@ void LC::setProperties( const PropertySet &opts ) {
         props.damping = opts.getStringAs<Real>("damping");
     else
         props.damping = 0.0;
+    if( opts.hasKey("nthreads") )
+        props.nthreads = opts.getStringAs<size_t>("nthreads");
+    else
+        props.nthreads = 1;
 }
 
 
@@ -59,6 +63,7 @@ PropertySet LC::getProperties() const {
     opts.set( "cavaiopts", props.cavaiopts );
     opts.set( "reinit", props.reinit );
     opts.set( "damping", props.damping );
+    opts.set( "nthreads", props.nthreads );
     return opts;
 }
 
@@ -74,7 +79,8 @@ string LC::printProperties() const {
     s << "cavainame=" << props.cavainame << ",";
     s << "cavaiopts=" << props.cavaiopts << ",";
     s << "reinit=" << props.reinit << ",";
-    s << "damping=" << props.damping << "]";
+    s << "damping=" << props.damping << ",";
+    s << "nthreads=" << props.nthreads << "]";
     return s.str();
 }
 
@@ -122,7 +128,23 @@ Factor LC::belief (const VarSet &ns) const {
 }
 
 
-Real LC::CalcCavityDist (size_t i, const std::string &name, const PropertySet &opts) {
+Real LC::CalcCavityDist( size_t i, const std::string &name, const PropertySet &opts ) {
+    InfAlg *cav = NULL;
+    if( props.cavity != Properties::CavityType::UNIFORM )
+        cav = newInfAlg( name, *this, opts );
+    Real maxdiff;
+    try {
+        maxdiff = CalcCavityDist( i, cav );
+    } catch( ... ) {
+        delete cav;
+        throw;
+    }
+    delete cav;
+    return maxdiff;
+}
+
+
+Real LC::CalcCavityDist( size_t i, InfAlg *cav ) {
     Factor Bi;
     Real maxdiff = 0;
 
@@ -132,7 +154,10 @@ Real LC::CalcCavityDist (size_t i, const std::string &name, const PropertySet &o
     if( props.cavity == Properties::CavityType::UNIFORM )
         Bi = Factor(delta(i));
     else {
-        InfAlg *cav = newInfAlg( name, *this, opts );
+        // remember the factors that are replaced by makeCavity(), in order to restore them afterwards
+        map<size_t, Factor> facs;
+        foreach( const Neighbor &I, nbV(i) )
+            facs[I] = cav->fg().factor(I);
         cav->makeCavity( i );
 
         if( props.cavity == Properties::CavityType::FULL )
@@ -147,7 +172,7 @@ Real LC::CalcCavityDist (size_t i, const std::string &name, const PropertySet &o
                 Bi *= pairbeliefs[ij];
         }
         maxdiff = cav->maxDiff();
-        delete cav;
+        cav->fg().setFactors( facs );
     }
     Bi.normalize();
     _cavitydists[i] = Bi;
@@ -171,12 +196,32 @@ Real LC::InitCavityDists( const std::string &name, const PropertySet &opts ) {
             cerr << "Using pairwise(new) " << name << opts << "...";
     }
 
-    Real maxdiff = 0.0;
-    for( size_t i = 0; i < nrVars(); i++ ) {
-        Real md = CalcCavityDist(i, name, opts);
-        if( md > maxdiff )
-            maxdiff = md;
+    // thread t calculates the cavity distributions of variables t, t + nthreads, t + 2 * nthreads, ...
+    // using its own instance of the inference algorithm
+    size_t nthreads = std::max( std::min( nrThreads( props.nthreads ), nrVars() ), (size_t)1 );
+    vector<Real> maxdiffs( nrVars(), 0.0 );
+    ThreadExceptions errors( nthreads );
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nthreads)
+#endif
+    for( long t = 0; t < (long)nthreads; t++ ) {
+        InfAlg *cav = NULL;
+        try {
+            if( props.cavity != Properties::CavityType::UNIFORM )
+                cav = newInfAlg( name, *this, opts );
+            for( size_t i = t; i < nrVars(); i += nthreads )
+                maxdiffs[i] = CalcCavityDist( i, cav );
+        } catch( std::exception &e ) {
+            errors.set( t, e );
+        }
+        delete cav;
     }
+    errors.rethrow();
+
+    Real maxdiff = 0.0;
+    for( size_t i = 0; i < nrVars(); i++ )
+        if( maxdiffs[i] > maxdiff )
+            maxdiff = maxdiffs[i];
 
     if( props.verbose >= 1 ) {
         cerr << this->name() << "::InitCavityDists used " << toc() - tic << " seconds." << endl;
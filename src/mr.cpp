@@ -10,6 +10,8 @@
 #include <ctime>
 #include <cmath>
 #include <cstdlib>
+#include <map>
+#include <algorithm>
 #include <dai/mr.h>
 #include <dai/bp.h>
 #include <dai/jtree.h>
@@ -35,6 +37,10 @@ void MR::setProperties( const PropertySet &opts ) {
         props.verbose = opts.getStringAs<size_t>("verbose");
     else
         props.verbose = 0;
+    if( opts.hasKey("nthreads") )
+        props.nthreads = opts.getStringAs<size_t>("nthreads");
+    else
+        props.nthreads = 1;
 }
 
 
@@ -44,6 +50,7 @@ PropertySet MR::getProperties() const {
     opts.set( "verbose", props.verbose );
     opts.set( "updates", props.updates );
     opts.set( "inits", props.inits );
+    opts.set( "nthreads", props.nthreads );
     return opts;
 }
 
@@ -54,7 +61,8 @@ string MR::printProperties() const {
     s << "tol=" << props.tol << ",";
     s << "verbose=" << props.verbose << ",";
     s << "updates=" << props.updates << ",";
-    s << "inits=" << props.inits << "]";
+    s << "inits=" << props.inits << ",";
+    s << "nthreads=" << props.nthreads << "]";
     return s.str();
 }
 
@@ -270,71 +278,104 @@ void MR::calcMagnetizations() {
 
 
 Real MR::calcCavityCorrelations() {
-    Real md = 0.0;
-    for( size_t i = 0; i < nrVars(); i++ ) {
-        vector<Factor> pairq;
-        if( props.inits == Properties::InitType::EXACT ) {
-            JTree jtcav(*this, PropertySet()("updates", string("HUGIN"))("verbose", (size_t)0) );
-            jtcav.makeCavity( i );
-            pairq = calcPairBeliefs( jtcav, delta(i), false, true );
-        } else if( props.inits == Properties::InitType::CLAMPING ) {
-            BP bpcav(*this, PropertySet()("updates", string("SEQMAX"))("tol", (Real)1.0e-9)("maxiter", (size_t)10000)("verbose", (size_t)0)("logdomain", false));
-            bpcav.makeCavity( i );
-
-            pairq = calcPairBeliefs( bpcav, delta(i), false, true );
-            md = std::max( md, bpcav.maxDiff() );
-        } else if( props.inits == Properties::InitType::RESPPROP ) {
-            BP bpcav(*this, PropertySet()("updates", string("SEQMAX"))("tol", (Real)1.0e-9)("maxiter", (size_t)10000)("verbose", (size_t)0)("logdomain", false));
-            bpcav.makeCavity( i );
-            bpcav.makeCavity( i );
-            bpcav.init();
-            bpcav.run();
-
-            BBP bbp( &bpcav, PropertySet()("verbose",(size_t)0)("tol",(Real)1.0e-9)("maxiter",(size_t)10000)("damping",(Real)0.0)("updates",string("SEQ_MAX")) );
-            foreach( const Neighbor &j, G.nb(i) ) {
-                // Create weights for magnetization of some spin
-                Prob p( 2, 0.0 );
-                p.set( 0, -1.0 );
-                p.set( 1, 1.0 );
-
-                // BBP cost function would be the magnetization of spin j
-                vector<Prob> b1_adj;
-                b1_adj.reserve( nrVars() );
-                for( size_t l = 0; l < nrVars(); l++ )
-                    if( l == j )
-                        b1_adj.push_back( p );
-                    else
-                        b1_adj.push_back( Prob( 2, 0.0 ) );
-                bbp.init_V( b1_adj );
-
-                // run BBP to estimate adjoints
-                bbp.run();
-
-                foreach( const Neighbor &k, G.nb(i) ) {
-                    if( k != j )
-                        cors[i][j.iter][k.iter] = (bbp.adj_psi_V(k)[1] - bbp.adj_psi_V(k)[0]);
-                    else
-                        cors[i][j.iter][k.iter] = 0.0;
-                }
-            }
+    // thread t initializes cors[i] for i = t, t + nthreads, t + 2 * nthreads, ...
+    // using its own instance of the inference algorithm
+    size_t nthreads = std::max( std::min( nrThreads( props.nthreads ), nrVars() ), (size_t)1 );
+    vector<Real> mds( nrVars(), 0.0 );
+    ThreadExceptions errors( nthreads );
+#ifdef _OPENMP
+#pragma omp parallel for schedule(static,1) num_threads(nthreads)
+#endif
+    for( long t = 0; t < (long)nthreads; t++ ) {
+        InfAlg *cav = NULL;
+        try {
+            if( props.inits == Properties::InitType::EXACT )
+                cav = new JTree(*this, PropertySet()("updates", string("HUGIN"))("verbose", (size_t)0) );
+            else if( props.inits == Properties::InitType::CLAMPING )
+                cav = new BP(*this, PropertySet()("updates", string("SEQMAX"))("tol", (Real)1.0e-9)("maxiter", (size_t)10000)("verbose", (size_t)0)("logdomain", false));
+            for( size_t i = t; i < nrVars(); i += nthreads )
+                mds[i] = calcCavityCorrelations( i, cav );
+        } catch( std::exception &e ) {
+            errors.set( t, e );
         }
+        delete cav;
+    }
+    errors.rethrow();
+
+    Real md = 0.0;
+    for( size_t i = 0; i < nrVars(); i++ )
+        md = std::max( md, mds[i] );
+    return md;
+}
+
 
-        if( props.inits != Properties::InitType::RESPPROP ) {
-            for( size_t jk = 0; jk < pairq.size(); jk++ ) {
-                VarSet::const_iterator kit = pairq[jk].vars().begin();
-                size_t j = findVar( *(kit) );
-                size_t k = findVar( *(++kit) );
-                pairq[jk].normalize();
-                Real cor = (pairq[jk][3] - pairq[jk][2] - pairq[jk][1] + pairq[jk][0]) - (pairq[jk][3] + pairq[jk][2] - pairq[jk][1] - pairq[jk][0]) * (pairq[jk][3] - pairq[jk][2] + pairq[jk][1] - pairq[jk][0]);
-
-                size_t _j = G.findNb(i,j);
-                size_t _k = G.findNb(i,k);
-                cors[i][_j][_k] = cor;
-                cors[i][_k][_j] = cor;
+Real MR::calcCavityCorrelations( size_t i, InfAlg *cav ) {
+    Real md = 0.0;
+    vector<Factor> pairq;
+    if( props.inits == Properties::InitType::EXACT || props.inits == Properties::InitType::CLAMPING ) {
+        // remember the factors that are replaced by makeCavity(), in order to restore them afterwards
+        map<size_t, Factor> facs;
+        foreach( const Neighbor &I, nbV(i) )
+            facs[I] = cav->fg().factor(I);
+        cav->makeCavity( i );
+
+        pairq = calcPairBeliefs( *cav, delta(i), false, true );
+        if( props.inits == Properties::InitType::CLAMPING )
+            md = cav->maxDiff();
+        cav->fg().setFactors( facs );
+    } else if( props.inits == Properties::InitType::RESPPROP ) {
+        // a new BP object is used for each cavity, since the order of the BP updates (and therefore
+        // the result) may depend on the updates that have been done previously
+        BP bpcav(*this, PropertySet()("updates", string("SEQMAX"))("tol", (Real)1.0e-9)("maxiter", (size_t)10000)("verbose", (size_t)0)("logdomain", false));
+        bpcav.makeCavity( i );
+        bpcav.makeCavity( i );
+        bpcav.init();
+        bpcav.run();
+
+        BBP bbp( &bpcav, PropertySet()("verbose",(size_t)0)("tol",(Real)1.0e-9)("maxiter",(size_t)10000)("damping",(Real)0.0)("updates",string("SEQ_MAX")) );
+        foreach( const Neighbor &j, G.nb(i) ) {
+            // Create weights for magnetization of some spin
+            Prob p( 2, 0.0 );
+            p.set( 0, -1.0 );
+            p.set( 1, 1.0 );
+
+            // BBP cost function would be the magnetization of spin j
+            vector<Prob> b1_adj;
+            b1_adj.reserve( nrVars() );
+            for( size_t l = 0; l < nrVars(); l++ )
+                if( l == j )
+                    b1_adj.push_back( p );
+                else
+                    b1_adj.push_back( Prob( 2, 0.0 ) );
+            bbp.init_V( b1_adj );
+
+            // run BBP to estimate adjoints
+            bbp.run();
+
+            foreach( const Neighbor &k, G.nb(i) ) {
+                if( k != j )
+                    cors[i][j.iter][k.iter] = (bbp.adj_psi_V(k)[1] - bbp.adj_psi_V(k)[0]);
+                else
+                    cors[i][j.iter][k.iter] = 0.0;
             }
         }
+    }
 
+    if( props.inits != Properties::InitType::RESPPROP ) {
+        for( size_t jk = 0; jk < pairq.size(); jk++ ) {
+            VarSet::const_iterator kit = pairq[jk].vars().begin();
+            size_t j = findVar( *(kit) );
+            size_t k = findVar( *(++kit) );
+            pairq[jk].normalize();
+            Real cor = (pairq[jk][3] - pairq[jk][2] - pairq[jk][1] + pairq[jk][0]) - (pairq[jk][3] + pairq[jk][2] - pairq[jk][1] - pairq[jk][0]) * (pairq[jk][3] - pairq[jk][2] + pairq[jk][1] - pairq[jk][0]);
+
+            size_t _j = G.findNb(i,j);
+            size_t _k = G.findNb(i,k);
+            cors[i][_j][_k] = cor;
+            cors[i][_k][_j] = cor;
+        }
     }
+
     return md;
 }
 
@@ -64,11 +64,10 @@ Real TRWBP::logZ() const {
 
 
 // This code has been copied from bp.cpp, except where comments indicate TRWBP-specific behaviour
-Prob TRWBP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) const {
+void TRWBP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i, Prob &prod, Prob &prod_j ) const {
     Real c_I = Weight(I); // TRWBP: c_I
 
-    Factor Fprod( factor(I) );
-    Prob &prod = Fprod.p();
+    prod = factor(I).p();
     if( props.logdomain ) {
         prod.takeLog();
         prod /= c_I; // TRWBP
@@ -81,7 +80,8 @@ Prob TRWBP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) con
             const Var &v_j = var(j);
             // prod_j will be the product of messages coming into j
             // TRWBP: corresponds to messages n_jI
-            Prob prod_j( v_j.states(), props.logdomain ? 0.0 : 1.0 );
+            prod_j.resize( v_j.states() );
+            prod_j.fill( props.logdomain ? 0.0 : 1.0 );
             foreach( const Neighbor &J, nbV(j) ) {
                 Real c_J = Weight(J);  // TRWBP
                 if( J != I ) { // for all J in nb(j) \ I
@@ -100,10 +100,12 @@ Prob TRWBP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) con
             // multiply prod with prod_j
             if( !DAI_TRWBP_FAST ) {
                 // UNOPTIMIZED (SIMPLE TO READ, BUT SLOW) VERSION
+                Factor Fprod( factor(I).vars(), prod );
                 if( props.logdomain )
                     Fprod += Factor( v_j, prod_j );
                 else
                     Fprod *= Factor( v_j, prod_j );
+                prod = Fprod.p();
             } else {
                 // OPTIMIZED VERSION
                 size_t _I = j.dual;
@@ -117,8 +119,6 @@ Prob TRWBP::calcIncomingMessageProduct( size_t I, bool without_i, size_t i ) con
                         prod.set( r, prod[r] * prod_j[ind[r]] );
             }
         }
-    
-    return prod;
 }
 
 
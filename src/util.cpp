@@ -17,6 +17,12 @@
 #else
     // Assume POSIX compliant system. We need the following for querying the system time
     #include <sys/time.h>
+    // and the following for protecting the global random number generator
+    #include <pthread.h>
+#endif
+
+#ifdef _OPENMP
+    #include <omp.h>
 #endif
 
 
@@ -79,21 +85,74 @@ boost::variate_generator<_rnd_gen_type&, boost::uniform_real<Real> > _uni_rnd(_r
 boost::variate_generator<_rnd_gen_type&, boost::normal_distribution<Real> > _normal_rnd(_rnd_gen, _normal_dist);
 
 
+// The global random number generator may be used by several threads at once (e.g., by
+// clamped inference runs in parallel, or by inference runs in Python threads that released
+// the GIL), hence it is protected by a mutex, also if libDAI is built without OpenMP
+
+#ifdef WINDOWS
+/// Mutex that protects the global random number generator
+class _RndMutex {
+    private:
+        CRITICAL_SECTION _cs;
+    public:
+        _RndMutex() { InitializeCriticalSection( &_cs ); }
+        ~_RndMutex() { DeleteCriticalSection( &_cs ); }
+        void lock() { EnterCriticalSection( &_cs ); }
+        void unlock() { LeaveCriticalSection( &_cs ); }
+};
+#else
+/// Mutex that protects the global random number generator
+class _RndMutex {
+    private:
+        pthread_mutex_t _mutex;
+    public:
+        _RndMutex() { pthread_mutex_init( &_mutex, NULL ); }
+        ~_RndMutex() { pthread_mutex_destroy( &_mutex ); }
+        void lock() { pthread_mutex_lock( &_mutex ); }
+        void unlock() { pthread_mutex_unlock( &_mutex ); }
+};
+#endif
+
+/// Global mutex that protects the global random number generator
+_RndMutex _rnd_mutex;
+
+/// Locks the global random number generator during its lifetime
+class _RndLock {
+    public:
+        _RndLock() { _rnd_mutex.lock(); }
+        ~_RndLock() { _rnd_mutex.unlock(); }
+};
+
+
 void rnd_seed( size_t seed ) {
+    _RndLock lock;
     _rnd_gen.seed( static_cast<unsigned int>(seed) );
     _normal_rnd.distribution().reset(); // needed for clearing the cache used in boost::normal_distribution
 }
 
 Real rnd_uniform() {
+    _RndLock lock;
     return _uni_rnd();
 }
 
 Real rnd_stdnormal() {
+    _RndLock lock;
     return _normal_rnd();
 }
 
 int rnd_int( int min, int max ) {
-    return (int)floor(_uni_rnd() * (max + 1 - min) + min);
+    return (int)floor(rnd_uniform() * (max + 1 - min) + min);
+}
+
+size_t nrThreads( size_t nthreads ) {
+#ifdef _OPENMP
+    if( nthreads == 0 )
+        nthreads = omp_get_num_procs();
+    return nthreads;
+#else
+    (void)nthreads;
+    return 1;
+#endif
 }
 
 std::vector<std::string> tokenizeString( const std::string& s, bool singleDelim, const std::string& delim ) {
@@ -36,11 +36,38 @@
  * TODO check that %newobject is applied where needed (and its relation to return by value)
  */
 
-%module dai
+// threads="1" enables releasing the Python GIL (see "Releasing the GIL" below)
+%module(threads="1") dai
 
 // Include documentation of full function signatures
 %feature("autodoc", "1");
 
+/****************************************
+ * Releasing the GIL
+ ****************************************
+ *
+ * By default the wrappers hold the Python GIL.  The following
+ * long-running functions release it while they run, so that other
+ * Python threads can run in the mean time, e.g., inference with other
+ * InfAlg objects (see also InfAlg.run_async below).  The objects that
+ * are passed to these functions should not be modified by other
+ * threads until they return.  The global random number generator of
+ * libDAI (used by e.g. GIBBS and BP with updates=SEQRND) is protected by
+ * a mutex, so such algorithms can be run concurrently, but the random
+ * numbers that each of them receives then depend on the scheduling of
+ * the threads.
+ *
+ * Exceptions are converted while holding the GIL again, because Swig
+ * reacquires it when unwinding from the native call.
+ */
+%nothread;
+%thread dai::InfAlg::init;
+%thread dai::InfAlg::run;
+%thread dai::FactorGraph::ReadFromFile;
+%thread dai::FactorGraph::ReadFromBinaryFile;
+%thread dai::newInfAlg;
+%thread dai::newInfAlgFromString;
+
 /* Include the following headers for compilation.  (Swig just inserts
  * the following block verbatim into the generated wrapper code, not the
  * API.)
@@ -59,6 +86,7 @@
 #include <dai/properties.h>
 #include <dai/daialg.h>
 #include <dai/alldai.h>
+#include <dai/evidence.h>
 %}
 
 // Evidently Swig doesn't define ssize_t by default so include it here
@@ -558,6 +586,68 @@ static PyObject * daiswig_bigInt_to_pythonLong(const dai::BigInt & bigInt) {
  * Prob
  ****************************************/
 
+%{
+#include <cstring>  // for memcpy
+
+/* Build a NumPy-style array interface (version 3) describing the
+ * contiguous storage of a std::vector<Real>.  The data pointer is
+ * handed out as writable, so NumPy arrays created from it are views
+ * onto the libDAI object rather than copies.  (NumPy keeps a reference
+ * to the object providing the interface, so the view cannot outlive
+ * the storage.  However, the view becomes invalid if the vector is
+ * resized, e.g. by an in-place operation that changes the number of
+ * entries.)  Returns a new reference or NULL if there was an error.
+ */
+static PyObject * daiswig_arrayInterface(std::vector<dai::Real> & values) {
+  // An empty vector has no storage, so hand out a null pointer
+  dai::Real * data = values.empty() ? NULL : &values[0];
+  // The type string must state the byte order explicitly
+  // and the size of dai::Real (which is float if libDAI was built with single precision)
+  const int one = 1;
+  const bool littleEndian = (*(const char *) &one == 1);
+  const bool single = (sizeof(dai::Real) == sizeof(float));
+  return Py_BuildValue("{s:(n),s:s,s:(N,O),s:i}",
+                       "shape", (Py_ssize_t) values.size(),
+                       "typestr", single ? (littleEndian ? "<f4" : ">f4") : (littleEndian ? "<f8" : ">f8"),
+                       "data", PyLong_FromVoidPtr((void *) data), Py_False,
+                       "version", 3);
+}
+
+/* Copy the contents of any object supporting the (new-style) buffer
+ * protocol into a std::vector<Real> with a single memcpy.  The buffer
+ * must be C-contiguous and consist of native floating point numbers of
+ * the same size as dai::Real (i.e. float64, or float32 if libDAI was built
+ * with single precision).  If \a expectedSize is not
+ * negative, the number of entries in the buffer must equal it.
+ */
+static void daiswig_buffer_to_vector(PyObject * buffer, std::vector<dai::Real> & values, Py_ssize_t expectedSize) {
+  Py_buffer view;
+  if (PyObject_GetBuffer(buffer, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) != 0) {
+    PyErr_Clear();
+    throw std::invalid_argument("Expected an object supporting the buffer protocol (e.g. a NumPy array).");
+  }
+  // The format is NULL for unsigned bytes; otherwise allow an optional byte order prefix
+  const char * format = view.format;
+  if (format != NULL && (format[0] == '@' || format[0] == '=' || format[0] == '<'))
+    format++;
+  const bool single = (sizeof(dai::Real) == sizeof(float));
+  if (format == NULL || format[0] != (single ? 'f' : 'd') || format[1] != '\0' || view.itemsize != (Py_ssize_t) sizeof(dai::Real)) {
+    PyBuffer_Release(&view);
+    throw std::invalid_argument(single ? "Expected a buffer of float32 values." : "Expected a buffer of float64 values.");
+  }
+  Py_ssize_t size = view.len / view.itemsize;
+  if (expectedSize >= 0 && size != expectedSize) {
+    PyBuffer_Release(&view);
+    snprintf(daiswig_error_message, DAISWIG_ERROR_MESSAGE_MAX_SIZE, "Buffer has %zd entries, expected %zd.", size, expectedSize);
+    throw std::invalid_argument(std::string(daiswig_error_message));
+  }
+  values.resize(size);
+  if (size > 0)
+    memcpy(&values[0], view.buf, view.len);
+  PyBuffer_Release(&view);
+}
+%}
+
 // Ignore operators Python cannot handle directly
 %ignore dai::TProb::operator[];
 // Ignore mutators (accessors (const versions) are preserved)
@@ -602,6 +692,29 @@ static PyObject * daiswig_bigInt_to_pythonLong(const dai::BigInt & bigInt) {
     $self->set(index, value);
   }
 
+  /* Construct from any contiguous buffer of dai::Real values (e.g. a
+   * float64 NumPy array, or float32 if libDAI was built with single precision)
+   * by copying its contents with a single memcpy.
+   */
+  TProb(PyObject * buffer) {
+    dai::TProb<T> * prob = new dai::TProb<T>();
+    try {
+      daiswig_buffer_to_vector(buffer, prob->p(), -1);
+    } catch (...) {
+      delete prob;
+      throw;
+    }
+    return prob;
+  }
+
+  /* Describe the storage of this TProb to NumPy without copying.  Use
+   * through the __array_interface__ attribute, e.g.
+   * "numpy.asarray(prob)" returns a writable view.
+   */
+  PyObject * _arrayInterface() {
+    return daiswig_arrayInterface($self->p());
+  }
+
   /* Make operator[] available to Python as a convenience.  Define
    * __len__ for idiomatic behavior.
    */
@@ -613,6 +726,8 @@ static PyObject * daiswig_bigInt_to_pythonLong(const dai::BigInt & bigInt) {
         self.set(index, value)
 
     __len__ = size
+
+    __array_interface__ = property(_arrayInterface)
   }
 }
 
@@ -676,6 +791,30 @@ static PyObject * daiswig_bigInt_to_pythonLong(const dai::BigInt & bigInt) {
     $self->set(index, value);
   }
 
+  /* Construct a factor on vars from any contiguous buffer of dai::Real values (as
+   * for TProb).  The buffer must contain exactly vars.nrStates()
+   * entries, in the libDAI linear index order (first variable changes
+   * fastest).
+   */
+  TFactor(const dai::VarSet & vars, PyObject * buffer) {
+    dai::TFactor<T> * factor = new dai::TFactor<T>(vars, (T) 0);
+    try {
+      daiswig_buffer_to_vector(buffer, factor->p().p(), factor->nrStates());
+    } catch (...) {
+      delete factor;
+      throw;
+    }
+    return factor;
+  }
+
+  /* Describe the storage of the factor values to NumPy without copying
+   * (as for TProb).  The view is one-dimensional and follows the libDAI
+   * linear index order.
+   */
+  PyObject * _arrayInterface() {
+    return daiswig_arrayInterface($self->p().p());
+  }
+
   /* Make operator[] available to Python as a convenience.  Define
    * __len__ for idiomatic behavior.
    */
@@ -687,6 +826,8 @@ static PyObject * daiswig_bigInt_to_pythonLong(const dai::BigInt & bigInt) {
         self.set(index, value)
 
     __len__ = nrStates
+
+    __array_interface__ = property(_arrayInterface)
   }
 }
 
@@ -746,9 +887,95 @@ static PyObject * daiswig_bigInt_to_pythonLong(const dai::BigInt & bigInt) {
  */
 %template(VectorFactor) std::vector<dai::Factor>;
 
+%{
+/* Copy the contents of any object supporting the (new-style) buffer
+ * protocol into a std::vector<size_t>.  The buffer must be
+ * C-contiguous and consist of native signed or unsigned integers of 1,
+ * 2, 4 or 8 bytes.  Negative entries are rejected, unless observed is
+ * not NULL; then they are stored as 0 and marked as missing in
+ * *observed, which gets the same size as values.  Unsigned entries
+ * that do not fit in a signed 8-byte integer are always rejected.
+ */
+static void daiswig_buffer_to_indices(PyObject * buffer, std::vector<size_t> & values, const char * name, std::vector<bool> * observed = NULL) {
+  Py_buffer view;
+  if (PyObject_GetBuffer(buffer, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) != 0) {
+    PyErr_Clear();
+    snprintf(daiswig_error_message, DAISWIG_ERROR_MESSAGE_MAX_SIZE, "Expected %s to support the buffer protocol (e.g. a NumPy array).", name);
+    throw std::invalid_argument(std::string(daiswig_error_message));
+  }
+  const char * format = view.format == NULL ? "B" : view.format;
+  if (format[0] == '@' || format[0] == '=' || format[0] == '<')
+    format++;
+  char code = format[1] == '\0' ? format[0] : '\0';
+  bool isSigned = (code == 'b' || code == 'h' || code == 'i' || code == 'l' || code == 'q' || code == 'n');
+  bool isUnsigned = (code == 'B' || code == 'H' || code == 'I' || code == 'L' || code == 'Q' || code == 'N');
+  if (!(isSigned || isUnsigned) || !(view.itemsize == 1 || view.itemsize == 2 || view.itemsize == 4 || view.itemsize == 8)) {
+    PyBuffer_Release(&view);
+    snprintf(daiswig_error_message, DAISWIG_ERROR_MESSAGE_MAX_SIZE, "Expected %s to be a buffer of integers.", name);
+    throw std::invalid_argument(std::string(daiswig_error_message));
+  }
+  Py_ssize_t size = view.len / view.itemsize;
+  values.resize(size);
+  if (observed != NULL)
+    observed->assign(size, true);
+  const char * data = (const char *) view.buf;
+  for (Py_ssize_t i = 0; i < size; i++) {
+    long long value;
+    const char * item = data + i * view.itemsize;
+    switch (view.itemsize) {
+      case 1: value = isSigned ? (long long) *(const signed char *) item : (long long) *(const unsigned char *) item; break;
+      case 2: value = isSigned ? (long long) *(const short *) item : (long long) *(const unsigned short *) item; break;
+      case 4: value = isSigned ? (long long) *(const int *) item : (long long) *(const unsigned int *) item; break;
+      default: value = *(const long long *) item; break;
+    }
+    if (value < 0 && isUnsigned) {
+      // An unsigned 8-byte value of at least 2^63 must not be mistaken for a missing observation
+      PyBuffer_Release(&view);
+      snprintf(daiswig_error_message, DAISWIG_ERROR_MESSAGE_MAX_SIZE, "Expected %s to contain integers smaller than 2^63.", name);
+      throw std::invalid_argument(std::string(daiswig_error_message));
+    } else if (value < 0 && observed != NULL) {
+      (*observed)[i] = false;
+      value = 0;
+    } else if (value < 0) {
+      PyBuffer_Release(&view);
+      snprintf(daiswig_error_message, DAISWIG_ERROR_MESSAGE_MAX_SIZE, "Expected %s to contain nonnegative integers.", name);
+      throw std::invalid_argument(std::string(daiswig_error_message));
+    }
+    values[i] = (size_t) value;
+  }
+  PyBuffer_Release(&view);
+}
+%}
+
+// The flat array constructor is wrapped by FactorGraph.from_arrays below
+%ignore dai::FactorGraph::FactorGraph(const std::vector<size_t> &, const std::vector<size_t> &, const std::vector<size_t> &, const std::vector<size_t> &, const std::vector<dai::Real> &);
+
 // Define class FactorGraph
 %include <dai/factorgraph.h>
 
+%newobject dai::FactorGraph::fromArrays;
+%rename(from_arrays) dai::FactorGraph::fromArrays;
+
+%extend dai::FactorGraph {
+  /* Construct a factor graph from flat (e.g. NumPy) arrays without
+   * creating a Python object per variable or factor.  labels and states
+   * describe the variables; the scope of factor I consists of the
+   * variables with positions indices[indptr[I]:indptr[I+1]] in labels
+   * (as in a CSR sparse matrix); values holds the concatenated factor
+   * values in .fg file order.  See the corresponding C++ constructor.
+   */
+  static dai::FactorGraph * fromArrays(PyObject * labels, PyObject * states, PyObject * indptr, PyObject * indices, PyObject * values) {
+    std::vector<size_t> labelsV, statesV, indptrV, indicesV;
+    std::vector<dai::Real> valuesV;
+    daiswig_buffer_to_indices(labels, labelsV, "labels");
+    daiswig_buffer_to_indices(states, statesV, "states");
+    daiswig_buffer_to_indices(indptr, indptrV, "indptr");
+    daiswig_buffer_to_indices(indices, indicesV, "indices");
+    daiswig_buffer_to_vector(values, valuesV, -1);
+    return new dai::FactorGraph(labelsV, statesV, indptrV, indicesV, valuesV);
+  }
+}
+
 /****************************************
  * Property, PropertySet
  ****************************************/
@@ -805,8 +1032,235 @@ static PyObject * daiswig_bigInt_to_pythonLong(const dai::BigInt & bigInt) {
 // Define functions listInfAlgs, newInfAlg*
 %include <dai/alldai.h>
 
+/****************************************
+ * BP iteration statistics
+ ****************************************
+ *
+ * BP, FBP and TRWBP can record statistics of each iteration of run()
+ * and call a function after each iteration (see BP::IterationStats).
+ * The specific algorithm classes are not part of the API, so this is
+ * exposed through methods of InfAlg, which raise an exception for the
+ * other algorithms.  The statistics of an iteration are passed to
+ * Python as a dictionary with keys 'iter', 'maxdiff', 'updates',
+ * 'time', 'damping' and 'residuals' (a list with the residual
+ * histogram).
+ */
+
+%{
+#include <dai/bp.h>
+
+/* Cast an inference algorithm to BP, or throw an exception if it is not
+ * a BP-type algorithm.
+ */
+static dai::BP * daiswig_infAlg_to_bp(dai::InfAlg * alg) {
+  dai::BP * bp = dynamic_cast<dai::BP *>(alg);
+  if (!bp) {
+    snprintf(daiswig_error_message, DAISWIG_ERROR_MESSAGE_MAX_SIZE, "Iteration statistics are not supported by %s.", alg->name().c_str());
+    throw std::invalid_argument(std::string(daiswig_error_message));
+  }
+  return bp;
+}
+
+/* Convert the statistics of an iteration to a Python dictionary (new
+ * reference, or NULL with a Python exception set).
+ */
+static PyObject * daiswig_iterationStats_to_dict(const dai::BP::IterationStats & stats) {
+  PyObject * residuals = PyList_New(stats.residuals.size());
+  if (!residuals)
+    return NULL;
+  for (size_t k = 0; k < stats.residuals.size(); k++)
+    PyList_SET_ITEM(residuals, k, PyLong_FromSize_t(stats.residuals[k]));
+  // "N" passes the reference to residuals to the dictionary
+  return Py_BuildValue("{s:n,s:d,s:n,s:d,s:d,s:N}", "iter", (Py_ssize_t)stats.iter, "maxdiff", (double)stats.maxDiff, "updates", (Py_ssize_t)stats.nrUpdates, "time", stats.time, "damping", (double)stats.damping, "residuals", residuals);
+}
+
+/* Iteration callback that calls the Python callable data with the
+ * statistics of the iteration.  run() stops if the callable returns a
+ * false value other than None.  An exception raised by the callable
+ * cannot propagate through run(), so it is reported as unraisable and
+ * stops run().  The GIL is acquired, since run() may have released it.
+ */
+static bool daiswig_bp_iterationCallback(const dai::BP & /*bp*/, const dai::BP::IterationStats & stats, void * data) {
+  PyGILState_STATE gilState = PyGILState_Ensure();
+  PyObject * callback = (PyObject *) data;
+  bool proceed = false;
+  PyObject * statsDict = daiswig_iterationStats_to_dict(stats);
+  if (statsDict) {
+    PyObject * result = PyObject_CallFunctionObjArgs(callback, statsDict, NULL);
+    Py_DECREF(statsDict);
+    if (result) {
+      int truth = (result == Py_None) ? 1 : PyObject_IsTrue(result);
+      Py_DECREF(result);
+      proceed = (truth > 0);
+    }
+  }
+  if (PyErr_Occurred())
+    PyErr_WriteUnraisable(callback);
+  PyGILState_Release(gilState);
+  return proceed;
+}
+%}
+
+%extend dai::InfAlg {
+  /* Set whether the statistics of each iteration are recorded. */
+  void setRecordTrace(bool record) {
+    daiswig_infAlg_to_bp($self)->recordTrace = record;
+  }
+
+  /* Return the recorded statistics as a list of dictionaries. */
+  PyObject * getTrace() {
+    const std::vector<dai::BP::IterationStats> & trace = daiswig_infAlg_to_bp($self)->getTrace();
+    PyObject * result = PyList_New(trace.size());
+    if (!result)
+      return NULL;
+    for (size_t t = 0; t < trace.size(); t++) {
+      PyObject * statsDict = daiswig_iterationStats_to_dict(trace[t]);
+      if (!statsDict) {
+        Py_DECREF(result);
+        return NULL;
+      }
+      PyList_SET_ITEM(result, t, statsDict);
+    }
+    return result;
+  }
+
+  /* Clear the recorded statistics. */
+  void clearTrace() {
+    daiswig_infAlg_to_bp($self)->clearTrace();
+  }
 
+  /* Set the Python callable that is called after each iteration (None
+   * removes it).  Only a borrowed reference is stored; the Python
+   * wrapper setIterationCallback keeps the callable alive.
+   */
+  void _setIterationCallback(PyObject * callback) {
+    dai::BP * bp = daiswig_infAlg_to_bp($self);
+    if (callback == Py_None)
+      bp->setIterationCallback(NULL, NULL);
+    else if (PyCallable_Check(callback))
+      bp->setIterationCallback(daiswig_bp_iterationCallback, callback);
+    else
+      throw std::invalid_argument("Iteration callback is not callable.");
+  }
 
+  %pythoncode {
+    def setIterationCallback(self, callback):
+        """Calls callback(stats) after each iteration of run(), where stats
+        is a dictionary as returned by getTrace(); run() stops if it
+        returns False.  None removes the callback."""
+        self._setIterationCallback(callback)
+        self.__dict__['_iterationCallback'] = callback
+
+    def run_async(self, executor=None, loop=None):
+        """Calls run() in a thread of executor (by default a thread pool
+        shared by all InfAlg objects, with one thread per processor) and
+        returns an asyncio future for its result.  The GIL is released
+        while the inference runs, so several InfAlg objects can run
+        concurrently.  loop is the event loop (by default the running
+        one).  Requires Python >= 3.4."""
+        import asyncio
+        if loop is None:
+            if hasattr(asyncio, 'get_running_loop'):
+                loop = asyncio.get_running_loop()
+            else:
+                loop = asyncio.get_event_loop()
+        if executor is None:
+            executor = _asyncExecutor()
+        return loop.run_in_executor(executor, self.run)
+  }
+}
+
+%pythoncode {
+import threading as _threading
+
+_asyncExecutorInstance = None
+_asyncExecutorLock = _threading.Lock()
+
+def _asyncExecutor():
+    """Returns the thread pool used by InfAlg.run_async(), creating it
+    when it is first needed."""
+    global _asyncExecutorInstance
+    with _asyncExecutorLock:
+        if _asyncExecutorInstance is None:
+            import concurrent.futures
+            import multiprocessing
+            _asyncExecutorInstance = concurrent.futures.ThreadPoolExecutor(multiprocessing.cpu_count())
+    return _asyncExecutorInstance
+}
+
+
+
+
+/****************************************
+ * Evidence
+ ****************************************/
+
+// Ignore the functions that use Evidence::Observation (std::map<Var, size_t>), iterators or streams
+%ignore dai::Evidence::Evidence(const std::vector<dai::Evidence::Observation> &);
+%ignore dai::Evidence::addSample;
+%ignore dai::Evidence::sample;
+%ignore dai::Evidence::const_iterator;
+%ignore dai::Evidence::begin;
+%ignore dai::Evidence::end;
+%ignore dai::Evidence::TabFileReader;
+%ignore dai::Evidence::addEvidenceTabFile;
+
+// Define class Evidence
+%include <dai/evidence.h>
+
+%{
+/* Add samples from a two-dimensional (e.g. NumPy) integer array of
+ * shape (nrSamples, len(labels)), where column j contains the states of
+ * the variable of fg with label labels[j].  Negative entries denote
+ * missing observations; unsigned entries of at least 2^63 are rejected.
+ * See Evidence::addSamples().
+ */
+static void daiswig_evidence_addArrays(dai::Evidence & evidence, const dai::FactorGraph & fg, PyObject * labels, PyObject * states) {
+  std::vector<size_t> labelsV, statesV;
+  std::vector<bool> observedV;
+  daiswig_buffer_to_indices(labels, labelsV, "labels");
+  daiswig_buffer_to_indices(states, statesV, "states", &observedV);
+  std::map<size_t, size_t> varIndex;
+  for (size_t i = 0; i < fg.nrVars(); i++)
+    varIndex[fg.var(i).label()] = i;
+  std::vector<dai::Var> vars;
+  vars.reserve(labelsV.size());
+  for (size_t j = 0; j < labelsV.size(); j++) {
+    std::map<size_t, size_t>::const_iterator it = varIndex.find(labelsV[j]);
+    if (it == varIndex.end()) {
+      snprintf(daiswig_error_message, DAISWIG_ERROR_MESSAGE_MAX_SIZE, "Variable with label %zu not found in factor graph.", labelsV[j]);
+      throw std::invalid_argument(std::string(daiswig_error_message));
+    }
+    vars.push_back(fg.var(it->second));
+  }
+  evidence.addSamples(vars, statesV, observedV);
+}
+%}
+
+%newobject dai::Evidence::fromArrays;
+%rename(from_arrays) dai::Evidence::fromArrays;
+%rename(add_arrays) dai::Evidence::addArrays;
+
+%extend dai::Evidence {
+  /* Add samples from a two-dimensional integer array, without creating
+   * a Python object per sample (see daiswig_evidence_addArrays).
+   */
+  void addArrays(const dai::FactorGraph & fg, PyObject * labels, PyObject * states) {
+    daiswig_evidence_addArrays(*$self, fg, labels, states);
+  }
+
+  /* Construct Evidence from a two-dimensional integer array. */
+  static dai::Evidence * fromArrays(const dai::FactorGraph & fg, PyObject * labels, PyObject * states) {
+    dai::Evidence * evidence = new dai::Evidence();
+    try {
+      daiswig_evidence_addArrays(*evidence, fg, labels, states);
+    } catch (...) {
+      delete evidence;
+      throw;
+    }
+    return evidence;
+  }
+}
 
 /****************************************
  * All the previous code to keep until its functionality is replicated.
@@ -10,10 +10,22 @@ Currently requires Python 2.7.
 
 
 import math
+import os
+import tempfile
 import unittest
 
 import dai
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+try:
+    import asyncio
+except ImportError:
+    asyncio = None
+
 
 # TODO search for exceptions in the libdai code and make sure they are tested here
 
@@ -453,6 +465,22 @@ class ProbTest(unittest.TestCase):
     def test_divide(self):
         self.assertEqual(ProbTest.ones, self.prob.divide(dai.Prob(5)).p())
 
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test___array_interface__(self):
+        array = numpy.asarray(self.prob)
+        self.assertEqual((5,), array.shape)
+        self.assertEqual(ProbTest.contents, tuple(array))
+        # The array is a view, not a copy
+        array[3] = 2.45292
+        self.assertAlmostEqual(2.45292, self.prob[3])
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_construction_from_buffer(self):
+        prob = dai.Prob(numpy.arange(4.0))
+        self.assertEqual((0.0, 1.0, 2.0, 3.0), prob.p())
+        with self.assertRaises(ValueError):
+            dai.Prob(numpy.arange(4, dtype=numpy.int32))
+
 
 class FactorTest(unittest.TestCase):
 
@@ -746,6 +774,23 @@ class FactorTest(unittest.TestCase):
         expected = (max00, max10, max01, max11)
         self.assertEqual(expected, actual.p().p())
 
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test___array_interface__(self):
+        array = numpy.asarray(self.factor)
+        self.assertEqual((len(FactorTest.weights),), array.shape)
+        self.assertEqual(FactorTest.weights, tuple(array))
+        # The array is a view, not a copy
+        array[9] = 0.5946797807711529
+        self.assertAlmostEqual(0.5946797807711529, self.factor[9])
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_construction_from_buffer(self):
+        varset = dai.VarSet(FactorTest.variables)
+        factor = dai.Factor(varset, numpy.array(FactorTest.weights))
+        self.assertEqual(FactorTest.weights, factor.p().p())
+        with self.assertRaises(ValueError):
+            dai.Factor(varset, numpy.arange(4.0))
+
 
 class GraphAlTest(unittest.TestCase):
     """Tests GraphAL and accompanying: Neighbor, Neighbors, Edge."""
@@ -833,7 +878,77 @@ class BipartiteGraphTest(unittest.TestCase):
 
 
 class FactorGraphTest(unittest.TestCase):
-    pass
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_from_arrays(self):
+        # Variables 1 and 0; factors on {0, 1} (given as (1, 0)) and {1}
+        labels = numpy.array([1, 0])
+        states = numpy.array([2, 3])
+        indptr = numpy.array([0, 2, 3])
+        indices = numpy.array([0, 1, 0])
+        values = numpy.arange(1.0, 9.0)
+        fg = dai.FactorGraph.from_arrays(labels, states, indptr, indices, values)
+        self.assertEqual(2, fg.nrVars())
+        self.assertEqual(2, fg.nrFactors())
+        self.assertEqual(0, fg.var(0).label())
+        self.assertEqual(3, fg.var(0).states())
+        # Values are given with variable 1 changing fastest
+        self.assertEqual((1.0, 3.0, 5.0, 2.0, 4.0, 6.0), fg.factor(0).p().p())
+        self.assertEqual((7.0, 8.0), fg.factor(1).p().p())
+        with self.assertRaises(ValueError):
+            dai.FactorGraph.from_arrays(labels, states, numpy.array([0, -1, 3]), indices, values)
+
+    def test_binary_file(self):
+        v0 = dai.Var(0, 2)
+        v1 = dai.Var(1, 3)
+        f01 = dai.Factor(dai.VarSet(v0, v1))
+        for s in range(6):
+            f01[s] = s + 0.5
+        f1 = dai.Factor(v1)
+        f1[2] = 0.25
+        facs = dai.VectorFactor()
+        facs.append(f01)
+        facs.append(f1)
+        fg = dai.FactorGraph(facs)
+        handle, filename = tempfile.mkstemp(suffix='.fgb')
+        os.close(handle)
+        try:
+            fg.WriteToBinaryFile(filename)
+            fg2 = dai.FactorGraph()
+            fg2.ReadFromBinaryFile(filename)
+        finally:
+            os.remove(filename)
+        self.assertEqual(2, fg2.nrVars())
+        self.assertEqual(2, fg2.nrFactors())
+        self.assertEqual(3, fg2.var(1).states())
+        self.assertEqual(fg.factor(0).p().p(), fg2.factor(0).p().p())
+        self.assertEqual(fg.factor(1).p().p(), fg2.factor(1).p().p())
+        with self.assertRaises(Exception):
+            fg2.ReadFromBinaryFile(filename)
+
+
+class EvidenceTest(unittest.TestCase):
+
+    @unittest.skipIf(numpy is None, 'requires NumPy')
+    def test_from_arrays(self):
+        facs = dai.VectorFactor()
+        facs.append(dai.Factor(dai.VarSet(dai.Var(0, 2), dai.Var(1, 3))))
+        fg = dai.FactorGraph(facs)
+        labels = numpy.array([1, 0])
+        states = numpy.array([[2, 1], [-1, 0]])
+        evidence = dai.Evidence.from_arrays(fg, labels, states)
+        self.assertEqual(2, evidence.nrSamples())
+        self.assertEqual(2, evidence.nrVars())
+        self.assertTrue(evidence.observed(0, evidence.findVar(dai.Var(1, 3))))
+        self.assertEqual(2, evidence.state(0, evidence.findVar(dai.Var(1, 3))))
+        self.assertFalse(evidence.observed(1, evidence.findVar(dai.Var(1, 3))))
+        self.assertEqual(1, evidence.nrObserved(1))
+        # Unsigned values of at least 2^63 are not missing observations
+        with self.assertRaises(ValueError):
+            dai.Evidence.from_arrays(fg, labels, numpy.array([[2**63, 1]], dtype=numpy.uint64))
+        with self.assertRaises(ValueError):
+            evidence.add_arrays(fg, labels, numpy.array([[2**64 - 1, 1]], dtype=numpy.uint64))
+        self.assertEqual(2, evidence.nrSamples())
 
 
 class PropertyTest(unittest.TestCase):
@@ -845,7 +960,70 @@ class PropertySetTest(unittest.TestCase):
 
 
 class InfAlgTest(unittest.TestCase):
-    pass
+
+    def setUp(self):
+        v0 = dai.Var(0, 2)
+        v1 = dai.Var(1, 2)
+        v2 = dai.Var(2, 2)
+        facs = dai.VectorFactor()
+        for vs in (dai.VarSet(v0, v1), dai.VarSet(v1, v2), dai.VarSet(v0, v2)):
+            f = dai.Factor(vs)
+            for s in range(4):
+                f[s] = 1.0 + s
+            facs.append(f)
+        self.fg = dai.FactorGraph(facs)
+
+    def test_trace(self):
+        bp = dai.newInfAlgFromString('BP[updates=SEQFIX,tol=1e-9,logdomain=0]', self.fg)
+        bp.init()
+        bp.setRecordTrace(True)
+        bp.run()
+        trace = bp.getTrace()
+        self.assertEqual(bp.Iterations(), len(trace))
+        self.assertEqual(1, trace[0]['iter'])
+        self.assertEqual(6, trace[0]['updates'])
+        self.assertEqual(6, sum(trace[0]['residuals']))
+        self.assertAlmostEqual(bp.maxDiff(), trace[-1]['maxdiff'])
+        bp.clearTrace()
+        self.assertEqual([], bp.getTrace())
+
+    def test_iteration_callback(self):
+        bp = dai.newInfAlgFromString('BP[updates=PARALL,tol=1e-9,logdomain=0]', self.fg)
+        bp.init()
+        iters = []
+        def callback(stats):
+            iters.append(stats['iter'])
+            return stats['iter'] < 2
+        bp.setIterationCallback(callback)
+        bp.run()
+        self.assertEqual([1, 2], iters)
+        self.assertEqual(2, bp.Iterations())
+        bp.setIterationCallback(None)
+        bp.run()
+        self.assertEqual([1, 2], iters)
+
+    @unittest.skipIf(asyncio is None, 'requires asyncio')
+    def test_run_async(self):
+        algs = [dai.newInfAlgFromString('BP[updates=SEQFIX,tol=1e-9,logdomain=0]', self.fg) for k in range(4)]
+        for alg in algs:
+            alg.init()
+        loop = asyncio.new_event_loop()
+        try:
+            futures = [alg.run_async(loop=loop) for alg in algs]
+            results = loop.run_until_complete(asyncio.gather(*futures))
+        finally:
+            loop.close()
+        expected = dai.newInfAlgFromString('BP[updates=SEQFIX,tol=1e-9,logdomain=0]', self.fg)
+        expected.init()
+        expected.run()
+        for alg, result in zip(algs, results):
+            self.assertEqual(alg.maxDiff(), result)
+            self.assertEqual(expected.belief(self.fg.var(0)).p().p(), alg.belief(self.fg.var(0)).p().p())
+
+    def test_trace_unsupported(self):
+        jt = dai.newInfAlgFromString('JTREE[updates=HUGIN]', self.fg)
+        with self.assertRaises(Exception):
+            jt.setRecordTrace(True)
 
 
 class DaiAlgTest(unittest.TestCase):
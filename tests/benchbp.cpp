@@ -0,0 +1,83 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <iostream>
+#include <iomanip>
+#include <cstdlib>
+#include <dai/alldai.h>
+
+
+using namespace dai;
+using namespace std;
+
+
+/// Creates an N x N grid of binary variables with random Ising interactions
+FactorGraph createGrid( size_t N ) {
+    vector<Var> vars;
+    vars.reserve( N * N );
+    for( size_t i = 0; i < N * N; i++ )
+        vars.push_back( Var( i, 2 ) );
+
+    vector<Factor> factors;
+    factors.reserve( 3 * N * N );
+    for( size_t x = 0; x < N; x++ )
+        for( size_t y = 0; y < N; y++ ) {
+            size_t i = x * N + y;
+            factors.push_back( createFactorIsing( vars[i], 0.5 * rnd_stdnormal() ) );
+            if( x + 1 < N )
+                factors.push_back( createFactorIsing( vars[i], vars[i + N], 0.5 * rnd_stdnormal() ) );
+            if( y + 1 < N )
+                factors.push_back( createFactorIsing( vars[i], vars[i + 1], 0.5 * rnd_stdnormal() ) );
+        }
+
+    return FactorGraph( factors );
+}
+
+
+int main( int argc, char *argv[] ) {
+    if ( argc < 2 ) {
+        cout << "Usage: " << argv[0] << " <filename.fg>|grid<N> [...]" << endl << endl;
+        cout << "Measures the time per pass of BP (sum-product, linear domain)" << endl;
+        cout << "for the PARALL, SEQFIX and SEQMAX update schedules on each factor" << endl;
+        cout << "graph, which is either read from <filename.fg> or is an N x N grid" << endl;
+        cout << "of binary variables with random Ising interactions." << endl << endl;
+        return 1;
+    }
+
+    size_t passes = 100;
+    const char *schedules[] = { "PARALL", "SEQFIX", "SEQMAX" };
+
+    for( int arg = 1; arg < argc; arg++ ) {
+        string spec( argv[arg] );
+        FactorGraph fg;
+        if( spec.substr( 0, 4 ) == "grid" ) {
+            rnd_seed( 1 );
+            fg = createGrid( fromString<size_t>( spec.substr( 4 ) ) );
+        } else
+            fg.ReadFromFile( spec.c_str() );
+        cout << spec << ": " << fg.nrVars() << " variables, " << fg.nrFactors() << " factors, " << fg.nrEdges() << " edges" << endl;
+
+        for( size_t s = 0; s < 3; s++ ) {
+            PropertySet opts;
+            opts.set( "tol", (Real)0.0 );
+            opts.set( "maxiter", passes );
+            opts.set( "logdomain", false );
+            opts.set( "updates", string( schedules[s] ) );
+
+            BP bp( fg, opts );
+            bp.init();
+            double tic = toc();
+            bp.run();
+            double seconds = toc() - tic;
+            size_t iters = std::max( bp.Iterations(), (size_t)1 );
+            cout << "  " << setw(6) << left << schedules[s] << "  " << right << setw(10) << fixed << setprecision(3) << 1000.0 * seconds / iters << " ms/pass  (" << iters << " passes)" << endl;
+        }
+    }
+
+    return 0;
+}
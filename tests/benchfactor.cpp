@@ -0,0 +1,157 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <iostream>
+#include <iomanip>
+#include <string>
+#include <dai/alldai.h>
+
+
+using namespace dai;
+using namespace std;
+
+
+/// Calculates the marginal of \a f on \a vars by looping over the entries of \a f with an IndexFor
+Factor marginalIndexFor( const Factor &f, const VarSet &vars ) {
+    VarSet res_vars = vars & f.vars();
+    Factor res( res_vars, 0.0 );
+    IndexFor i_res( res_vars, f.vars() );
+    for( size_t i = 0; i < f.nrStates(); i++, ++i_res )
+        res.set( i_res, res[i_res] + f[i] );
+    return res;
+}
+
+
+/// Calculates the max-marginal of \a f on \a vars by looping over the entries of \a f with an IndexFor
+Factor maxMarginalIndexFor( const Factor &f, const VarSet &vars ) {
+    VarSet res_vars = vars & f.vars();
+    Factor res( res_vars, 0.0 );
+    IndexFor i_res( res_vars, f.vars() );
+    for( size_t i = 0; i < f.nrStates(); i++, ++i_res )
+        if( f[i] > res[i_res] )
+            res.set( i_res, f[i] );
+    return res;
+}
+
+
+/// Calculates the product of \a f and \a g by looping over the joint states with two IndexFor objects
+Factor productIndexFor( const Factor &f, const Factor &g ) {
+    VarSet vars = f.vars() | g.vars();
+    size_t N = BigInt_size_t( vars.nrStates() );
+    vector<Real> p;
+    p.reserve( N );
+    IndexFor i_f( f.vars(), vars );
+    IndexFor i_g( g.vars(), vars );
+    for( size_t i = 0; i < N; i++, ++i_f, ++i_g )
+        p.push_back( f[i_f] * g[i_g] );
+    return Factor( vars, p );
+}
+
+
+/// Returns the average time (in ms) of \a repeats calls of \a op, and stores the last result in \a result
+template<typename Op> double timeOp( Op op, size_t repeats, Factor &result ) {
+    double tic = toc();
+    for( size_t r = 0; r < repeats; r++ )
+        result = op();
+    return 1000.0 * (toc() - tic) / repeats;
+}
+
+
+/// Function objects for the operations that are compared
+struct Marginal {
+    const Factor &f; const VarSet &vs;
+    Marginal( const Factor &_f, const VarSet &_vs ) : f(_f), vs(_vs) {}
+    Factor operator()() const { return f.marginal( vs, false ); }
+};
+struct MarginalIndexFor {
+    const Factor &f; const VarSet &vs;
+    MarginalIndexFor( const Factor &_f, const VarSet &_vs ) : f(_f), vs(_vs) {}
+    Factor operator()() const { return marginalIndexFor( f, vs ); }
+};
+struct MaxMarginal {
+    const Factor &f; const VarSet &vs;
+    MaxMarginal( const Factor &_f, const VarSet &_vs ) : f(_f), vs(_vs) {}
+    Factor operator()() const { return f.maxMarginal( vs, false ); }
+};
+struct MaxMarginalIndexFor {
+    const Factor &f; const VarSet &vs;
+    MaxMarginalIndexFor( const Factor &_f, const VarSet &_vs ) : f(_f), vs(_vs) {}
+    Factor operator()() const { return maxMarginalIndexFor( f, vs ); }
+};
+struct Product {
+    const Factor &f; const Factor &g;
+    Product( const Factor &_f, const Factor &_g ) : f(_f), g(_g) {}
+    Factor operator()() const { return f * g; }
+};
+struct ProductIndexFor {
+    const Factor &f; const Factor &g;
+    ProductIndexFor( const Factor &_f, const Factor &_g ) : f(_f), g(_g) {}
+    Factor operator()() const { return productIndexFor( f, g ); }
+};
+
+
+/// Prints a line with the timings of the blocked and the IndexFor implementation of an operation
+template<typename Op, typename OpRef> void compare( const string &name, Op op, OpRef opRef, size_t repeats ) {
+    Factor result, resultRef;
+    double ms = timeOp( op, repeats, result );
+    double msRef = timeOp( opRef, repeats, resultRef );
+    bool same = (result.vars() == resultRef.vars()) && (result.p() == resultRef.p());
+    cout << "    " << setw(22) << left << name << right << setw(12) << fixed << setprecision(4) << ms << " ms" << setw(12) << msRef << " ms" << setw(8) << setprecision(2) << msRef / ms << "x";
+    cout << (same ? "" : "  (DIFFERENT RESULT)") << endl;
+}
+
+
+int main( int argc, char *argv[] ) {
+    if( argc > 2 || (argc == 2 && string( argv[1] ) == "-h") ) {
+        cout << "Usage: " << argv[0] << " [maxvars]" << endl << endl;
+        cout << "Measures the time needed by Factor::marginal(), Factor::maxMarginal() and" << endl;
+        cout << "Factor::operator*() for factors of 4, 6, ..., maxvars (default 20) binary variables," << endl;
+        cout << "and compares it with a straightforward implementation that uses IndexFor." << endl;
+        cout << "The variables that are kept (or the variables of the second factor) are the" << endl;
+        cout << "first half (low), the last half (high) or every other variable (strided);" << endl;
+        cout << "\"product disjoint\" multiplies factors on the first and the last half." << endl << endl;
+        return 1;
+    }
+    size_t maxVars = (argc == 2) ? fromString<size_t>( argv[1] ) : 20;
+
+    rnd_seed( 1 );
+    cout << "    " << setw(22) << left << "operation" << right << setw(15) << "blocks" << setw(15) << "IndexFor" << setw(9) << "speedup" << endl;
+    for( size_t N = 4; N <= maxVars; N += 2 ) {
+        vector<Var> vars;
+        for( size_t i = 0; i < N; i++ )
+            vars.push_back( Var( i, 2 ) );
+        VarSet all( vars.begin(), vars.end() );
+        VarSet low( vars.begin(), vars.begin() + N / 2 );
+        VarSet high = all / low;
+        VarSet strided;
+        for( size_t i = 0; i < N; i += 2 )
+            strided |= vars[i];
+
+        Factor f( all );
+        f.randomize();
+        Factor gLow( low ), gHigh( high ), gStrided( strided );
+        gLow.randomize();
+        gHigh.randomize();
+        gStrided.randomize();
+
+        size_t repeats = std::max( (size_t)1, ((size_t)1 << 22) >> N );
+        cout << N << " variables (" << f.nrStates() << " states, " << repeats << " repeats):" << endl;
+        compare( "marginal low", Marginal( f, low ), MarginalIndexFor( f, low ), repeats );
+        compare( "marginal high", Marginal( f, high ), MarginalIndexFor( f, high ), repeats );
+        compare( "marginal strided", Marginal( f, strided ), MarginalIndexFor( f, strided ), repeats );
+        compare( "maxMarginal low", MaxMarginal( f, low ), MaxMarginalIndexFor( f, low ), repeats );
+        compare( "maxMarginal high", MaxMarginal( f, high ), MaxMarginalIndexFor( f, high ), repeats );
+        compare( "maxMarginal strided", MaxMarginal( f, strided ), MaxMarginalIndexFor( f, strided ), repeats );
+        compare( "product disjoint", Product( gLow, gHigh ), ProductIndexFor( gLow, gHigh ), repeats );
+        compare( "product low", Product( f, gLow ), ProductIndexFor( f, gLow ), repeats );
+        compare( "product high", Product( f, gHigh ), ProductIndexFor( f, gHigh ), repeats );
+        compare( "product strided", Product( f, gStrided ), ProductIndexFor( f, gStrided ), repeats );
+    }
+
+    return 0;
+}
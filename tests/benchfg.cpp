@@ -0,0 +1,107 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <iostream>
+#include <iomanip>
+#include <fstream>
+#include <cstdio>
+#include <dai/alldai.h>
+
+
+using namespace dai;
+using namespace std;
+
+
+/// Creates an N x N grid of binary variables with random Ising interactions
+FactorGraph createGrid( size_t N ) {
+    vector<Var> vars;
+    vars.reserve( N * N );
+    for( size_t i = 0; i < N * N; i++ )
+        vars.push_back( Var( i, 2 ) );
+
+    vector<Factor> factors;
+    factors.reserve( 3 * N * N );
+    for( size_t x = 0; x < N; x++ )
+        for( size_t y = 0; y < N; y++ ) {
+            size_t i = x * N + y;
+            factors.push_back( createFactorIsing( vars[i], 0.5 * rnd_stdnormal() ) );
+            if( x + 1 < N )
+                factors.push_back( createFactorIsing( vars[i], vars[i + N], 0.5 * rnd_stdnormal() ) );
+            if( y + 1 < N )
+                factors.push_back( createFactorIsing( vars[i], vars[i + 1], 0.5 * rnd_stdnormal() ) );
+        }
+
+    return FactorGraph( factors );
+}
+
+
+/// Returns whether two factor graphs are identical
+bool identical( const FactorGraph &fg1, const FactorGraph &fg2 ) {
+    if( !(fg1.vars() == fg2.vars()) || !(fg1.bipGraph() == fg2.bipGraph()) )
+        return false;
+    for( size_t I = 0; I < fg1.nrFactors(); I++ )
+        if( !(fg1.factor(I).vars() == fg2.factor(I).vars()) || !(fg1.factor(I).p() == fg2.factor(I).p()) )
+            return false;
+    return true;
+}
+
+
+int main( int argc, char *argv[] ) {
+    if ( argc < 2 ) {
+        cout << "Usage: " << argv[0] << " <filename.fg>|grid<N> [...]" << endl << endl;
+        cout << "Measures the time needed to read each factor graph, which is either" << endl;
+        cout << "read from <filename.fg> or is an N x N grid of binary variables with" << endl;
+        cout << "random Ising interactions (written to a temporary file), using" << endl;
+        cout << "operator>>, FactorGraph::ReadFromFile() and FactorGraph::ReadFromBinaryFile()." << endl << endl;
+        return 1;
+    }
+
+    size_t repeats = 5;
+
+    for( int arg = 1; arg < argc; arg++ ) {
+        string spec( argv[arg] );
+        string filename = spec;
+        bool temporary = false;
+        if( spec.substr( 0, 4 ) == "grid" ) {
+            rnd_seed( 1 );
+            filename = "benchfg_" + spec + ".fg";
+            createGrid( fromString<size_t>( spec.substr( 4 ) ) ).WriteToFile( filename.c_str() );
+            temporary = true;
+        }
+        string binaryFilename = "benchfg_tmp.fgb";
+
+        FactorGraph fg;
+        fg.ReadFromFile( filename.c_str() );
+        fg.WriteToBinaryFile( binaryFilename.c_str() );
+        cout << spec << ": " << fg.nrVars() << " variables, " << fg.nrFactors() << " factors, " << fg.nrEdges() << " edges" << endl;
+
+        const char *methods[] = { "operator>>", "ReadFromFile", "ReadFromBinaryFile" };
+        for( size_t m = 0; m < 3; m++ ) {
+            FactorGraph fg2;
+            double tic = toc();
+            for( size_t r = 0; r < repeats; r++ ) {
+                if( m == 0 ) {
+                    ifstream is( filename.c_str() );
+                    is >> fg2;
+                } else if( m == 1 )
+                    fg2.ReadFromFile( filename.c_str() );
+                else
+                    fg2.ReadFromBinaryFile( binaryFilename.c_str() );
+            }
+            double seconds = toc() - tic;
+            cout << "  " << setw(18) << left << methods[m] << "  " << right << setw(10) << fixed << setprecision(3) << 1000.0 * seconds / repeats << " ms";
+            cout << (identical( fg, fg2 ) ? "" : "  (DIFFERENT RESULT)") << endl;
+        }
+
+        remove( binaryFilename.c_str() );
+        if( temporary )
+            remove( filename.c_str() );
+    }
+
+    return 0;
+}
@@ -22,13 +22,13 @@ using namespace dai;
 void usage( const string &msg ) {
     cerr << msg << endl;
     cerr << "Usage:" << endl;
-    cerr << " testem factorgraph.fg evidence.tab emconfig.em" << endl;
+    cerr << " testem factorgraph.fg evidence.tab emconfig.em [nthreads [dedup_samples]]" << endl;
     exit( 1 );
 }
 
 
 int main( int argc, char** argv ) {
-    if( argc != 4 )
+    if( argc < 4 || argc > 6 )
         usage("Incorrect number of arguments.");
 
     FactorGraph fg;
@@ -45,11 +45,15 @@ int main( int argc, char** argv ) {
     e.addEvidenceTabFile( estream, fg );
 
     cout << "Number of samples: " << e.nrSamples() << endl;
-    for( Evidence::iterator ps = e.begin(); ps != e.end(); ps++ )
-        cout << "Sample #" << (ps - e.begin()) << " has " << ps->size() << " observations." << endl;
+    for( size_t s = 0; s < e.nrSamples(); s++ )
+        cout << "Sample #" << s << " has " << e.nrObserved( s ) << " observations." << endl;
 
     ifstream emstream( argv[3] );
     EMAlg em(e, *inf, emstream);
+    if( argc >= 5 )
+        em.setTermConditions( PropertySet()( EMAlg::NTHREADS_KEY, string(argv[4]) ) );
+    if( argc >= 6 )
+        em.setTermConditions( PropertySet()( EMAlg::DEDUP_SAMPLES_KEY, string(argv[5]) ) );
 
     while( !em.hasSatisfiedTermConditions() ) {
         Real l = em.iterate();
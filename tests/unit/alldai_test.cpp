@@ -7,6 +7,7 @@
 
 
 #include <dai/alldai.h>
+#include "testutil.h"
 #include <strstream>
 #include <fstream>
 
@@ -14,9 +15,6 @@
 using namespace dai;
 
 
-const double tol = 1e-8;
-
-
 #define BOOST_TEST_MODULE DAIAlgTest
 
 
@@ -0,0 +1,135 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <dai/alldai.h>
+#include "testutil.h"
+#include <vector>
+
+
+using namespace dai;
+
+
+#define BOOST_TEST_MODULE BPTest
+
+
+#include <boost/test/unit_test.hpp>
+
+
+// Callback that counts the iterations and stops run() after the third one
+bool stopAfterThree( const BP &/*bp*/, const BP::IterationStats &stats, void *data ) {
+    size_t *count = static_cast<size_t *>( data );
+    (*count)++;
+    return stats.iter < 3;
+}
+
+
+BOOST_AUTO_TEST_CASE( ThreadsTest ) {
+    FactorGraph fg = createIsingGrid( 5, false, 0.5, 0.5 );
+    for( size_t logdomain = 0; logdomain < 2; logdomain++ ) {
+        PropertySet opts = PropertySet()("updates",std::string("PARALL"))("tol",(Real)1e-9)("maxiter",(size_t)10000)("logdomain",(bool)logdomain)("verbose",(size_t)0);
+        BP bp1( fg, opts("nthreads",(size_t)1) );
+        bp1.init();
+        bp1.run();
+        BP bp2( fg, opts("nthreads",(size_t)2) );
+        BOOST_CHECK_EQUAL( bp2.props.nthreads, 2 );
+        bp2.init();
+        bp2.run();
+        BOOST_CHECK_EQUAL( bp2.Iterations(), bp1.Iterations() );
+        BOOST_CHECK_CLOSE( bp2.maxDiff(), bp1.maxDiff(), tol );
+        for( size_t i = 0; i < fg.nrVars(); i++ )
+            BOOST_CHECK_SMALL( dist( bp2.beliefV(i), bp1.beliefV(i), DISTLINF ), tol );
+        for( size_t I = 0; I < fg.nrFactors(); I++ )
+            BOOST_CHECK_SMALL( dist( bp2.beliefF(I), bp1.beliefF(I), DISTLINF ), tol );
+        BOOST_CHECK_CLOSE( bp2.logZ(), bp1.logZ(), tol );
+    }
+}
+
+
+BOOST_AUTO_TEST_CASE( TraceTest ) {
+    FactorGraph fg = createIsingGrid( 3, false, 0.5, 0.5 );
+    BP bp( fg, PropertySet()("updates",std::string("SEQFIX"))("tol",(Real)1e-6)("maxiter",(size_t)100)("logdomain",false)("verbose",(size_t)0) );
+    bp.recordTrace = true;
+    bp.init();
+    Real maxDiff = bp.run();
+
+    const std::vector<BP::IterationStats> &trace = bp.getTrace();
+    BOOST_CHECK_EQUAL( trace.size(), bp.Iterations() );
+    BOOST_CHECK( bp.Iterations() < 100 );
+    for( size_t t = 0; t < trace.size(); t++ ) {
+        BOOST_CHECK_EQUAL( trace[t].iter, t + 1 );
+        BOOST_CHECK( trace[t].maxDiff >= 0.0 );
+        BOOST_CHECK( trace[t].maxDiff <= 1.0 );
+        BOOST_CHECK_EQUAL( trace[t].nrUpdates, fg.nrEdges() );
+        BOOST_CHECK_EQUAL( trace[t].residuals.size(), BP::nrResidualBins );
+        size_t nrResiduals = 0;
+        for( size_t k = 0; k < trace[t].residuals.size(); k++ )
+            nrResiduals += trace[t].residuals[k];
+        BOOST_CHECK_EQUAL( nrResiduals, trace[t].nrUpdates );
+        BOOST_CHECK_EQUAL( trace[t].damping, (Real)0.0 );
+        if( t > 0 )
+            BOOST_CHECK( trace[t].time >= trace[t-1].time );
+    }
+    BOOST_CHECK_EQUAL( trace.back().maxDiff, maxDiff );
+    BOOST_CHECK( trace.back().maxDiff <= 1e-6 );
+    BOOST_CHECK( trace.back().maxDiff < trace.front().maxDiff );
+
+    bp.clearTrace();
+    BOOST_CHECK( bp.getTrace().empty() );
+}
+
+
+BOOST_AUTO_TEST_CASE( IterationCallbackTest ) {
+    FactorGraph fg = createIsingGrid( 3, false, 0.5, 0.5 );
+    BP bp( fg, PropertySet()("updates",std::string("PARALL"))("tol",(Real)1e-9)("maxiter",(size_t)100)("logdomain",false)("verbose",(size_t)0) );
+    bp.init();
+    size_t count = 0;
+    bp.setIterationCallback( stopAfterThree, &count );
+    Real maxDiff = bp.run();
+    BOOST_CHECK_EQUAL( count, 3 );
+    BOOST_CHECK_EQUAL( bp.Iterations(), 3 );
+    BOOST_CHECK( maxDiff > 1e-9 );
+    BOOST_CHECK( bp.getTrace().empty() );
+
+    // without callback, run() continues until convergence
+    bp.setIterationCallback( NULL );
+    bp.run();
+    BOOST_CHECK_EQUAL( count, 3 );
+    BOOST_CHECK( bp.Iterations() > 3 );
+}
+
+
+BOOST_AUTO_TEST_CASE( AdaptiveDampingTest ) {
+    // parallel updates on a strongly coupled grid oscillate without damping
+    FactorGraph fg = createIsingGrid( 4, false, 4.0, 0.5 );
+    PropertySet opts = PropertySet()("updates",std::string("PARALL"))("tol",(Real)1e-9)("maxiter",(size_t)100)("logdomain",false)("verbose",(size_t)0);
+
+    BP plain( fg, opts );
+    plain.recordTrace = true;
+    plain.init();
+    plain.run();
+    BOOST_CHECK_EQUAL( plain.Iterations(), 100 );
+    foreach( const BP::IterationStats &stats, plain.getTrace() )
+        BOOST_CHECK_EQUAL( stats.damping, (Real)0.0 );
+
+    BP adaptive( fg, opts("adaptivedamping",true)("maxdamping",(Real)0.9) );
+    BOOST_CHECK( adaptive.props.adaptivedamping );
+    adaptive.recordTrace = true;
+    adaptive.init();
+    adaptive.run();
+    const std::vector<BP::IterationStats> &trace = adaptive.getTrace();
+    BOOST_CHECK_EQUAL( trace.front().damping, (Real)0.0 );
+    for( size_t t = 1; t < trace.size(); t++ ) {
+        BOOST_CHECK( trace[t].damping >= trace[t-1].damping );
+        BOOST_CHECK( trace[t].damping <= 0.9 );
+        // the damping is only increased after the maximum difference has increased
+        if( trace[t].damping > trace[t-1].damping )
+            BOOST_CHECK( t >= 2 && trace[t-1].maxDiff > trace[t-2].maxDiff );
+    }
+    BOOST_CHECK( trace.back().damping > 0.0 );
+    BOOST_CHECK( adaptive.maxDiff() < plain.maxDiff() );
+}
@@ -0,0 +1,58 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <dai/alldai.h>
+#include "testutil.h"
+#include <string>
+#include <vector>
+
+
+using namespace dai;
+
+
+#define BOOST_TEST_MODULE CBPTest
+
+
+#include <boost/test/unit_test.hpp>
+
+
+// Runs CBP with properties \a opts and number of threads \a nthreads
+CBP runCBP( const FactorGraph &fg, const std::string &opts, size_t nthreads ) {
+    PropertySet props( opts );
+    props.set( "nthreads", nthreads );
+    CBP cbp( fg, props );
+    cbp.init();
+    cbp.run();
+    return cbp;
+}
+
+
+BOOST_AUTO_TEST_CASE( ThreadInvarianceTest ) {
+    FactorGraph fg = createIsingGrid( 3, true, 1.0, 0.5 );
+    std::string common = "verbose=0,tol=1e-9,maxiter=500,rec_tol=1e-9,max_levels=3,min_max_adj=1e-9,recursion=REC_FIXED,clamp=CLAMP_VAR,bbp_cfn=CFN_FACTOR_ENT,bbp_props=[tol=1e-9,maxiter=10000,damping=0,updates=SEQ_BP_REV],par_levels=4";
+    std::vector<std::string> settings;
+    settings.push_back( "[" + common + ",updates=SEQFIX,choose=CHOOSE_MAXENT,rand_seed=0]" );
+    settings.push_back( "[" + common + ",updates=SEQMAX,choose=CHOOSE_BP_L1,rand_seed=0]" );
+    settings.push_back( "[" + common + ",updates=SEQFIX,choose=CHOOSE_BBP,rand_seed=0]" );
+    // the following settings consume random numbers
+    settings.push_back( "[" + common + ",updates=SEQRND,choose=CHOOSE_MAXENT,rand_seed=7]" );
+    settings.push_back( "[" + common + ",updates=SEQFIX,choose=CHOOSE_RANDOM,rand_seed=7]" );
+
+    for( size_t k = 0; k < settings.size(); k++ ) {
+        CBP cbp1 = runCBP( fg, settings[k], 1 );
+        for( size_t nthreads = 2; nthreads <= 4; nthreads += 2 )
+            for( size_t rep = 0; rep < 2; rep++ ) {
+                CBP cbpN = runCBP( fg, settings[k], nthreads );
+                BOOST_CHECK_EQUAL( cbp1.logZ(), cbpN.logZ() );
+                for( size_t i = 0; i < fg.nrVars(); i++ )
+                    BOOST_CHECK_EQUAL( cbp1.beliefV(i), cbpN.beliefV(i) );
+                for( size_t I = 0; I < fg.nrFactors(); I++ )
+                    BOOST_CHECK_EQUAL( cbp1.beliefF(I), cbpN.beliefF(I) );
+            }
+    }
+}
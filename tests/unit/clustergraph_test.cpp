@@ -7,6 +7,7 @@
 
 
 #include <dai/clustergraph.h>
+#include <dai/util.h>
 #include <vector>
 #include <strstream>
 
@@ -517,6 +518,67 @@ BOOST_AUTO_TEST_CASE( VarElimTest ) {
 }
 
 
+size_t eliminationCost_ReverseIndex( const ClusterGraph& cl, size_t i ) {
+    return cl.nrVars() - i;
+}
+
+
+BOOST_AUTO_TEST_CASE( IncrementalVarElimTest ) {
+    rnd_seed( 1 );
+    std::vector<Var> vars;
+    for( size_t i = 0; i < 60; i++ )
+        vars.push_back( Var( i, 2 + rnd( 3 ) ) );
+    greedyVariableElimination::eliminationCostFunction costs[] = { eliminationCost_MinNeighbors, eliminationCost_MinWeight, eliminationCost_MinFill, eliminationCost_WeightedMinFill };
+    for( size_t rep = 0; rep < 10; rep++ ) {
+        // random cluster graph, containing duplicate clusters and a cluster that is contained in another one
+        std::vector<Factor> factors;
+        for( size_t I = 0; I < 50; I++ ) {
+            VarSet cl( vars[rnd( vars.size() )] );
+            size_t size = rnd( 4 );
+            for( size_t k = 0; k < size; k++ )
+                cl |= vars[rnd( vars.size() )];
+            factors.push_back( Factor( cl ) );
+        }
+        factors.push_back( factors[0] );
+        factors.push_back( Factor( factors[1].vars().front() ) );
+        FactorGraph fg( factors );
+        ClusterGraph G( fg, false );
+
+        // the generic and the incremental implementation should yield the same result
+        for( size_t h = 0; h < 4; h++ ) {
+            ClusterGraph result = G.VarElim<greedyVariableElimination>( greedyVariableElimination( costs[h] ) );
+            ClusterGraph incremental = G.VarElim( greedyVariableElimination( costs[h] ) );
+            BOOST_CHECK_EQUAL( incremental.vars(), result.vars() );
+            BOOST_CHECK_EQUAL( incremental.clusters(), result.clusters() );
+            BOOST_CHECK( incremental.bipGraph() == result.bipGraph() );
+            BOOST_CHECK_EQUAL( incremental.eraseNonMaximal().clusters(), result.eraseNonMaximal().clusters() );
+            BigInt maxStates = 0;
+            foreach( const VarSet &cl, result.clusters() )
+                maxStates += cl.nrStates();
+            BOOST_CHECK_THROW( G.VarElim( greedyVariableElimination( costs[h] ), BigInt_size_t( maxStates ) / 2 ), Exception );
+        }
+
+        // for other cost functions, the generic implementation is used
+        std::vector<Var> seq( G.vars().rbegin(), G.vars().rend() );
+        BOOST_CHECK_EQUAL( G.VarElim( greedyVariableElimination( eliminationCost_ReverseIndex ) ).clusters(), G.VarElim( sequentialVariableElimination( seq ) ).clusters() );
+
+        // eraseNonMaximal should keep the last one of identical clusters
+        std::vector<VarSet> maximal;
+        for( size_t I = 0; I < G.nrClusters(); I++ ) {
+            bool isMaximal = true;
+            for( size_t J = 0; J < G.nrClusters(); J++ )
+                if( J != I && (G.cluster(I) << G.cluster(J)) && (J > I || G.cluster(I) != G.cluster(J)) )
+                    isMaximal = false;
+            if( isMaximal )
+                maximal.push_back( G.cluster(I) );
+        }
+        BOOST_CHECK_EQUAL( G.eraseNonMaximal().clusters(), maximal );
+        BOOST_CHECK_EQUAL( G.nrClusters(), G.bipGraph().nrNodes2() );
+        G.bipGraph().checkConsistency();
+    }
+}
+
+
 BOOST_AUTO_TEST_CASE( IOTest ) {
     Var v0( 0, 2 );
     Var v1( 1, 3 );
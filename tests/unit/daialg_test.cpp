@@ -8,15 +8,13 @@
 
 #include <dai/daialg.h>
 #include <dai/alldai.h>
+#include "testutil.h"
 #include <strstream>
 
 
 using namespace dai;
 
 
-const double tol = 1e-8;
-
-
 #define BOOST_TEST_MODULE DAIAlgTest
 
 
@@ -65,6 +63,20 @@ BOOST_AUTO_TEST_CASE( calcMarginalTest ) {
     vs = v02 | v3;  BOOST_CHECK( dist( calcMarginal( ei, vs, false ), joint.marginal( vs ), DISTTV ) < tol );
     vs = v12 | v3;  BOOST_CHECK( dist( calcMarginal( ei, vs, false ), joint.marginal( vs ), DISTTV ) < tol );
     vs = v01 | v23; BOOST_CHECK( dist( calcMarginal( ei, vs, false ), joint.marginal( vs ), DISTTV ) < tol );
+
+    // multiple threads
+    vs = v01 | v23; BOOST_CHECK( dist( calcMarginal( ei, vs, false, 3 ), joint.marginal( vs ), DISTTV ) < tol );
+    vs = v01 | v23; BOOST_CHECK( dist( calcMarginal( ei, vs, true, 0 ), joint.marginal( vs ), DISTTV ) < tol );
+    vs = v0;        BOOST_CHECK( dist( calcMarginal( ei, vs, false, 4 ), joint.marginal( vs ), DISTTV ) < tol );
+
+    // clampings made before calling calcMarginal are kept
+    ExactInf eicl( fg, PropertySet()("verbose",(size_t)0) );
+    eicl.clamp( 0, 1, true );
+    eicl.init();
+    eicl.run();
+    Factor jointcl = joint * createFactorDelta( v0, 1 );
+    vs = v2;        BOOST_CHECK( dist( calcMarginal( eicl, vs, false ), jointcl.marginal( vs ), DISTTV ) < tol );
+    vs = v12 | v3;  BOOST_CHECK( dist( calcMarginal( eicl, vs, true, 3 ), jointcl.marginal( vs ), DISTTV ) < tol );
 }
 
 
@@ -110,4 +122,15 @@ BOOST_AUTO_TEST_CASE( calcPairBeliefsTest ) {
     BOOST_CHECK( dist( pb[3], joint.marginal( v12 ), DISTTV ) < tol );
     BOOST_CHECK( dist( pb[4], joint.marginal( v13 ), DISTTV ) < tol );
     BOOST_CHECK( dist( pb[5], joint.marginal( v23 ), DISTTV ) < tol );
+
+    // multiple threads
+    for( size_t accurate = 0; accurate < 2; accurate++ ) {
+        pb = calcPairBeliefs( ei, v01 | v23, false, accurate, 3 );
+        BOOST_CHECK( dist( pb[0], joint.marginal( v01 ), DISTTV ) < tol );
+        BOOST_CHECK( dist( pb[1], joint.marginal( v02 ), DISTTV ) < tol );
+        BOOST_CHECK( dist( pb[2], joint.marginal( v03 ), DISTTV ) < tol );
+        BOOST_CHECK( dist( pb[3], joint.marginal( v12 ), DISTTV ) < tol );
+        BOOST_CHECK( dist( pb[4], joint.marginal( v13 ), DISTTV ) < tol );
+        BOOST_CHECK( dist( pb[5], joint.marginal( v23 ), DISTTV ) < tol );
+    }
 }
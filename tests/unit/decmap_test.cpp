@@ -0,0 +1,163 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <dai/alldai.h>
+#include "testutil.h"
+#include <map>
+#include <vector>
+
+
+using namespace dai;
+
+
+#define BOOST_TEST_MODULE DecMAPTest
+
+
+#include <boost/test/unit_test.hpp>
+
+
+// Decimation as done by DecMAP before the batchsize property was added: in each round,
+// the variables with zero entropy and the single free factor with lowest entropy are clamped
+std::vector<size_t> decimateOneFactorPerRound( const FactorGraph &fg, const std::string &ianame, const PropertySet &iaopts, bool reinit ) {
+    std::vector<size_t> state( fg.nrVars(), 0 );
+    SmallSet<size_t> freeVars;
+    for( size_t i = 0; i < fg.nrVars(); i++ )
+        freeVars |= i;
+
+    InfAlg *clamped = newInfAlg( ianame, fg, iaopts );
+    while( freeVars.size() ) {
+        clamped->run();
+
+        VarSet varsToInit;
+        SmallSet<size_t> varsToClamp;
+        for( SmallSet<size_t>::const_iterator it = freeVars.begin(); it != freeVars.end(); ) {
+            if( clamped->beliefV( *it ).entropy() == 0.0 ) {
+                varsToInit |= fg.var( *it );
+                varsToClamp |= *it;
+                state[*it] = clamped->beliefV( *it ).p().argmax().first;
+                freeVars.erase( *it );
+            } else
+                it++;
+        }
+
+        size_t bestI = 0;
+        Real bestEnt = INFINITY;
+        for( size_t I = 0; I < fg.nrFactors(); I++ )
+            if( freeVars.intersects( fg.bipGraph().nb2Set(I) ) ) {
+                Real EntI = clamped->beliefF(I).entropy();
+                if( EntI < bestEnt ) {
+                    bestI = I;
+                    bestEnt = EntI;
+                }
+            }
+
+        std::map<Var, size_t> Istatemap = calcState( fg.factor(bestI).vars(), clamped->beliefF(bestI).p().argmax().first );
+        foreach( size_t i, fg.bipGraph().nb2Set(bestI) & freeVars ) {
+            varsToInit |= fg.var(i);
+            varsToClamp |= i;
+            state[i] = Istatemap[fg.var(i)];
+            freeVars.erase( i );
+        }
+
+        foreach( size_t i, varsToClamp )
+            clamped->clamp( i, state[i], false );
+        if( reinit )
+            clamped->init();
+        else
+            clamped->init( varsToInit );
+    }
+    delete clamped;
+
+    return state;
+}
+
+
+// Checks that the MAP state and beliefs of \a decmap are consistent with each other
+void checkConsistent( const FactorGraph &fg, const DecMAP &decmap ) {
+    std::vector<size_t> state = decmap.findMaximum();
+    BOOST_CHECK_EQUAL( state.size(), fg.nrVars() );
+    std::map<Var, size_t> statemap;
+    for( size_t i = 0; i < fg.nrVars(); i++ ) {
+        BOOST_CHECK( state[i] < fg.var(i).states() );
+        statemap[fg.var(i)] = state[i];
+        BOOST_CHECK_EQUAL( decmap.beliefV(i), createFactorDelta( fg.var(i), state[i] ) );
+    }
+    Real logp = 0.0;
+    for( size_t I = 0; I < fg.nrFactors(); I++ ) {
+        size_t s = calcLinearState( fg.factor(I).vars(), statemap );
+        BOOST_CHECK_EQUAL( decmap.beliefF(I), createFactorDelta( fg.factor(I).vars(), s ) );
+        logp += dai::log( fg.factor(I)[s] );
+    }
+    BOOST_CHECK_CLOSE( decmap.logZ(), logp, 1e-3 );
+}
+
+
+BOOST_AUTO_TEST_CASE( OneFactorPerRoundTest ) {
+    FactorGraph fg = createIsingGrid( 3, false, 1.0, 0.5 );
+    PropertySet iaopts = PropertySet()("inference",std::string("MAXPROD"))("updates",std::string("SEQFIX"))("tol",(Real)1e-9)("maxiter",(size_t)10000)("logdomain",false)("verbose",(size_t)0);
+
+    for( size_t reinit = 0; reinit < 2; reinit++ ) {
+        std::vector<size_t> expected = decimateOneFactorPerRound( fg, "BP", iaopts, reinit );
+        DecMAP decmap( fg, PropertySet()("ianame",std::string("BP"))("iaopts",iaopts)("reinit",(bool)reinit)("batchsize",(size_t)1)("verbose",(size_t)0) );
+        decmap.init();
+        decmap.run();
+        BOOST_CHECK( decmap.findMaximum() == expected );
+        checkConsistent( fg, decmap );
+    }
+}
+
+
+BOOST_AUTO_TEST_CASE( BatchTest ) {
+    // with a single BP iteration per run, the number of rounds equals Iterations()
+    PropertySet iaopts = PropertySet()("inference",std::string("MAXPROD"))("updates",std::string("SEQFIX"))("tol",(Real)1e-9)("maxiter",(size_t)1)("logdomain",false)("verbose",(size_t)0);
+    PropertySet opts = PropertySet()("ianame",std::string("BP"))("iaopts",iaopts)("reinit",true)("verbose",(size_t)0);
+
+    // four disjoint pairs of variables: all factors can be clamped in one round
+    std::vector<Var> vars;
+    for( size_t i = 0; i < 8; i++ )
+        vars.push_back( Var( i, 2 ) );
+    std::vector<Factor> facs;
+    for( size_t i = 0; i < 8; i += 2 )
+        facs.push_back( createFactorIsing( vars[i], vars[i + 1], 0.5 ) * createFactorIsing( vars[i], 0.1 * (i + 1) ) );
+    FactorGraph pairs( facs );
+    DecMAP single( pairs, opts("batchsize",(size_t)1) );
+    single.init();
+    single.run();
+    BOOST_CHECK_EQUAL( single.Iterations(), 4 );
+    checkConsistent( pairs, single );
+    DecMAP batch( pairs, opts("batchsize",(size_t)4) );
+    batch.init();
+    batch.run();
+    BOOST_CHECK_EQUAL( batch.Iterations(), 1 );
+    checkConsistent( pairs, batch );
+    BOOST_CHECK( batch.findMaximum() == single.findMaximum() );
+
+    // a star: all factors share the center, so only one factor can be clamped in the first round;
+    // after that, the center is no longer free and four factors are clamped in each round
+    facs.clear();
+    for( size_t i = 1; i < 8; i++ )
+        facs.push_back( createFactorIsing( vars[0], vars[i], 0.1 * i ) );
+    FactorGraph star( facs );
+    DecMAP starBatch( star, opts("batchsize",(size_t)4) );
+    starBatch.init();
+    starBatch.run();
+    BOOST_CHECK_EQUAL( starBatch.Iterations(), 3 );
+    checkConsistent( star, starBatch );
+
+    // a grid: batches need fewer rounds and still yield a consistent state
+    FactorGraph grid = createIsingGrid( 3, false, 1.0, 0.5 );
+    DecMAP gridSingle( grid, opts("batchsize",(size_t)1) );
+    gridSingle.init();
+    gridSingle.run();
+    checkConsistent( grid, gridSingle );
+    DecMAP gridBatch( grid, opts("batchsize",(size_t)3) );
+    gridBatch.init();
+    gridBatch.run();
+    checkConsistent( grid, gridBatch );
+    BOOST_CHECK( gridBatch.Iterations() < gridSingle.Iterations() );
+}
@@ -0,0 +1,205 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <dai/evidence.h>
+#include <sstream>
+#include <vector>
+
+
+using namespace dai;
+
+
+#define BOOST_TEST_MODULE EvidenceTest
+
+
+#include <boost/test/unit_test.hpp>
+
+
+BOOST_AUTO_TEST_CASE( ConstructorsTest ) {
+    Evidence e;
+    BOOST_CHECK_EQUAL( e.nrSamples(), 0 );
+    BOOST_CHECK_EQUAL( e.nrVars(), 0 );
+
+    Var v0( 0, 2 ), v1( 1, 3 ), v2( 2, 2 );
+    std::vector<Evidence::Observation> samples( 3 );
+    samples[0][v0] = 1;
+    samples[0][v1] = 2;
+    samples[1][v1] = 0;
+    samples[2][v2] = 1;
+    samples[2][v0] = 0;
+    Evidence f( samples );
+    BOOST_CHECK_EQUAL( f.nrSamples(), 3 );
+    BOOST_CHECK_EQUAL( f.nrVars(), 3 );
+    for( size_t s = 0; s < samples.size(); s++ ) {
+        BOOST_CHECK( f.sample( s ) == samples[s] );
+        BOOST_CHECK_EQUAL( f.nrObserved( s ), samples[s].size() );
+    }
+    size_t j = f.findVar( v2 );
+    BOOST_CHECK_EQUAL( f.vars()[j], v2 );
+    BOOST_CHECK( !f.observed( 0, j ) );
+    BOOST_CHECK( !f.observed( 1, j ) );
+    BOOST_CHECK( f.observed( 2, j ) );
+    BOOST_CHECK_EQUAL( f.state( 2, j ), 1 );
+    BOOST_CHECK_THROW( f.findVar( Var( 3, 2 ) ), Exception );
+
+    size_t s = 0;
+    for( Evidence::const_iterator it = f.begin(); it != f.end(); it++, s++ ) {
+        BOOST_CHECK_EQUAL( it.index(), s );
+        BOOST_CHECK( *it == samples[s] );
+    }
+    BOOST_CHECK_EQUAL( s, samples.size() );
+    BOOST_CHECK_EQUAL( f.end() - f.begin(), 3 );
+    BOOST_CHECK( f.begin() + 3 == f.end() );
+    BOOST_CHECK( *(f.begin() + 2) == samples[2] );
+    BOOST_CHECK( std::vector<Evidence::Observation>( f.begin(), f.end() ) == samples );
+    BOOST_CHECK( e.begin() == e.end() );
+
+    samples[0][v0] = 2;
+    BOOST_CHECK_THROW( Evidence g( samples ), Exception );
+
+    f.clear();
+    BOOST_CHECK_EQUAL( f.nrSamples(), 0 );
+    BOOST_CHECK_EQUAL( f.nrVars(), 0 );
+}
+
+
+BOOST_AUTO_TEST_CASE( AddSamplesTest ) {
+    Var v0( 0, 2 ), v1( 1, 3 );
+    std::vector<Var> vars;
+    vars.push_back( v1 );
+    vars.push_back( v0 );
+    size_t states[] = { 2, 1, 0, 0, 1, 1 };
+    bool observed[] = { true, true, false, true, true, false };
+
+    Evidence e;
+    e.addSamples( vars, std::vector<size_t>( states, states + 6 ), std::vector<bool>( observed, observed + 6 ) );
+    BOOST_CHECK_EQUAL( e.nrSamples(), 3 );
+    BOOST_CHECK_EQUAL( e.nrVars(), 2 );
+    BOOST_CHECK_EQUAL( e.vars()[0], v1 );
+    BOOST_CHECK_EQUAL( e.vars()[1], v0 );
+    Evidence::Observation x;
+    x[v1] = 2;
+    x[v0] = 1;
+    BOOST_CHECK( e.sample( 0 ) == x );
+    x.clear();
+    x[v0] = 0;
+    BOOST_CHECK( e.sample( 1 ) == x );
+    x.clear();
+    x[v1] = 1;
+    BOOST_CHECK( e.sample( 2 ) == x );
+
+    e.addSamples( std::vector<Var>( 1, Var( 2, 2 ) ), std::vector<size_t>( 2, 1 ) );
+    BOOST_CHECK_EQUAL( e.nrSamples(), 5 );
+    BOOST_CHECK_EQUAL( e.nrVars(), 3 );
+    BOOST_CHECK_EQUAL( e.nrObserved( 0 ), 2 );
+    BOOST_CHECK( !e.observed( 0, 2 ) );
+    BOOST_CHECK_EQUAL( e.nrObserved( 4 ), 1 );
+    BOOST_CHECK_EQUAL( e.state( 4, 2 ), 1 );
+
+    BOOST_CHECK_THROW( e.addSamples( vars, std::vector<size_t>( 3, 0 ) ), Exception );
+    BOOST_CHECK_THROW( e.addSamples( vars, std::vector<size_t>( 2, 0 ), std::vector<bool>( 1, true ) ), Exception );
+    BOOST_CHECK_THROW( e.addSamples( vars, std::vector<size_t>( 2, 2 ) ), Exception );
+    e.addSamples( vars, std::vector<size_t>( 2, 2 ), std::vector<bool>( 2, false ) );
+    BOOST_CHECK_EQUAL( e.nrSamples(), 6 );
+    BOOST_CHECK_EQUAL( e.nrObserved( 5 ), 0 );
+}
+
+
+BOOST_AUTO_TEST_CASE( TabFileTest ) {
+    std::vector<Var> vars;
+    vars.push_back( Var( 1, 2 ) );
+    vars.push_back( Var( 2, 3 ) );
+    vars.push_back( Var( 3, 2 ) );
+    FactorGraph fg( std::vector<Factor>( 1, Factor( VarSet( vars.begin(), vars.end() ) ) ) );
+
+    std::stringstream ss;
+    ss << "1\t3\t2" << std::endl << std::endl;
+    ss << "0\t0\t1" << std::endl;
+    ss << "1\t0\t2" << std::endl;
+    ss << "1\t\t1" << std::endl;
+    ss << "\t\t" << std::endl;
+    ss << "0\t1\t0" << std::endl;
+
+    Evidence e;
+    e.addEvidenceTabFile( ss, fg );
+    BOOST_CHECK_EQUAL( e.nrSamples(), 5 );
+    BOOST_CHECK_EQUAL( e.nrVars(), 3 );
+    BOOST_CHECK_EQUAL( e.vars()[0], vars[0] );
+    BOOST_CHECK_EQUAL( e.vars()[1], vars[2] );
+    BOOST_CHECK_EQUAL( e.vars()[2], vars[1] );
+    Evidence::Observation x;
+    x[vars[0]] = 1;
+    x[vars[1]] = 1;
+    BOOST_CHECK( e.sample( 2 ) == x );
+    BOOST_CHECK_EQUAL( e.nrObserved( 3 ), 0 );
+    BOOST_CHECK_EQUAL( e.state( 4, 1 ), 1 );
+
+    // read in chunks
+    ss.clear();
+    ss.seekg( 0 );
+    Evidence::TabFileReader reader( ss, fg );
+    BOOST_CHECK( reader.vars() == e.vars() );
+    Evidence chunk;
+    BOOST_CHECK_EQUAL( reader.read( chunk, 2 ), 2 );
+    BOOST_CHECK_EQUAL( chunk.nrSamples(), 2 );
+    BOOST_CHECK( chunk.sample( 1 ) == e.sample( 1 ) );
+    chunk.clear();
+    BOOST_CHECK_EQUAL( reader.read( chunk, 2 ), 2 );
+    BOOST_CHECK( chunk.sample( 0 ) == e.sample( 2 ) );
+    BOOST_CHECK( chunk.sample( 1 ) == e.sample( 3 ) );
+    chunk.clear();
+    BOOST_CHECK_EQUAL( reader.read( chunk, 2 ), 1 );
+    BOOST_CHECK( chunk.sample( 0 ) == e.sample( 4 ) );
+    BOOST_CHECK_EQUAL( reader.read( chunk, 2 ), 0 );
+
+    // invalid files
+    const char *invalid[] = {
+        "\n\n0\n",           // empty header
+        "4\n\n0\n",          // unknown variable
+        "1\n0\n",            // missing empty line
+        "1\t3\n\n0\n",       // too few fields
+        "1\t3\n\n0\t1\t\n",  // too many fields
+        "1\t3\n\n0\t1a\n",   // invalid state
+        "1\t3\n\n0\t-1\n",   // invalid state
+        "1\t3\n\n2\t1\n",    // state too large
+        "1\t3\n\n0\t12\n"    // state too large
+    };
+    for( size_t i = 0; i < sizeof(invalid) / sizeof(invalid[0]); i++ ) {
+        std::stringstream is( invalid[i] );
+        Evidence f;
+        BOOST_CHECK_THROW( f.addEvidenceTabFile( is, fg ), Exception );
+    }
+}
+
+
+BOOST_AUTO_TEST_CASE( UniqueSamplesTest ) {
+    Var v0( 0, 2 ), v1( 1, 3 );
+    std::vector<Var> vars;
+    vars.push_back( v0 );
+    vars.push_back( v1 );
+    size_t states[] = { 1, 2,  0, 0,  1, 2,  0, 0,  1, 0,  1, 2 };
+    bool observed[] = { true, true,  true, true,  true, true,  true, false,  true, true,  true, true };
+
+    Evidence e;
+    std::vector<size_t> counts;
+    BOOST_CHECK( e.uniqueSamples( counts ).empty() );
+    BOOST_CHECK( counts.empty() );
+
+    e.addSamples( vars, std::vector<size_t>( states, states + 12 ), std::vector<bool>( observed, observed + 12 ) );
+    std::vector<size_t> unique = e.uniqueSamples( counts );
+    BOOST_CHECK_EQUAL( unique.size(), 4 );
+    BOOST_CHECK_EQUAL( counts.size(), 4 );
+    BOOST_CHECK_EQUAL( unique[0], 0 );
+    BOOST_CHECK_EQUAL( counts[0], 3 );
+    BOOST_CHECK_EQUAL( unique[1], 1 );
+    BOOST_CHECK_EQUAL( counts[1], 1 );
+    BOOST_CHECK_EQUAL( unique[2], 3 );
+    BOOST_CHECK_EQUAL( counts[2], 1 );
+    BOOST_CHECK_EQUAL( unique[3], 4 );
+    BOOST_CHECK_EQUAL( counts[3], 1 );
+}
@@ -7,15 +7,13 @@
 
 
 #include <dai/factor.h>
+#include "testutil.h"
 #include <strstream>
 
 
 using namespace dai;
 
 
-const Real tol = 1e-8;
-
-
 #define BOOST_TEST_MODULE FactorTest
 
 
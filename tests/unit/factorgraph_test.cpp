@@ -10,6 +10,7 @@
 #include <dai/factorgraph.h>
 #include <vector>
 #include <strstream>
+#include <fstream>
 
 
 using namespace dai;
@@ -60,6 +61,49 @@ BOOST_AUTO_TEST_CASE( ConstructorsTest ) {
     FactorGraph G5( G2 );
     BOOST_CHECK_EQUAL( G5.vars(), vars );
     BOOST_CHECK_EQUAL( G5.factors(), facs );
+
+    // variables are given in the order 1, 0, 2
+    std::vector<size_t> labels, states, scopeBegin, scopeVars;
+    labels.push_back( 1 ); labels.push_back( 0 ); labels.push_back( 2 );
+    states.push_back( 2 ); states.push_back( 2 ); states.push_back( 2 );
+    std::vector<Real> values;
+    for( size_t k = 0; k < 4 * 3 + 2; k++ )
+        values.push_back( k + 1.0 );
+    scopeBegin.push_back( 0 );
+    scopeVars.push_back( 1 ); scopeVars.push_back( 0 ); scopeBegin.push_back( 2 );
+    scopeVars.push_back( 2 ); scopeVars.push_back( 1 ); scopeBegin.push_back( 4 );
+    scopeVars.push_back( 0 ); scopeVars.push_back( 2 ); scopeBegin.push_back( 6 );
+    scopeVars.push_back( 0 ); scopeBegin.push_back( 7 );
+    std::vector<Var> I0, I1, I2, I3;
+    I0.push_back( vars[0] ); I0.push_back( vars[1] );
+    I1.push_back( vars[2] ); I1.push_back( vars[0] );
+    I2.push_back( vars[1] ); I2.push_back( vars[2] );
+    I3.push_back( vars[1] );
+    facs.clear();
+    facs.push_back( Factor( I0, std::vector<Real>( values.begin(), values.begin() + 4 ) ) );
+    facs.push_back( Factor( I1, std::vector<Real>( values.begin() + 4, values.begin() + 8 ) ) );
+    facs.push_back( Factor( I2, std::vector<Real>( values.begin() + 8, values.begin() + 12 ) ) );
+    facs.push_back( Factor( I3, std::vector<Real>( values.begin() + 12, values.end() ) ) );
+    FactorGraph G6( labels, states, scopeBegin, scopeVars, values );
+    BOOST_CHECK_EQUAL( G6.vars(), vars );
+    BOOST_CHECK_EQUAL( G6.factors(), facs );
+    BOOST_CHECK( G6.bipGraph() == FactorGraph( facs ).bipGraph() );
+
+    values.push_back( 0.0 );
+    BOOST_CHECK_THROW( FactorGraph( labels, states, scopeBegin, scopeVars, values ), Exception );
+    values.pop_back();
+    scopeVars[1] = 1;
+    BOOST_CHECK_THROW( FactorGraph( labels, states, scopeBegin, scopeVars, values ), Exception );
+    scopeVars[1] = 3;
+    BOOST_CHECK_THROW( FactorGraph( labels, states, scopeBegin, scopeVars, values ), Exception );
+    scopeVars[1] = 0;
+    scopeBegin[1] = 1000000;
+    BOOST_CHECK_THROW( FactorGraph( labels, states, scopeBegin, scopeVars, values ), Exception );
+    scopeBegin[1] = 5;
+    BOOST_CHECK_THROW( FactorGraph( labels, states, scopeBegin, scopeVars, values ), Exception );
+    scopeBegin[1] = 2;
+    labels[2] = 0;
+    BOOST_CHECK_THROW( FactorGraph( labels, states, scopeBegin, scopeVars, values ), Exception );
 }
 
 
@@ -645,6 +689,43 @@ BOOST_AUTO_TEST_CASE( OperationsTest ) {
         Gcl.restoreFactors();
     }
 
+    // reclamp
+    for( size_t x0 = 0; x0 < 2; x0++ )
+        for( size_t x1 = 0; x1 < 2; x1++ ) {
+            std::map<size_t, size_t> x;
+            x[0] = x0;
+            x[1] = x1;
+            Gcl.reclamp( x );
+            Factor delta0 = createFactorDelta( v0, x0 );
+            Factor delta1 = createFactorDelta( v1, x1 );
+            BOOST_CHECK_EQUAL( Gcl.factor(0), G.factor(0) * delta0 * delta1 );
+            BOOST_CHECK_EQUAL( Gcl.factor(1), G.factor(1) * delta1 );
+            BOOST_CHECK_EQUAL( Gcl.factor(2), G.factor(2) * delta1 );
+        }
+    Gcl.reclamp( std::map<size_t, size_t>() );
+    for( size_t j = 0; j < 3; j++ )
+        BOOST_CHECK_EQUAL( Gcl.factor(j), G.factor(j) );
+
+    // reclamp keeps earlier clampings
+    FactorGraph Gpre( G );
+    Gpre.clamp( 0, 1, true );
+    FactorGraph Gpre0( Gpre );
+    for( size_t x1 = 0; x1 < 2; x1++ ) {
+        std::map<size_t, size_t> x;
+        x[1] = x1;
+        Gpre.reclamp( x );
+        Factor delta1 = createFactorDelta( v1, x1 );
+        BOOST_CHECK_EQUAL( Gpre.factor(0), Gpre0.factor(0) * delta1 );
+        BOOST_CHECK_EQUAL( Gpre.factor(1), Gpre0.factor(1) * delta1 );
+        BOOST_CHECK_EQUAL( Gpre.factor(2), Gpre0.factor(2) * delta1 );
+    }
+    Gpre.reclamp( std::map<size_t, size_t>() );
+    for( size_t j = 0; j < 3; j++ )
+        BOOST_CHECK_EQUAL( Gpre.factor(j), Gpre0.factor(j) );
+    Gpre.restoreFactors();
+    for( size_t j = 0; j < 3; j++ )
+        BOOST_CHECK_EQUAL( Gpre.factor(j), G.factor(j) );
+
     // makeCavity
     FactorGraph Gcav( G );
     Gcav.makeCavity( 0, true );
@@ -698,6 +779,67 @@ BOOST_AUTO_TEST_CASE( IOTest ) {
             BOOST_CHECK_CLOSE( G.factor(I)[s], G2.factor(I)[s], tol );
     }
 
+    // ReadFromFile() should yield exactly the same result as operator>>
+    for( size_t precision = 6; precision <= 17; precision += 11 ) {
+        G.WriteToFile( "factorgraph_test.fg", precision );
+        G2.ReadFromFile( "factorgraph_test.fg" );
+        FactorGraph G4;
+        std::ifstream is( "factorgraph_test.fg" );
+        is >> G4;
+        is.close();
+        BOOST_CHECK( G4.vars() == G2.vars() );
+        BOOST_CHECK( G4.bipGraph() == G2.bipGraph() );
+        for( size_t I = 0; I < G4.nrFactors(); I++ )
+            BOOST_CHECK( G4.factor(I).p() == G2.factor(I).p() );
+    }
+    BOOST_CHECK_THROW( G2.ReadFromFile( "factorgraph_test.nonexisting" ), Exception );
+
+    const char *invalid[] = {
+        "",                                         // no number of factors
+        "1 \n1\n0\n2\n1\n0 1\n",                    // garbage after number of factors
+        "2\n\n1\n0\n2\n0\n\n1\n0\n3\n0\n",         // inconsistent dimensions
+        "1\n\n1\n0\n2\n1\n2 1\n",                   // index out of range
+        "1\n\n1\n0\n2\n1\n0\n",                     // missing value
+    };
+    for( size_t k = 0; k < sizeof(invalid) / sizeof(invalid[0]); k++ ) {
+        std::ofstream os( "factorgraph_test.fg" );
+        os << invalid[k];
+        os.close();
+        BOOST_CHECK_THROW( G2.ReadFromFile( "factorgraph_test.fg" ), Exception );
+    }
+    {
+        std::ofstream os( "factorgraph_test.fg" );
+        os << "# comment\n# another comment\n2\n\n2\n3 1\n2 3\n2\n1 0.5\n4 2e-1\n\n1\n3\n2\n0\n";
+        os.close();
+        G2.ReadFromFile( "factorgraph_test.fg" );
+        std::ifstream is( "factorgraph_test.fg" );
+        FactorGraph G4;
+        is >> G4;
+        is.close();
+        BOOST_CHECK( G4.vars() == G2.vars() );
+        BOOST_CHECK_EQUAL( G2.nrFactors(), 2 );
+        for( size_t I = 0; I < G4.nrFactors(); I++ ) {
+            BOOST_CHECK( G4.factor(I).vars() == G2.factor(I).vars() );
+            BOOST_CHECK( G4.factor(I).p() == G2.factor(I).p() );
+        }
+        BOOST_CHECK_EQUAL( G2.factor(0)[3], (Real)0.5 );
+    }
+    G.WriteToFile( "factorgraph_test.fg" );
+
+    G.WriteToBinaryFile( "factorgraph_test.fgb" );
+    FactorGraph Gb;
+    Gb.ReadFromBinaryFile( "factorgraph_test.fgb" );
+
+    BOOST_CHECK( G.vars() == Gb.vars() );
+    BOOST_CHECK( G.bipGraph() == Gb.bipGraph() );
+    BOOST_CHECK_EQUAL( G.nrFactors(), Gb.nrFactors() );
+    for( size_t I = 0; I < G.nrFactors(); I++ ) {
+        BOOST_CHECK( G.factor(I).vars() == Gb.factor(I).vars() );
+        BOOST_CHECK( G.factor(I).p() == Gb.factor(I).p() );
+    }
+    BOOST_CHECK_THROW( Gb.ReadFromBinaryFile( "factorgraph_test.fg" ), Exception );
+    BOOST_CHECK_THROW( Gb.ReadFromBinaryFile( "factorgraph_test.nonexisting" ), Exception );
+
     std::stringstream ss;
     std::string s;
     G.printDot( ss );
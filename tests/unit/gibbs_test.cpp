@@ -0,0 +1,254 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <dai/alldai.h>
+#include "testutil.h"
+#include <algorithm>
+#include <cmath>
+#include <vector>
+
+
+using namespace dai;
+
+
+#define BOOST_TEST_MODULE GibbsTest
+
+
+#include <boost/test/unit_test.hpp>
+
+
+// Returns the maximum total variation distance between the variable beliefs of \a a and \a b
+Real maxDist( const FactorGraph &fg, const InfAlg &a, const InfAlg &b ) {
+    Real d = 0.0;
+    for( size_t i = 0; i < fg.nrVars(); i++ )
+        d = std::max( d, dist( a.beliefV(i), b.beliefV(i), DISTTV ) );
+    return d;
+}
+
+
+BOOST_AUTO_TEST_CASE( MultipleChainsTest ) {
+    FactorGraph fg = createIsingGrid( 3, false, 0.5, 0.5 );
+    ExactInf ei( fg, PropertySet()("verbose",(size_t)0) );
+    ei.init();
+    ei.run();
+
+    PropertySet opts;
+    opts.set( "maxiter", (size_t)5000 );
+    opts.set( "burnin", (size_t)100 );
+    opts.set( "nrchains", (size_t)4 );
+
+    // the merged counts of the chains converge to the exact marginals,
+    // and the variable and factor beliefs are based on the same samples
+    rnd_seed( 1 );
+    Gibbs gibbs( fg, opts );
+    gibbs.init();
+    gibbs.run();
+    BOOST_CHECK_EQUAL( gibbs.Iterations(), 5000 );
+    BOOST_CHECK( maxDist( fg, gibbs, ei ) < 0.02 );
+    for( size_t I = 0; I < fg.nrFactors(); I++ )
+        foreach( const Neighbor &i, fg.nbF(I) )
+            BOOST_CHECK( dist( gibbs.beliefF(I).marginal( fg.var(i) ), gibbs.beliefV(i), DISTTV ) < tol );
+
+    // the results only depend on the random seed, not on the number of threads
+    for( size_t nthreads = 1; nthreads <= 4; nthreads += 3 ) {
+        rnd_seed( 1 );
+        Gibbs gibbs2( fg, opts );
+        gibbs2.props.nthreads = nthreads;
+        gibbs2.init();
+        gibbs2.run();
+        for( size_t i = 0; i < fg.nrVars(); i++ ) {
+            BOOST_CHECK_EQUAL( gibbs.beliefV(i), gibbs2.beliefV(i) );
+            BOOST_CHECK_EQUAL( gibbs.RhatV(i), gibbs2.RhatV(i) );
+        }
+        for( size_t I = 0; I < fg.nrFactors(); I++ )
+            BOOST_CHECK_EQUAL( gibbs.beliefF(I), gibbs2.beliefF(I) );
+        BOOST_CHECK( gibbs.findMaximum() == gibbs2.findMaximum() );
+    }
+
+    // a different seed gives different samples
+    rnd_seed( 2 );
+    Gibbs gibbs3( fg, opts );
+    gibbs3.init();
+    gibbs3.run();
+    BOOST_CHECK( maxDist( fg, gibbs, gibbs3 ) > 0.0 );
+    BOOST_CHECK( maxDist( fg, gibbs3, ei ) < 0.02 );
+}
+
+
+BOOST_AUTO_TEST_CASE( RhatTest ) {
+    PropertySet opts;
+    opts.set( "maxiter", (size_t)2000 );
+    opts.set( "burnin", (size_t)10 );
+    opts.set( "nrchains", (size_t)8 );
+
+    // chains that mix well have a potential scale reduction factor close to one
+    FactorGraph fg = createIsingGrid( 3, false, 0.5, 0.5 );
+    rnd_seed( 1 );
+    Gibbs gibbs( fg, opts );
+    gibbs.init();
+    gibbs.run();
+    for( size_t i = 0; i < fg.nrVars(); i++ ) {
+        BOOST_CHECK( gibbs.RhatV(i) >= 0.99 );
+        BOOST_CHECK( gibbs.RhatV(i) < 1.05 );
+    }
+    BOOST_CHECK( gibbs.Rhat() < 1.05 );
+
+    // two variables that are forced to be equal: each chain remains in the mode in which it
+    // started (with marginal (1,0) or (0,1)), whereas the exact marginals are (0.5,0.5)
+    Var x0( 0, 2 ), x1( 1, 2 );
+    Factor eq( VarSet( x0, x1 ), 0.0 );
+    eq.set( 0, 1.0 );
+    eq.set( 3, 1.0 );
+    FactorGraph fgeq( std::vector<Factor>( 1, eq ) );
+    rnd_seed( 1 );
+    Gibbs gibbseq( fgeq, opts );
+    gibbseq.init();
+    gibbseq.run();
+    BOOST_CHECK( gibbseq.Rhat() > 10.0 );
+    BOOST_CHECK_EQUAL( gibbseq.Rhat(), std::max( gibbseq.RhatV(0), gibbseq.RhatV(1) ) );
+
+    // with a single chain, no potential scale reduction factors are calculated
+    opts.set( "nrchains", (size_t)1 );
+    Gibbs gibbs1( fg, opts );
+    gibbs1.init();
+    gibbs1.run();
+    BOOST_CHECK_THROW( gibbs1.Rhat(), Exception );
+}
+
+
+BOOST_AUTO_TEST_CASE( IncrementalScoreTest ) {
+    std::vector<FactorGraph> fgs;
+    // a model without zero entries
+    fgs.push_back( createIsingGrid( 3, false, 0.5, 0.5 ) );
+    // a model in which some factor entries are zero
+    std::vector<Factor> facs = createIsingGrid( 3, false, 0.5, 0.5 ).factors();
+    for( size_t I = 0; I < facs.size(); I++ )
+        if( facs[I].vars().size() == 2 )
+            facs[I].set( I % 4, 0.0 );
+    fgs.push_back( FactorGraph( facs ) );
+    // a model in which each joint state has a zero factor entry (the variables should be
+    // equal and different at the same time)
+    Var x0( 0, 2 ), x1( 1, 2 ), x2( 2, 2 );
+    facs.clear();
+    facs.push_back( Factor( VarSet( x0, x1 ), 1.0 ) );
+    facs.back().set( 1, 0.0 );
+    facs.back().set( 2, 0.0 );
+    facs.push_back( Factor( VarSet( x1, x2 ), 1.0 ) );
+    facs.back().set( 1, 0.0 );
+    facs.back().set( 2, 0.0 );
+    facs.push_back( Factor( VarSet( x0, x2 ), 1.0 ) );
+    facs.back().set( 0, 0.0 );
+    facs.back().set( 3, 0.0 );
+    fgs.push_back( FactorGraph( facs ) );
+
+    const char *updates[] = {"SEQ", "CHROMATIC", "BLOCKED"};
+    size_t nrZeroStates = 0;
+    for( size_t k = 0; k < fgs.size(); k++ ) {
+        const FactorGraph &fg = fgs[k];
+        for( size_t u = 0; u < 3; u++ )
+            for( size_t maxiter = 1; maxiter <= 20; maxiter++ ) {
+                // the score and the factor entries are recalculated from scratch after the random
+                // initialization, and then tracked incrementally for maxiter sweeps
+                Gibbs gibbs( fg, PropertySet()("maxiter",maxiter)("updates",std::string(updates[u]))("blocksize",(size_t)3) );
+                gibbs.init();
+                gibbs.run();
+                std::map<Var, size_t> state;
+                for( size_t i = 0; i < fg.nrVars(); i++ )
+                    state[fg.var(i)] = gibbs.state()[i];
+                for( size_t I = 0; I < fg.nrFactors(); I++ )
+                    BOOST_CHECK_EQUAL( gibbs.factorEntries()[I], calcLinearState( fg.factor(I).vars(), state ) );
+                Real logScore = fg.logScore( gibbs.state() );
+                if( logScore == -INFINITY ) {
+                    BOOST_CHECK_EQUAL( gibbs.currentLogScore(), -INFINITY );
+                    nrZeroStates++;
+                } else
+                    BOOST_CHECK( std::fabs( gibbs.currentLogScore() - logScore ) < tol );
+            }
+    }
+    BOOST_CHECK( nrZeroStates >= 3 * 20 );
+}
+
+
+BOOST_AUTO_TEST_CASE( MaximumTest ) {
+    // the score is recalculated from scratch every 100 sweeps, and the state with maximum
+    // score is found reliably on a grid whose 512 states are all visited
+    FactorGraph fg = createIsingGrid( 3, false, 0.5, 0.5 );
+    JTree jt( fg, PropertySet()("updates",std::string("HUGIN"))("inference",std::string("MAXPROD"))("verbose",(size_t)0) );
+    jt.init();
+    jt.run();
+    std::vector<size_t> mapState = jt.findMaximum();
+
+    const char *updates[] = {"SEQ", "CHROMATIC", "BLOCKED"};
+    for( size_t u = 0; u < 3; u++ ) {
+        Gibbs gibbs( fg, PropertySet()("maxiter",(size_t)5050)("updates",std::string(updates[u]))("blocksize",(size_t)3) );
+        gibbs.init();
+        gibbs.run();
+        BOOST_CHECK( gibbs.findMaximum() == mapState );
+        BOOST_CHECK( std::fabs( gibbs.currentLogScore() - fg.logScore( gibbs.state() ) ) < tol );
+    }
+}
+
+
+BOOST_AUTO_TEST_CASE( UpdateScheduleTest ) {
+    // a grid with an additional factor involving three variables
+    std::vector<Factor> facs = createIsingGrid( 3, false, 0.5, 0.5 ).factors();
+    facs.push_back( Factor( VarSet( Var( 0, 2 ), Var( 4, 2 ) ) | Var( 8, 2 ) ).randomize() );
+    FactorGraph fg( facs );
+    GraphAL G = fg.MarkovGraph();
+    JTree jt( fg, PropertySet()("updates",std::string("HUGIN"))("verbose",(size_t)0) );
+    jt.init();
+    jt.run();
+
+    // the color classes partition the variables, and neighbors have different colors
+    rnd_seed( 1 );
+    Gibbs chromatic( fg, PropertySet()("maxiter",(size_t)20000)("burnin",(size_t)100)("updates",std::string("CHROMATIC")) );
+    chromatic.init();
+    chromatic.run();
+    std::vector<size_t> color( fg.nrVars(), fg.nrVars() );
+    for( size_t c = 0; c < chromatic.varGroups().size(); c++ )
+        foreach( size_t i, chromatic.varGroups()[c] ) {
+            BOOST_CHECK_EQUAL( color[i], fg.nrVars() );
+            color[i] = c;
+        }
+    for( size_t i = 0; i < fg.nrVars(); i++ ) {
+        BOOST_CHECK( color[i] < chromatic.varGroups().size() );
+        foreach( const Neighbor &j, G.nb(i) )
+            BOOST_CHECK( color[i] != color[j] );
+    }
+    BOOST_CHECK( maxDist( fg, chromatic, jt ) < 0.02 );
+
+    for( size_t blocksize = 1; blocksize <= 4; blocksize++ ) {
+        // the blocks partition the variables, and are connected sets of at most blocksize variables
+        rnd_seed( 1 );
+        Gibbs blocked( fg, PropertySet()("maxiter",(size_t)20000)("burnin",(size_t)100)("updates",std::string("BLOCKED"))("blocksize",blocksize) );
+        blocked.init();
+        blocked.run();
+        std::vector<size_t> block( fg.nrVars(), fg.nrVars() );
+        for( size_t b = 0; b < blocked.varGroups().size(); b++ ) {
+            const std::vector<size_t> &vars = blocked.varGroups()[b];
+            BOOST_CHECK( vars.size() >= 1 && vars.size() <= blocksize );
+            for( size_t k = 0; k < vars.size(); k++ ) {
+                BOOST_CHECK_EQUAL( block[vars[k]], fg.nrVars() );
+                block[vars[k]] = b;
+                // each variable except the first is a neighbor of a variable that was added before
+                bool connected = (k == 0);
+                for( size_t l = 0; l < k; l++ )
+                    if( G.hasEdge( vars[k], vars[l] ) )
+                        connected = true;
+                BOOST_CHECK( connected );
+            }
+        }
+        for( size_t i = 0; i < fg.nrVars(); i++ )
+            BOOST_CHECK( block[i] < blocked.varGroups().size() );
+
+        // the beliefs converge to the exact marginals
+        BOOST_CHECK( maxDist( fg, blocked, jt ) < 0.02 );
+        for( size_t I = 0; I < fg.nrFactors(); I++ )
+            BOOST_CHECK( dist( blocked.beliefF(I), jt.beliefF(I), DISTTV ) < 0.02 );
+    }
+}
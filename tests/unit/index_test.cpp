@@ -54,6 +54,50 @@ BOOST_AUTO_TEST_CASE( IndexForTest ) {
 }
 
 
+BOOST_AUTO_TEST_CASE( BlockIndexForTest ) {
+    BlockIndexFor x;
+    BOOST_CHECK( !x.valid() );
+
+    size_t nrVars = 6;
+    std::vector<Var> vars;
+    for( size_t i = 0; i < nrVars; i++ )
+        vars.push_back( Var( i, (i % 3) + 1 ) );
+
+    for( size_t repeat = 0; repeat < 10000; repeat++ ) {
+        VarSet indexVars1;
+        VarSet indexVars2;
+        VarSet forVars;
+        for( size_t i = 0; i < nrVars; i++ ) {
+            if( rnd(2) == 0 )
+                indexVars1 |= vars[i];
+            if( rnd(2) == 0 )
+                indexVars2 |= vars[i];
+            if( rnd(2) == 0 )
+                forVars |= vars[i];
+        }
+        IndexFor ind1( indexVars1, forVars );
+        IndexFor ind2( indexVars2, forVars );
+        BlockIndexFor ind( indexVars1, indexVars2, forVars );
+        size_t iter = 0;
+        for( size_t pass = 0; pass < 2; pass++ ) {
+            for( ; ind.valid(); ++ind ) {
+                BOOST_CHECK( ind.blockSize() > 0 );
+                for( size_t j = 0; j < ind.blockSize(); j++, ++ind1, ++ind2, iter++ ) {
+                    BOOST_CHECK_EQUAL( ind.index1() + j * ind.stride1(), (size_t)ind1 );
+                    BOOST_CHECK_EQUAL( ind.index2() + j * ind.stride2(), (size_t)ind2 );
+                }
+            }
+            BOOST_CHECK( !ind1.valid() );
+            BOOST_CHECK_EQUAL( iter, forVars.nrStates() );
+            ind.reset();
+            ind1.reset();
+            ind2.reset();
+            iter = 0;
+        }
+    }
+}
+
+
 BOOST_AUTO_TEST_CASE( PermuteTest ) {
     Permute x;
 
@@ -0,0 +1,80 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <dai/indexedheap.h>
+#include <vector>
+#include <algorithm>
+#include <cstdlib>
+
+
+using namespace dai;
+
+
+#define BOOST_TEST_MODULE IndexedHeapTest
+
+
+#include <boost/test/unit_test.hpp>
+
+
+BOOST_AUTO_TEST_CASE( ConstructorsTest ) {
+    IndexedHeap<int> x;
+    BOOST_CHECK( x.empty() );
+    BOOST_CHECK_EQUAL( x.size(), 0 );
+
+    IndexedHeap<int> y( 3 );
+    BOOST_CHECK( !y.empty() );
+    BOOST_CHECK_EQUAL( y.size(), 3 );
+    BOOST_CHECK_EQUAL( y.key( 0 ), 0 );
+    BOOST_CHECK_EQUAL( y.key( 2 ), 0 );
+
+    IndexedHeap<double> z( 2, 1.5 );
+    BOOST_CHECK_EQUAL( z.size(), 2 );
+    BOOST_CHECK_EQUAL( z.key( 1 ), 1.5 );
+
+    IndexedHeap<double> w( z );
+    BOOST_CHECK_EQUAL( w.size(), 2 );
+    BOOST_CHECK_EQUAL( w.key( 0 ), 1.5 );
+}
+
+
+BOOST_AUTO_TEST_CASE( OperationsTest ) {
+    IndexedHeap<int> x;
+    BOOST_CHECK_EQUAL( x.push( 3 ), 0 );
+    BOOST_CHECK_EQUAL( x.top(), 0 );
+    BOOST_CHECK_EQUAL( x.push( 5 ), 1 );
+    BOOST_CHECK_EQUAL( x.top(), 1 );
+    BOOST_CHECK_EQUAL( x.push( 4 ), 2 );
+    BOOST_CHECK_EQUAL( x.top(), 1 );
+    BOOST_CHECK_EQUAL( x.size(), 3 );
+
+    // decrease key
+    x.set( 1, 1 );
+    BOOST_CHECK_EQUAL( x.key( 1 ), 1 );
+    BOOST_CHECK_EQUAL( x.top(), 2 );
+    // increase key
+    x.set( 0, 10 );
+    BOOST_CHECK_EQUAL( x.top(), 0 );
+    x.set( 0, 0 );
+    BOOST_CHECK_EQUAL( x.top(), 2 );
+
+    x.clear();
+    BOOST_CHECK( x.empty() );
+
+    // compare with sorting for many random key changes
+    size_t n = 100;
+    IndexedHeap<int> y( n );
+    std::vector<int> keys( n, 0 );
+    for( size_t iter = 0; iter < 1000; iter++ ) {
+        size_t item = rand() % n;
+        int key = rand() % 50;
+        y.set( item, key );
+        keys[item] = key;
+        BOOST_CHECK_EQUAL( y.key( item ), key );
+        BOOST_CHECK_EQUAL( keys[y.top()], *std::max_element( keys.begin(), keys.end() ) );
+    }
+}
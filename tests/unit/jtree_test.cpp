@@ -0,0 +1,216 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <dai/alldai.h>
+#include "testutil.h"
+#include <algorithm>
+#include <list>
+#include <map>
+#include <vector>
+
+
+using namespace dai;
+
+
+#define BOOST_TEST_MODULE JTreeTest
+
+
+#include <boost/test/unit_test.hpp>
+
+
+// Returns the variables of the cached marginals of \a jt, from most recently used to least recently used
+std::vector<VarSet> cachedVars( const JTree &jt ) {
+    std::vector<VarSet> result;
+    for( std::list<Factor>::const_iterator it = jt.cachedMarginals().begin(); it != jt.cachedMarginals().end(); it++ )
+        result.push_back( it->vars() );
+    return result;
+}
+
+
+BOOST_AUTO_TEST_CASE( MarginalCacheTest ) {
+    FactorGraph fg = createIsingGrid( 3, false, 1.0, 0.5 );
+    JTree jt( fg, PropertySet()("updates",std::string("HUGIN"))("verbose",(size_t)0)("cachesize",(size_t)2) );
+    jt.init();
+    jt.run();
+    ExactInf ei( fg, PropertySet()("verbose",(size_t)0) );
+    ei.init();
+    ei.run();
+
+    // sets of variables in opposite corners of the grid, which are not contained in a single region
+    VarSet A( fg.var(0), fg.var(8) ), B( fg.var(2), fg.var(6) );
+    VarSet C = VarSet( fg.var(0), fg.var(6) ) | fg.var(8);
+    BOOST_REQUIRE_EQUAL( jt.findRegion( A, false ), (size_t)-1 );
+    BOOST_REQUIRE_EQUAL( jt.findRegion( B, false ), (size_t)-1 );
+    BOOST_REQUIRE_EQUAL( jt.findRegion( C, false ), (size_t)-1 );
+    BOOST_CHECK( jt.cachedMarginals().empty() );
+
+    // marginals contained in a single region are not cached
+    Factor P0 = jt.calcMarginal( fg.var(0) );
+    BOOST_CHECK( dist( P0, ei.calcMarginal( fg.var(0) ), DISTLINF ) < tol );
+    BOOST_CHECK( jt.cachedMarginals().empty() );
+
+    Factor PA = jt.calcMarginal( A );
+    BOOST_CHECK( dist( PA, ei.calcMarginal( A ), DISTLINF ) < tol );
+    BOOST_CHECK( cachedVars( jt ) == std::vector<VarSet>( 1, A ) );
+    Factor PB = jt.calcMarginal( B );
+    BOOST_CHECK( dist( PB, ei.calcMarginal( B ), DISTLINF ) < tol );
+    std::vector<VarSet> expected;
+    expected.push_back( B );
+    expected.push_back( A );
+    BOOST_CHECK( cachedVars( jt ) == expected );
+
+    // a cache hit returns the cached marginal and makes it the most recently used one
+    BOOST_CHECK_EQUAL( jt.calcMarginal( A ), PA );
+    std::swap( expected[0], expected[1] );
+    BOOST_CHECK( cachedVars( jt ) == expected );
+
+    // a copy has its own cache
+    JTree jt2( jt );
+    BOOST_CHECK_EQUAL( jt2.calcMarginal( B ), PB );
+    BOOST_CHECK( cachedVars( jt ) == expected );
+    std::swap( expected[0], expected[1] );
+    BOOST_CHECK( cachedVars( jt2 ) == expected );
+    std::swap( expected[0], expected[1] );
+
+    // when the cache is full, the least recently used marginal is removed
+    Factor PC = jt.calcMarginal( C );
+    BOOST_CHECK( dist( PC, ei.calcMarginal( C ), DISTLINF ) < tol );
+    expected[1] = expected[0];
+    expected[0] = C;
+    BOOST_CHECK( cachedVars( jt ) == expected );
+    BOOST_CHECK( dist( jt.calcMarginal( B ), PB, DISTLINF ) < tol );
+    expected[1] = expected[0];
+    expected[0] = B;
+    BOOST_CHECK( cachedVars( jt ) == expected );
+
+    // running the junction tree again clears the cache
+    jt.run();
+    BOOST_CHECK( jt.cachedMarginals().empty() );
+
+    // with cachesize == 0, nothing is cached
+    JTree jt0( fg, PropertySet()("updates",std::string("HUGIN"))("verbose",(size_t)0)("cachesize",(size_t)0) );
+    jt0.init();
+    jt0.run();
+    BOOST_CHECK( dist( jt0.calcMarginal( A ), PA, DISTLINF ) < tol );
+    BOOST_CHECK( jt0.cachedMarginals().empty() );
+}
+
+
+BOOST_AUTO_TEST_CASE( MarginalCacheInvalidationTest ) {
+    FactorGraph fg = createIsingGrid( 3, false, 1.0, 0.5 );
+    VarSet A( fg.var(0), fg.var(8) );
+    std::string updates[] = {"HUGIN", "SHSH"};
+    for( size_t u = 0; u < 2; u++ ) {
+        JTree jt( fg, PropertySet()("updates",updates[u])("verbose",(size_t)0)("cachesize",(size_t)10) );
+        jt.init();
+        jt.run();
+        jt.calcMarginal( A );
+        BOOST_CHECK_EQUAL( jt.cachedMarginals().size(), 1 );
+
+        // changing a factor clears the cache, so the marginal is recalculated
+        FactorGraph fg2( fg );
+        fg2.setFactor( 0, createFactorIsing( fg.factor(0).vars().front(), fg.factor(0).vars().back(), 2.0 ) );
+        jt.setFactor( 0, fg2.factor(0) );
+        BOOST_CHECK( jt.cachedMarginals().empty() );
+        jt.run();
+        ExactInf ei2( fg2, PropertySet()("verbose",(size_t)0) );
+        ei2.init();
+        ei2.run();
+        BOOST_CHECK( dist( jt.calcMarginal( A ), ei2.calcMarginal( A ), DISTLINF ) < tol );
+        BOOST_CHECK_EQUAL( jt.cachedMarginals().size(), 1 );
+
+        // changing several factors simultaneously also clears the cache
+        std::map<size_t, Factor> facs;
+        facs[1] = createFactorIsing( fg.factor(1).vars().front(), fg.factor(1).vars().back(), -2.0 );
+        facs[fg.nrFactors() - 1] = createFactorIsing( fg.var(8), 1.0 );
+        fg2.setFactors( facs );
+        jt.setFactors( facs, true );
+        BOOST_CHECK( jt.cachedMarginals().empty() );
+        jt.run();
+        ExactInf ei3( fg2, PropertySet()("verbose",(size_t)0) );
+        ei3.init();
+        ei3.run();
+        BOOST_CHECK( dist( jt.calcMarginal( A ), ei3.calcMarginal( A ), DISTLINF ) < tol );
+        BOOST_CHECK( dist( jt.calcMarginal( A ), ei2.calcMarginal( A ), DISTLINF ) > tol );
+
+        // restoring the factors also clears the cache
+        jt.restoreFactors();
+        BOOST_CHECK( jt.cachedMarginals().empty() );
+        jt.run();
+        BOOST_CHECK( dist( jt.calcMarginal( A ), ei2.calcMarginal( A ), DISTLINF ) < tol );
+    }
+}
+
+
+BOOST_AUTO_TEST_CASE( UpdateEvidenceTest ) {
+    FactorGraph fg = createIsingGrid( 3, false, 1.0, 0.5 );
+    VarSet A( fg.var(0), fg.var(8) );
+
+    // a sequence of changes of the evidence, which adds, changes and retracts observations
+    std::vector<std::map<size_t, size_t> > deltas( 6 );
+    deltas[0][0] = 1;
+    deltas[1][4] = 0;
+    deltas[1][8] = 1;
+    deltas[2][0] = 0;
+    deltas[2][4] = 0;
+    deltas[3][4] = (size_t)-1;
+    deltas[3][5] = (size_t)-1;
+    deltas[4][0] = (size_t)-1;
+    deltas[4][8] = (size_t)-1;
+    deltas[4][2] = 1;
+    deltas[5][2] = (size_t)-1;
+
+    std::string updates[] = {"HUGIN", "SHSH"};
+    for( size_t u = 0; u < 2; u++ ) {
+        PropertySet opts = PropertySet()("updates",updates[u])("verbose",(size_t)0)("cachesize",(size_t)1);
+        JTree jt( fg, opts );
+        jt.init();
+        jt.run();
+        jt.calcMarginal( A );
+
+        std::map<size_t, size_t> evidence;
+        for( size_t k = 0; k < deltas.size(); k++ ) {
+            jt.updateEvidence( deltas[k] );
+            for( std::map<size_t, size_t>::const_iterator it = deltas[k].begin(); it != deltas[k].end(); it++ )
+                if( it->second == (size_t)-1 )
+                    evidence.erase( it->first );
+                else
+                    evidence[it->first] = it->second;
+            BOOST_CHECK( jt.evidence() == evidence );
+
+            // the results are the same as those of a junction tree for the clamped factor graph
+            FactorGraph fgc( fg );
+            for( std::map<size_t, size_t>::const_iterator it = evidence.begin(); it != evidence.end(); it++ )
+                fgc.clamp( it->first, it->second );
+            JTree jtc( fgc, opts );
+            jtc.init();
+            jtc.run();
+
+            BOOST_CHECK_CLOSE( jt.logZ(), jtc.logZ(), tol );
+            BOOST_CHECK( dist( jt.calcMarginal( A ), jtc.calcMarginal( A ), DISTLINF ) < tol );
+            for( size_t i = 0; i < fg.nrVars(); i++ )
+                BOOST_CHECK( dist( jt.belief( fg.var(i) ), jtc.belief( fg.var(i) ), DISTLINF ) < tol );
+            for( size_t I = 0; I < fg.nrFactors(); I++ )
+                BOOST_CHECK( dist( jt.belief( fg.factor(I).vars() ), jtc.belief( fg.factor(I).vars() ), DISTLINF ) < tol );
+            std::vector<Factor> b = jt.beliefs(), bc = jtc.beliefs();
+            BOOST_CHECK_EQUAL( b.size(), bc.size() );
+            for( size_t l = 0; l < std::min( b.size(), bc.size() ); l++ ) {
+                BOOST_CHECK_EQUAL( b[l].vars(), bc[l].vars() );
+                BOOST_CHECK( dist( b[l], bc[l], DISTLINF ) < tol );
+            }
+        }
+        BOOST_CHECK( evidence.empty() );
+
+        // after retracting all evidence, the results are the same as before
+        JTree jt0( fg, opts );
+        jt0.init();
+        jt0.run();
+        BOOST_CHECK_CLOSE( jt.logZ(), jt0.logZ(), tol );
+        BOOST_CHECK( dist( jt.calcMarginal( A ), jt0.calcMarginal( A ), DISTLINF ) < tol );
+    }
+}
@@ -0,0 +1,43 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <dai/alldai.h>
+#include "testutil.h"
+#include <vector>
+
+
+using namespace dai;
+
+
+#define BOOST_TEST_MODULE LCTest
+
+
+#include <boost/test/unit_test.hpp>
+
+
+BOOST_AUTO_TEST_CASE( ThreadsTest ) {
+    FactorGraph fg = createIsingGrid( 3, false, 0.5, 0.5 );
+    const char *cavities[] = { "FULL", "PAIR", "PAIR2", "UNIFORM" };
+    for( size_t c = 0; c < 4; c++ ) {
+        PropertySet opts = PropertySet()("cavity",std::string(cavities[c]))("updates",std::string("SEQFIX"))("tol",(Real)1e-9)("maxiter",(size_t)10000)("reinit",true)("verbose",(size_t)0)("cavainame",std::string("BP"))("cavaiopts",PropertySet()("updates",std::string("SEQMAX"))("tol",(Real)1e-9)("maxiter",(size_t)10000)("logdomain",false));
+        LC lc1( fg, opts("nthreads",(size_t)1) );
+        lc1.init();
+        lc1.run();
+        // more threads than variables are also allowed
+        size_t nthreads[] = { 2, 4, 20 };
+        for( size_t t = 0; t < 3; t++ ) {
+            LC lcN( fg, opts("nthreads",nthreads[t]) );
+            BOOST_CHECK_EQUAL( lcN.props.nthreads, nthreads[t] );
+            lcN.init();
+            lcN.run();
+            BOOST_CHECK_EQUAL( lcN.Iterations(), lc1.Iterations() );
+            for( size_t i = 0; i < fg.nrVars(); i++ )
+                BOOST_CHECK_SMALL( dist( lcN.beliefV(i), lc1.beliefV(i), DISTLINF ), tol );
+        }
+    }
+}
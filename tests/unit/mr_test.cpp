@@ -0,0 +1,43 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+#include <dai/alldai.h>
+#include "testutil.h"
+#include <vector>
+
+
+using namespace dai;
+
+
+#define BOOST_TEST_MODULE MRTest
+
+
+#include <boost/test/unit_test.hpp>
+
+
+BOOST_AUTO_TEST_CASE( ThreadsTest ) {
+    FactorGraph fg = createIsingGrid( 3, false, 0.5, 0.5 );
+    const char *inits[] = { "EXACT", "CLAMPING", "RESPPROP" };
+    for( size_t k = 0; k < 3; k++ ) {
+        PropertySet opts = PropertySet()("updates",std::string("FULL"))("inits",std::string(inits[k]))("tol",(Real)1e-9)("verbose",(size_t)0);
+        MR mr1( fg, opts("nthreads",(size_t)1) );
+        mr1.init();
+        mr1.run();
+        // more threads than variables are also allowed
+        size_t nthreads[] = { 2, 4, 20 };
+        for( size_t t = 0; t < 3; t++ ) {
+            MR mrN( fg, opts("nthreads",nthreads[t]) );
+            BOOST_CHECK_EQUAL( mrN.props.nthreads, nthreads[t] );
+            mrN.init();
+            mrN.run();
+            BOOST_CHECK_EQUAL( mrN.Iterations(), mr1.Iterations() );
+            for( size_t i = 0; i < fg.nrVars(); i++ )
+                BOOST_CHECK_SMALL( dist( mrN.beliefV(i), mr1.beliefV(i), DISTLINF ), tol );
+        }
+    }
+}
@@ -8,15 +8,13 @@
 
 #include <dai/util.h>
 #include <dai/prob.h>
+#include "testutil.h"
 #include <strstream>
 
 
 using namespace dai;
 
 
-const Real tol = 1e-8;
-
-
 #define BOOST_TEST_MODULE ProbTest
 
 
@@ -412,6 +410,20 @@ BOOST_AUTO_TEST_CASE( UnaryOperationsTest ) {
     BOOST_CHECK_CLOSE( x.normalize( NORMLINF ), (Real)2.0, tol );
     BOOST_CHECK_SMALL( dist( x, y, DISTL1 ), tol );
 
+    y.set( 0, 2.0 / 3.0 );
+    y.set( 1, 0.0 / 3.0 );
+    y.set( 2, 1.0 / 3.0 );
+    x = xorg.log();
+    BOOST_CHECK_CLOSE( x.logSumExp(), std::log( (Real)3.0 ), tol );
+    BOOST_CHECK_CLOSE( x.normalizeLog(), std::log( (Real)3.0 ), tol );
+    BOOST_CHECK_SMALL( dist( x.exp(), y, DISTL1 ), tol );
+    x = xorg.log() + (Real)-1000.0;
+    BOOST_CHECK_CLOSE( x.normalizeLog(), std::log( (Real)3.0 ) - (Real)1000.0, tol );
+    BOOST_CHECK_SMALL( dist( x.exp(), y, DISTL1 ), tol );
+    x = Prob( 3, -INFINITY );
+    BOOST_CHECK_EQUAL( x.logSumExp(), -INFINITY );
+    BOOST_CHECK_THROW( x.normalizeLog(), Exception );
+
     xorg.set( 0, -2.0 );
     y.set( 0, 2.0 );
     y.set( 1, 0.0 );
@@ -1015,6 +1015,8 @@ BOOST_AUTO_TEST_CASE( IOTest ) {
     RegionGraph G( fg, fg.maximalFactorDomains() );
     BOOST_CHECK_THROW( G.WriteToFile( "regiongraph_test.fg" ), Exception );
     BOOST_CHECK_THROW( G.ReadFromFile( "regiongraph_test.fg" ), Exception );
+    BOOST_CHECK_THROW( G.WriteToBinaryFile( "regiongraph_test.fgb" ), Exception );
+    BOOST_CHECK_THROW( G.ReadFromBinaryFile( "regiongraph_test.fgb" ), Exception );
     BOOST_CHECK_THROW( G.printDot( std::cout ), Exception );
 
     std::stringstream ss;
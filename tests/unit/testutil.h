@@ -0,0 +1,50 @@
+/*  This file is part of libDAI - http://www.libdai.org/
+ *
+ *  Copyright (c) 2006-2011, The libDAI authors. All rights reserved.
+ *
+ *  Use of this source code is governed by a BSD-style license that can be found in the LICENSE file.
+ */
+
+
+/// \file
+/// \brief Defines the tolerance and fixtures that are shared by several unit tests
+
+
+#ifndef __defined_libdai_tests_unit_testutil_h
+#define __defined_libdai_tests_unit_testutil_h
+
+
+#include <dai/factorgraph.h>
+#include <dai/graph.h>
+#include <dai/util.h>
+#include <algorithm>
+#include <limits>
+#include <vector>
+
+
+/// Tolerance for comparing floating point numbers, which is larger if dai::Real is a float (see WITH_SINGLE_PRECISION in Makefile.ALL)
+const dai::Real tol = std::max( (dai::Real)1e-8, 10000 * std::numeric_limits<dai::Real>::epsilon() );
+
+
+/// Returns an \a N by \a N grid of binary variables with Ising interactions (which wraps around if \a periodic)
+/** The couplings are drawn uniformly from [-\a J, \a J) and the fields from [-\a h, \a h), after seeding
+ *  the global random number generator with \a seed, so that the same factor graph is returned each time.
+ */
+inline dai::FactorGraph createIsingGrid( size_t N, bool periodic, dai::Real J, dai::Real h, size_t seed = 123 ) {
+    dai::GraphAL G = dai::createGraphGrid( N, N, periodic );
+    dai::rnd_seed( seed );
+    std::vector<dai::Var> vars;
+    for( size_t i = 0; i < G.nrNodes(); i++ )
+        vars.push_back( dai::Var( i, 2 ) );
+    std::vector<dai::Factor> facs;
+    for( size_t i = 0; i < G.nrNodes(); i++ )
+        foreach( const dai::Neighbor &j, G.nb(i) )
+            if( i < j )
+                facs.push_back( dai::createFactorIsing( vars[i], vars[j], J * (2.0 * dai::rnd_uniform() - 1.0) ) );
+    for( size_t i = 0; i < G.nrNodes(); i++ )
+        facs.push_back( dai::createFactorIsing( vars[i], h * (2.0 * dai::rnd_uniform() - 1.0) ) );
+    return dai::FactorGraph( facs );
+}
+
+
+#endif